@@ -0,0 +1,155 @@
+"""
+Concurrent reads and writes against ProjectViewSet on a SQLite file, before and after the database profile.
+
+    python benchmarks/db_contention.py --seconds 10 --readers 4 --writers 2
+
+Each profile runs in its own process against a fresh, migrated database file. Readers GET seeded
+projects from /api/projects/<id>/ (the list isn't paginated and would grow with the writes) while
+writers POST new projects, all through the full request cycle, so connection setup and CONN_MAX_AGE
+count too.
+
+    before  rollback journal, synchronous=FULL, no mmap, a new connection per request
+    after   the defaults in core/db.py: WAL, synchronous=NORMAL, mmap, busy_timeout, persistent connections
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'before': {
+        'SQLITE_JOURNAL_MODE': 'delete',
+        'SQLITE_SYNCHRONOUS': 'full',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_BUSY_TIMEOUT': '',
+        'DATABASE_CONN_MAX_AGE': '0',
+    },
+    'after': {},
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_profile(args):
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stitch.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import OperationalError, connection
+    from django.utils.timezone import now
+    from rest_framework.test import APIClient
+
+    from projects.models import Project
+
+    call_command('migrate', verbosity=0)
+
+    owner = User.objects.create(username='bench').stitcher
+    Project.objects.bulk_create([
+        Project(title='Seed {}'.format(i), owner=owner, status_update_timestamp=now()) for i in range(args.projects)
+    ])
+
+    seeded = list(Project.objects.values_list('pk', flat=True))
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+    connection.close()
+
+    stop = threading.Event()
+    results = {'reads': [], 'writes': [], 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(write):
+        client = APIClient(HTTP_HOST='localhost')
+        if write:
+            client.force_authenticate(owner.user)
+
+        while not stop.is_set():
+            started = time.time()
+            try:
+                if write:
+                    response = client.post('/api/projects/', {'title': 'Bench', 'type': 1}, format='json')
+                else:
+                    response = client.get('/api/projects/{}/'.format(random.choice(seeded)))
+                ok = response.status_code < 400
+            except OperationalError as e:
+                with lock:
+                    results['locked' if 'locked' in str(e) else 'errors'] += 1
+                continue
+
+            with lock:
+                if ok:
+                    results['writes' if write else 'reads'].append(time.time() - started)
+                else:
+                    results['errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=(False,)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=(True,)) for _ in range(args.writers)]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        'journal_mode': journal_mode,
+        'reads_per_second': len(results['reads']) / args.seconds,
+        'writes_per_second': len(results['writes']) / args.seconds,
+        'read_p50_ms': percentile(results['reads'], 0.5) * 1000,
+        'read_p99_ms': percentile(results['reads'], 0.99) * 1000,
+        'write_p99_ms': percentile(results['writes'], 0.99) * 1000,
+        'locked': results['locked'],
+        'errors': results['errors'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--projects', type=int, default=100, help='Rows to seed before the run')
+    parser.add_argument('--profile', choices=sorted(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        return run_profile(args)
+
+    for name in ('before', 'after'):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, DATABASE_ENGINE='sqlite3', DATABASE_NAME=os.path.join(workdir, 'bench.sqlite3'))
+            env.update(PROFILES[name])
+
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), '--profile', name] + sys.argv[1:], env=env
+            )
+
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+        print(
+            '{name:6} journal={journal_mode:6} reads/s={reads_per_second:7.1f} writes/s={writes_per_second:6.1f} '
+            'read p50={read_p50_ms:6.1f}ms p99={read_p99_ms:7.1f}ms write p99={write_p99_ms:7.1f}ms '
+            'locked={locked} errors={errors}'.format(name=name, **result)
+        )
+
+
+if __name__ == '__main__':
+    main()
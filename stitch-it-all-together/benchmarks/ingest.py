@@ -0,0 +1,94 @@
+"""
+Times projects.ingest.ingest on files from 1 MB to 2 GB, against reading the same facts in separate passes.
+
+    python benchmarks/ingest.py --sizes 1M 64M 512M 2G
+
+Files are written to a temporary directory and read back through the page cache, as a just-spooled
+TemporaryUploadedFile would be. The separate passes are what uploads used to cost: a stat for the
+size, a header read for the MIME type, and a hash pass on top.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.ingest import CHUNK_SIZE, ingest, sniff_mimetype  # noqa: E402
+
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(text):
+    text = text.upper()
+    return int(float(text[:-1]) * UNITS[text[-1]]) if text[-1] in UNITS else int(text)
+
+
+def write_file(path, size):
+    block = os.urandom(1 << 20)
+
+    with open(path, 'wb') as out:
+        remaining = size
+        while remaining > 0:
+            out.write(block[:remaining])
+            remaining -= len(block)
+
+
+def separate_passes(path, chunk_size):
+    size = os.stat(path).st_size
+
+    with open(path, 'rb') as source:
+        mimetype = sniff_mimetype(source.read(2048))
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return size, digest.hexdigest(), mimetype
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def single_pass(path, chunk_size):
+    with open(path, 'rb') as source:
+        return ingest(source, chunk_size=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1M', '16M', '256M', '2G'])
+    parser.add_argument('--chunk-size', type=parse_size, default=CHUNK_SIZE)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dir', default=None, help='Where to write the files (default: system temp)')
+    args = parser.parse_args()
+
+    print('{:>8} {:>12} {:>10} {:>14}'.format('size', 'ingest (s)', 'MB/s', 'separate (s)'))
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        for text in args.sizes:
+            size = parse_size(text)
+            path = os.path.join(workdir, 'upload-{}'.format(text))
+            write_file(path, size)
+
+            ingest_time = best_of(args.repeat, single_pass, path, args.chunk_size)
+            separate_time = best_of(args.repeat, separate_passes, path, args.chunk_size)
+
+            print('{:>8} {:>12.3f} {:>10.0f} {:>14.3f}'.format(
+                text, ingest_time, size / float(1 << 20) / ingest_time, separate_time
+            ))
+
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
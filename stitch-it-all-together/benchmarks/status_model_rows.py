@@ -0,0 +1,92 @@
+"""
+Times building Project instances from rows, the usual way and with StatusModelQuerySet.read_only().
+
+    python benchmarks/status_model_rows.py --rows 1000000 --db-rows 100000
+
+First without a database: the same row is turned into --rows instances through Model.from_db, which
+is what a normal queryset does per row, and through core.models.build_read_only. Then, against an
+in-memory SQLite database of --db-rows projects, a full iteration of the queryset, of read_only()
+and of values_list() for comparison, all with iterator() so rows stream rather than being cached.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label, rows, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+
+    print('{:<32} {:>8.2f}s  {:>9.0f} rows/s  {:>6.2f} us/row'.format(
+        label, elapsed, rows / elapsed, elapsed / rows * 1e6
+    ))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db-rows', type=int, default=100000, help='0 skips the database part')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stitch.settings')
+    os.environ['DATABASE_NAME'] = ':memory:'
+
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.utils.timezone import now
+
+    from core.models import build_read_only
+    from projects.models import Project
+
+    call_command('migrate', verbosity=0)
+
+    owner = User.objects.create(username='benchmark').stitcher
+    Project.objects.create(title='Row', description='A row to copy', owner=owner)
+
+    field_names = [field.attname for field in Project._meta.concrete_fields]
+    values = Project.objects.values_list(*field_names).get()
+
+    def from_db():
+        for _ in range(args.rows):
+            Project.from_db('default', field_names, values)
+
+    def read_only():
+        for _ in range(args.rows):
+            build_read_only(Project, 'default', field_names, values)
+
+    print('Instantiating {} rows of {} fields'.format(args.rows, len(field_names)))
+    full = timed('Model.from_db', args.rows, from_db)
+    fast = timed('build_read_only', args.rows, read_only)
+    print('read_only is {:.1f}x faster\n'.format(full / fast))
+
+    if not args.db_rows:
+        return
+
+    timestamp = now()
+    batch = 10000
+
+    for start in range(0, args.db_rows, batch):
+        Project.objects.bulk_create([
+            Project(title='Row {}'.format(i), owner=owner, status_update_timestamp=timestamp)
+            for i in range(start, min(start + batch, args.db_rows))
+        ])
+
+    rows = Project.objects.count()
+    print('Iterating {} rows from SQLite'.format(rows))
+
+    full = timed('queryset', rows, lambda: sum(1 for _ in Project.objects.all().iterator()))
+    fast = timed('read_only()', rows, lambda: sum(1 for _ in Project.objects.read_only().iterator()))
+    timed('values_list()', rows, lambda: sum(1 for _ in Project.objects.values_list(*field_names).iterator()))
+    print('read_only is {:.1f}x faster'.format(full / fast))
+
+
+if __name__ == '__main__':
+    main()
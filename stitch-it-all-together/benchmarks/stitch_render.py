@@ -0,0 +1,83 @@
+"""
+Renders hour-long stems through projects.stitching.render_stitch and reports time and peak memory.
+
+    python benchmarks/stitch_render.py --minutes 60 --stems 3 --crossfade 2
+
+Stems are 44.1 kHz stereo 16 bit, written to a temporary directory (about 635 MB per stem hour).
+Peak RSS should stay flat as --minutes grows. It depends on the block size, not the input length.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from projects.audio import WavInfo, BLOCK_FRAMES, float_to_frames, write_wav_header  # noqa: E402
+from projects.stitching import render_stitch  # noqa: E402
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def write_stem(path, seconds, frequency):
+    info = WavInfo(1, CHANNELS, SAMPLE_RATE, 16, CHANNELS * 2, 44, 0)
+    frames = int(seconds * SAMPLE_RATE)
+
+    with open(path, 'wb') as stem:
+        write_wav_header(stem, info, frames * info.block_align)
+
+        for start in range(0, frames, BLOCK_FRAMES):
+            time_axis = np.arange(start, min(start + BLOCK_FRAMES, frames)) / float(SAMPLE_RATE)
+            tone = 0.5 * np.sin(2 * np.pi * frequency * time_axis).astype(np.float32)
+            stem.write(float_to_frames(np.stack([tone, tone], axis=1), info))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--stems', type=int, default=2)
+    parser.add_argument('--crossfade', type=float, default=0.0, help='Seconds')
+    parser.add_argument('--block-frames', type=int, default=BLOCK_FRAMES)
+    parser.add_argument('--dir', default=None, help='Where to write the stems (default: system temp)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        paths = [os.path.join(workdir, 'stem{}.wav'.format(i)) for i in range(args.stems)]
+
+        started = time.time()
+        for i, path in enumerate(paths):
+            write_stem(path, args.minutes * 60, 220 * (i + 1))
+        print('Wrote {} stems of {:.0f} minutes in {:.1f}s, peak RSS {:.0f} MB'.format(
+            args.stems, args.minutes, time.time() - started, peak_rss_mb()
+        ))
+
+        def sources():
+            for path in paths:
+                with open(path, 'rb') as stem:
+                    yield stem
+
+        started = time.time()
+        with open(os.path.join(workdir, 'stitched.wav'), 'wb+') as output:
+            info = render_stitch(sources(), output, crossfade=args.crossfade, block_frames=args.block_frames)
+        elapsed = time.time() - started
+
+        audio_seconds = info.data_size / float(info.block_align * info.sample_rate)
+
+        print('Rendered {:.0f} minutes ({:.0f} MB) in {:.1f}s, {:.0f}x realtime, peak RSS {:.0f} MB'.format(
+            audio_seconds / 60, info.data_size / 1e6, elapsed, audio_seconds / elapsed, peak_rss_mb()
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,64 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from .models import StatusChangeHistory
+from .models import StatusChangeHistory, Job
 # Register your models here.
 
 
-class StatusChangeHistoryAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids a full COUNT(*) on large tables.
+
+    On PostgreSQL an unfiltered changelist uses the planner's row estimate. Everything else counts
+    at most `count_cap` rows, so a filter matching millions of rows costs no more than one matching
+    ten thousand. Pages past the cap are still reachable through filters and ordering.
+    """
+
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        if not queryset.query.where:
+            estimate = self.get_estimate(queryset)
+            if estimate is not None and estimate > self.count_cap:
+                return estimate
+
+        return queryset.order_by()[:self.count_cap].count()
+
+    @staticmethod
+    def get_estimate(queryset):
+        connection = connections[queryset.db]
+
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+
+        # reltuples is -1 (or 0 before PostgreSQL 14) until the table is first analyzed
+        if not row or row[0] <= 0:
+            return None
+
+        return int(row[0])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Base admin for tables too big to count on every changelist view"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class StatusChangeHistoryAdmin(LargeTableAdmin):
+
+    list_display = ['__str__', 'content_type', 'object_id', 'status', 'timestamp']
+    list_filter = ['status']
+    list_select_related = ['content_type']
 
     readonly_fields = [
         'content_type', 'object_id', 'status', 'timestamp'
@@ -12,3 +66,14 @@ class StatusChangeHistoryAdmin(admin.ModelAdmin):
 
 
 admin.site.register(StatusChangeHistory, StatusChangeHistoryAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+
+    list_display = ['key', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['key']
+    readonly_fields = ['claim_token', 'claimed_at', 'last_error']
+
+
+admin.site.register(Job, JobAdmin)
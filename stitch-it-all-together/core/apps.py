@@ -1,5 +1,32 @@
+import django
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+
+from .db import apply_sqlite_pragmas, check_connection_health
+
+
+def warm_content_types_on_first_request(**kwargs):
+    """Runs once per process. Queries don't belong in ready(), so wait for the first request"""
+    from .models import warm_content_type_cache
+
+    request_started.disconnect(dispatch_uid='core.warm_content_types')
+
+    try:
+        warm_content_type_cache()
+    except DatabaseError:
+        # Not migrated yet. Content types will be looked up lazily instead
+        pass
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        request_started.connect(warm_content_types_on_first_request, dispatch_uid='core.warm_content_types')
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='core.sqlite_pragmas')
+
+        if django.VERSION < (4, 1):
+            request_started.connect(check_connection_health, dispatch_uid='core.connection_health')
@@ -0,0 +1,142 @@
+"""
+The database profile, read from the environment, and the connection hooks that apply it.
+
+    DATABASE_ENGINE         sqlite3 (default), postgresql or mysql, or a full backend path
+    DATABASE_NAME           File path for SQLite, database name otherwise
+    DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT
+    DATABASE_CONN_MAX_AGE   Seconds to keep a connection between requests, "none" for no limit (default 60)
+    DATABASE_HEALTH_CHECKS  Ping reused connections at the start of each request (default on, not SQLite)
+
+    DATABASE_REPLICAS       Comma separated read replicas of the primary, see replicas_from_env
+    DATABASE_SHARDS         Comma separated databases that share owner data with the primary, see shards_from_env
+
+    SQLITE_JOURNAL_MODE     Default wal. WAL lets readers carry on while a write is in progress
+    SQLITE_SYNCHRONOUS      Default normal, which is durable in WAL mode apart from the last commits on power loss
+    SQLITE_MMAP_SIZE        Bytes of the file read through mmap (default 256 MiB, 0 to disable)
+    SQLITE_BUSY_TIMEOUT     Milliseconds a writer waits for the lock before "database is locked" (default 5000)
+"""
+import os
+
+ENGINES = {
+    'sqlite3': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'mysql': 'django.db.backends.mysql',
+}
+
+SQLITE_PRAGMA_DEFAULTS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE', 'wal'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS', 'normal'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE', str(256 << 20)),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT', '5000'),
+)
+
+
+def _flag(value):
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def database_from_env(base_dir, environ=None, prefix='DATABASE_'):
+    """Builds a DATABASES entry from `environ` (os.environ by default). Unset variables keep the defaults"""
+    environ = os.environ if environ is None else environ
+
+    def get(name, default=None):
+        return environ.get(prefix + name, default)
+
+    engine = get('ENGINE', 'sqlite3')
+    engine = ENGINES.get(engine, engine)
+    is_sqlite = engine == ENGINES['sqlite3']
+
+    max_age = get('CONN_MAX_AGE', '60')
+
+    database = {
+        'ENGINE': engine,
+        'NAME': get('NAME', os.path.join(base_dir, 'db.sqlite3') if is_sqlite else ''),
+        'CONN_MAX_AGE': None if max_age.lower() == 'none' else int(max_age),
+        # A SQLite connection is a file handle, there's no server on the other end to lose it
+        'CONN_HEALTH_CHECKS': not is_sqlite and _flag(get('HEALTH_CHECKS', '1')),
+    }
+
+    if is_sqlite:
+        database['PRAGMAS'] = [
+            (pragma, environ.get(variable, default)) for pragma, variable, default in SQLITE_PRAGMA_DEFAULTS
+        ]
+    else:
+        for key in ('USER', 'PASSWORD', 'HOST', 'PORT'):
+            database[key] = get(key, '')
+
+    return database
+
+
+def replicas_from_env(primary, environ=None, prefix='DATABASE_'):
+    """
+    Builds DATABASES entries named replica1, replica2... from DATABASE_REPLICAS. Each replica is a copy
+    of `primary` with a different HOST, or a different NAME (a file path) for SQLite, which is enough
+    to try routing locally with a primary and a replica file (see the sync_sqlite_replicas command).
+
+    Replicas mirror the primary under test, so tests never need a database of their own for them.
+    """
+    environ = os.environ if environ is None else environ
+
+    key = 'NAME' if primary['ENGINE'] == ENGINES['sqlite3'] else 'HOST'
+    replicas = {}
+
+    for i, value in enumerate(v.strip() for v in environ.get(prefix + 'REPLICAS', '').split(',') if v.strip()):
+        replica = dict(primary)
+        replica[key] = value
+        replica['TEST'] = {'MIRROR': 'default'}
+        replicas['replica{}'.format(i + 1)] = replica
+
+    return replicas
+
+
+def shards_from_env(primary, environ=None, prefix='DATABASE_'):
+    """
+    Builds DATABASES entries named shard1, shard2... from DATABASE_SHARDS, like replicas_from_env
+    but with test databases of their own. The primary is always a shard too (see core.sharding).
+    """
+    environ = os.environ if environ is None else environ
+
+    key = 'NAME' if primary['ENGINE'] == ENGINES['sqlite3'] else 'HOST'
+    shards = {}
+
+    for i, value in enumerate(v.strip() for v in environ.get(prefix + 'SHARDS', '').split(',') if v.strip()):
+        shard = dict(primary)
+        shard[key] = value
+        shards['shard{}'.format(i + 1)] = shard
+
+    return shards
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver. Applies the PRAGMAS of a SQLite database to each new connection"""
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = connection.settings_dict.get('PRAGMAS') or ()
+
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas:
+            if value in (None, ''):
+                continue
+            # Pragmas don't take parameters. Values come from settings, never from requests
+            cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+
+
+def check_connection_health(**kwargs):
+    """
+    request_started receiver. Closes persistent connections the server has dropped while they sat
+    idle, so the request opens a fresh one instead of failing on its first query.
+
+    Django only does this itself from 4.1, where the same CONN_HEALTH_CHECKS setting is honoured.
+    """
+    from django.db import connections
+
+    for connection in connections.all():
+        if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,212 @@
+"""
+A small job queue kept in the database, for work that shouldn't hold up a request.
+
+    enqueue('projects.tasks.generate_waveform', [asset.pk])
+
+queues a call once the current transaction commits. The run_jobs command claims due jobs and runs
+them in a pool of worker processes. Failures are retried with exponential backoff until the job's
+max_attempts is spent.
+
+Nothing but the database is needed, so it runs on a single box with SQLite. Backpressure comes from
+both ends. Runners never claim more jobs than they can work on, and enqueue() raises JobQueueFull
+once JOB_QUEUE_LIMIT jobs are pending, so callers can shed load instead of growing an endless backlog.
+"""
+import json
+import multiprocessing
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from . import worker
+from .models import Job
+
+PENDING = Job.STATUSES['PENDING']
+RUNNING = Job.STATUSES['RUNNING']
+DONE = Job.STATUSES['DONE']
+FAILED = Job.STATUSES['FAILED']
+
+RETRY_BACKOFF = 30
+"""Seconds before the first retry. Doubles with every attempt"""
+
+MAX_RETRY_BACKOFF = 3600
+
+
+class JobQueueFull(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+def get_queue_limit():
+    return getattr(settings, 'JOB_QUEUE_LIMIT', None)
+
+
+def ensure_capacity(using=None):
+    """Raises JobQueueFull when JOB_QUEUE_LIMIT jobs are pending. Scans at most that many index entries"""
+    limit = get_queue_limit()
+
+    if limit is None:
+        return
+
+    pending = Job.objects.using(using).filter(status=PENDING).order_by().values('pk')
+
+    if limit <= 0 or pending[limit - 1:limit].exists():
+        raise JobQueueFull('More than {} jobs are waiting to run'.format(limit))
+
+
+def make_key(task, args):
+    return '{}:{}'.format(task, json.dumps(list(args), separators=(',', ':'), sort_keys=True))[:255]
+
+
+def enqueue(task, args=(), key=None, delay=0, max_attempts=3, using=None, on_commit=True):
+    """
+    Queues `task(*args)`. With `on_commit` the job is only written once the current transaction
+    commits, so workers never see rows that might still roll back.
+
+    Jobs are idempotent by `key` (task and arguments by default). A pending or running job absorbs
+    the new request. A finished or failed one is queued again.
+    """
+    ensure_capacity(using)
+
+    args = list(args)
+    key = key or make_key(task, args)
+
+    def insert():
+        run_after = now() + timedelta(seconds=delay)
+
+        try:
+            with transaction.atomic(using=using):
+                Job.objects.using(using).create(
+                    key=key, task=task, args=json.dumps(args), run_after=run_after, max_attempts=max_attempts
+                )
+        except IntegrityError:
+            Job.objects.using(using).filter(key=key, status__in=(DONE, FAILED)).update(
+                task=task, args=json.dumps(args), status=PENDING, attempts=0, max_attempts=max_attempts,
+                run_after=run_after, claim_token='', last_error='', updated_at=now()
+            )
+
+    if on_commit:
+        transaction.on_commit(insert, using=using)
+    else:
+        insert()
+
+
+def claim_jobs(limit, using=None):
+    """
+    Marks up to `limit` due jobs as running and returns them. Claiming is a single conditional
+    UPDATE, so runners racing for the same rows never both get one.
+    """
+    timestamp = now()
+    token = uuid.uuid4().hex
+
+    due = list(
+        Job.objects.using(using).filter(status=PENDING, run_after__lte=timestamp)
+        .order_by('run_after', 'id').values_list('pk', flat=True)[:limit]
+    )
+
+    if not due:
+        return []
+
+    Job.objects.using(using).filter(pk__in=due, status=PENDING).update(
+        status=RUNNING, claim_token=token, claimed_at=timestamp,
+        attempts=models.F('attempts') + 1, updated_at=timestamp
+    )
+
+    return list(Job.objects.using(using).filter(pk__in=due, claim_token=token).order_by('run_after', 'id'))
+
+
+def get_retry_delay(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+
+
+def execute_job(job_id, using=None):
+    """Runs a claimed job and records the outcome. Returns True when it succeeded"""
+    job = Job.objects.using(using).get(pk=job_id)
+    claimed = Job.objects.using(using).filter(pk=job.pk, claim_token=job.claim_token)
+
+    try:
+        import_string(job.task)(*json.loads(job.args))
+    except Exception:
+        error = traceback.format_exc()
+
+        if job.attempts >= job.max_attempts:
+            claimed.update(status=FAILED, last_error=error, updated_at=now())
+        else:
+            claimed.update(
+                status=PENDING, last_error=error, updated_at=now(),
+                run_after=now() + timedelta(seconds=get_retry_delay(job.attempts))
+            )
+        return False
+
+    claimed.update(status=DONE, last_error='', updated_at=now())
+    return True
+
+
+def requeue_stale(older_than, using=None):
+    """Puts jobs back whose runner died while they were running. Returns how many"""
+    return Job.objects.using(using).filter(
+        status=RUNNING, claimed_at__lt=now() - timedelta(seconds=older_than)
+    ).update(status=PENDING, claim_token='', updated_at=now())
+
+
+def run_pending(limit=None, using=None):
+    """Runs due jobs in this process until none are left (or `limit` ran). Returns how many ran"""
+    ran = 0
+
+    while limit is None or ran < limit:
+        jobs = claim_jobs(100 if limit is None else min(limit - ran, 100), using=using)
+
+        if not jobs:
+            break
+
+        for job in jobs:
+            execute_job(job.pk, using=using)
+            ran += 1
+
+    return ran
+
+
+def run_worker_pool(workers, poll_interval=1.0, once=False, log=None):
+    """
+    Feeds due jobs to a pool of `workers` processes. At most two jobs per worker are claimed at a
+    time, the rest stay pending for other runners. With `once`, returns when the queue is drained.
+    """
+    # Workers are spawned rather than forked so none of them shares a connection with this process
+    connections.close_all()
+    pool = multiprocessing.get_context('spawn').Pool(workers, initializer=worker.init_worker)
+
+    in_flight = []
+    ran = 0
+
+    try:
+        while True:
+            in_flight = [result for result in in_flight if not result.ready()]
+            capacity = workers * 2 - len(in_flight)
+
+            jobs = claim_jobs(capacity) if capacity > 0 else []
+
+            for job in jobs:
+                in_flight.append(pool.apply_async(worker.run_job, (job.pk,)))
+                if log:
+                    log('Running {}'.format(job.key))
+
+            ran += len(jobs)
+
+            if once and not jobs and not in_flight:
+                break
+
+            if not jobs:
+                time.sleep(poll_interval)
+    finally:
+        pool.close()
+        pool.join()
+
+    return ran
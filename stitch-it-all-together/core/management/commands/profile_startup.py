@@ -0,0 +1,108 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before its first request: set up the apps, load the middleware and the URL conf
+STARTUP = '\n'.join([
+    'import time',
+    'start = time.perf_counter()',
+    'from django.core.wsgi import get_wsgi_application',
+    'get_wsgi_application()',
+    'from django.urls import get_resolver',
+    'get_resolver().url_patterns',
+    'print(time.perf_counter() - start)',
+])
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+ImportTime = namedtuple('ImportTime', ['module', 'self_us', 'cumulative_us', 'depth'])
+
+
+def parse_importtime(lines):
+    """The ImportTimes in the stderr of `python -X importtime`, skipping anything else"""
+    for line in lines:
+        match = IMPORT_LINE.match(line.rstrip('\n'))
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            yield ImportTime(module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+
+
+def group_for(module, apps):
+    """The installed app a module belongs to, or its top level package"""
+    for app in apps:
+        if module == app or module.startswith(app + '.'):
+            return app
+
+    return module.split('.')[0]
+
+
+def group_import_times(imports, apps):
+    """Self time summed per app or package, largest first, as (group, microseconds, modules)"""
+    # Longest first, so 'allauth.account' wins over 'allauth'
+    apps = sorted(apps, key=len, reverse=True)
+    groups = defaultdict(lambda: [0, 0])
+
+    for imported in imports:
+        group = groups[group_for(imported.module, apps)]
+        group[0] += imported.self_us
+        group[1] += 1
+
+    return sorted(((name, us, count) for name, (us, count) in groups.items()), key=lambda g: -g[1])
+
+
+class Command(BaseCommand):
+    help = "Measure how long a fresh worker takes to start, and which apps and modules it spends the time importing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', default=os.environ.get('DJANGO_SETTINGS_MODULE'),
+            help='The settings to start with, e.g. stitch.settings_api. Defaults to the current settings'
+        )
+        parser.add_argument('--limit', type=int, default=15, help='Rows to show in each table')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=options['settings_module'])
+
+        # A new interpreter, so nothing is imported already. -X importtime reports on stderr
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+
+        if process.returncode:
+            raise CommandError('Startup failed:\n{}'.format(process.stderr[-2000:]))
+
+        imports = list(parse_importtime(process.stderr.splitlines()))
+        apps = self._get_installed_apps(env)
+        limit = options['limit']
+
+        self.stdout.write('Started {} in {:.0f} ms, {} modules imported taking {:.0f} ms\n'.format(
+            options['settings_module'],
+            float(process.stdout.strip().splitlines()[-1]) * 1000,
+            len(imports),
+            sum(imported.self_us for imported in imports) / 1000.0
+        ))
+
+        self.stdout.write('{:>10}  {:>7}  {}'.format('ms', 'modules', 'app or package'))
+        for name, us, count in group_import_times(imports, apps)[:limit]:
+            self.stdout.write('{:>10.1f}  {:>7}  {}'.format(us / 1000.0, count, name))
+
+        self.stdout.write('\n{:>10}  {:>10}  {}'.format('self ms', 'total ms', 'module'))
+        for imported in sorted(imports, key=lambda i: -i.self_us)[:limit]:
+            self.stdout.write('{:>10.1f}  {:>10.1f}  {}'.format(
+                imported.self_us / 1000.0, imported.cumulative_us / 1000.0, imported.module
+            ))
+
+    def _get_installed_apps(self, env):
+        """INSTALLED_APPS of the profiled settings, which aren't necessarily the ones running this command"""
+        process = subprocess.run(
+            [sys.executable, '-c', 'from django.conf import settings; print("\\n".join(settings.INSTALLED_APPS))'],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+
+        return process.stdout.split()
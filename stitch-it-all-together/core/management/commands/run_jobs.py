@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import requeue_stale, run_pending, run_worker_pool
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes. 0 runs jobs in this process'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no jobs are due instead of polling for more'
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Seconds to wait between polls of an empty queue'
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=3600,
+            help='Seconds after which a running job is assumed lost and queued again'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale(options['stale_after'])
+
+        if requeued:
+            self.stdout.write('Requeued {} stale jobs'.format(requeued))
+
+        if options['workers'] <= 0:
+            if not options['once']:
+                self.stderr.write('Running inline implies --once')
+            ran = run_pending()
+        else:
+            ran = run_worker_pool(
+                options['workers'],
+                poll_interval=options['poll'],
+                once=options['once'],
+                log=self.stdout.write if options['verbosity'] > 1 else None
+            )
+
+        self.stdout.write('Ran {} jobs'.format(ran))
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary into each SQLite replica file, to try replica routing locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float, default=0,
+            help='Keep copying every N seconds, which also simulates replication lag. 0 copies once'
+        )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The primary is not a SQLite database')
+
+        replicas = [settings.DATABASES[alias]['NAME'] for alias in settings.DATABASE_REPLICAS]
+
+        if not replicas:
+            raise CommandError('No replicas configured. Set DATABASE_REPLICAS to one or more file paths')
+
+        while True:
+            source = sqlite3.connect(primary['NAME'])
+
+            try:
+                for name in replicas:
+                    target = sqlite3.connect(name)
+                    try:
+                        # The backup API takes a consistent snapshot even while the primary is written to
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+
+            self.stdout.write('Copied {} to {}'.format(primary['NAME'], ', '.join(replicas)))
+
+            if options['every'] <= 0:
+                break
+
+            time.sleep(options['every'])
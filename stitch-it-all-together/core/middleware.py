@@ -0,0 +1,40 @@
+from django.conf import settings
+
+from .routers import get_replicas, replica_reads, wrote
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Sends the reads of safe-method requests to a replica, unless the client wrote within the last
+    REPLICA_PIN_SECONDS. A request that writes sets a short lived cookie pinning the client to the
+    primary, so users always read their own writes even while the replicas are behind.
+
+    Place it above the session and auth middleware so their writes pin too.
+    """
+
+    cookie_name = 'db_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+
+        use_replica = request.method in SAFE_METHODS and self.cookie_name not in request.COOKIES
+
+        with replica_reads(use_replica):
+            response = self.get_response(request)
+            pin = wrote() or request.method not in SAFE_METHODS
+
+        if pin:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax'
+            )
+
+        return response
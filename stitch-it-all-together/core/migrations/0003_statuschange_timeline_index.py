@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20200503_2025'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='statuschangehistory',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='statuschange_timeline_idx'),
+        ),
+    ]
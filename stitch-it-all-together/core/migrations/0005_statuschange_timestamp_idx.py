@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='statuschangehistory',
+            index=models.Index(fields=['timestamp', 'id'], name='statuschange_timestamp_idx'),
+        ),
+    ]
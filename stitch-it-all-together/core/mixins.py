@@ -0,0 +1,71 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from core.models import StatusModel, DELETED, ENABLED
+from core.serializers import BulkStatusSerializer
+
+STATUS_NAMES = {value: name.lower() for value, name in StatusModel.STATUS_CHOICES}
+
+
+class StatusActionsMixin(object):
+    """
+    Status transitions for a viewset of StatusModel rows.
+
+    `POST <list>/bulk-status/` with `{"status": "archived", "ids": [...]}` or `{"status": ..., "filter": {...}}`
+    is for admins. It moves every matching row with set based UPDATEs and responds with how many rows
+    moved from each status. Filters are limited to the names in `bulk_status_filters`.
+
+    `POST <detail>/restore/` undeletes a soft deleted row. Rows outside `get_restore_queryset` are a 404,
+    the rest are subject to the viewset's object permissions.
+    """
+
+    bulk_status_filters = {}
+    """Filter names clients may use, mapped to ORM lookups"""
+
+    def get_status_queryset(self):
+        """Every row a transition may touch, soft deleted ones included"""
+        return self.get_queryset().model.objects.including_deleted().across_shards()
+
+    def get_restore_queryset(self):
+        """Rows the user may restore if permitted. Override to hide rows they can't see, as get_queryset does"""
+        return self.get_status_queryset()
+
+    @action(detail=False, methods=['post'], url_path='bulk-status', permission_classes=[permissions.IsAdminUser])
+    def bulk_status(self, request):
+        serializer = BulkStatusSerializer(data=request.data, context={'filters': self.bulk_status_filters})
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        queryset = self.get_status_queryset()
+
+        try:
+            if 'ids' in data:
+                queryset = queryset.filter(pk__in=data['ids'])
+            else:
+                queryset = queryset.filter(**data['filter'])
+
+            moved = queryset.set_status(data['status'])
+        except (TypeError, ValueError, DjangoValidationError) as e:
+            raise ValidationError({'filter': str(e)})
+
+        return Response({
+            'status': STATUS_NAMES[data['status']],
+            'updated': sum(moved.values()),
+            'from': {STATUS_NAMES[status]: count for status, count in moved.items()},
+        })
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        instance = get_object_or_404(self.get_restore_queryset(), pk=pk)
+        self.check_object_permissions(request, instance)
+
+        if instance.status == DELETED:
+            # Through the queryset rather than save(), which a base row of a multi table model may refuse
+            self.get_restore_queryset().filter(pk=instance.pk, status=DELETED).set_status(ENABLED)
+            instance.refresh_from_db(fields=['status', 'status_update_timestamp'])
+
+        return Response(self.get_serializer(instance).data)
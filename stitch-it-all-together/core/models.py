@@ -1,11 +1,21 @@
+import operator
+import time
+from collections import Counter, defaultdict
+
+import django
 from django.utils.timezone import now
-from django.db import models
+from django.db import models, connections, router
 from django.db.models import signals
 from django.db import transaction
+from django.db.models.functions import RowNumber
+from django.db.models.base import ModelState
+from django.db.models.query import ModelIterable, ValuesIterable, get_related_populators
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 
+from .sharding import allocate_id, get_shards, is_sharded, merge_sorted
+
 
 class TimestampedModel(models.Model):
     # A timestamp representing when this object was created.
@@ -27,6 +37,24 @@ STATUS_CHOICES = (
     (3, 'Archived')
 )
 
+STATUSES = {
+    v.upper(): k for k, v in STATUS_CHOICES
+}
+
+# Looked up once here rather than in STATUSES on every call
+ENABLED = STATUSES['ENABLED']
+DELETED = STATUSES['DELETED']
+SUSPENDED = STATUSES['SUSPENDED']
+ARCHIVED = STATUSES['ARCHIVED']
+
+
+class ReadOnlyInstance(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
 
 class StatusChangeHistory(models.Model):
     """
@@ -53,6 +81,13 @@ class StatusChangeHistory(models.Model):
             ('content_type', 'object_id', 'status', 'timestamp')
         )
 
+        indexes = [
+            # An object's timeline, newest first
+            models.Index(fields=['content_type', 'object_id', 'timestamp'], name='statuschange_timeline_idx'),
+            # The admin changelist, newest first
+            models.Index(fields=['timestamp', 'id'], name='statuschange_timestamp_idx'),
+        ]
+
         ordering = ('-timestamp',)
 
         verbose_name_plural = 'Status change histories'
@@ -72,12 +107,14 @@ class StatusChangeHistory(models.Model):
         if from_status == status and not created:
             return
 
-        content_type = ContentType.objects.get_for_model(instance)
+        # History lives next to its object, which may be on a shard
+        using = instance._state.db
+        content_type = ContentType.objects.db_manager(using).get_for_model(instance)
 
         if not content_type:
             return
 
-        return cls.objects.get_or_create(
+        return cls.objects.using(using).get_or_create(
             content_type=content_type,
             object_id=instance.pk,
             status=status,
@@ -102,64 +139,474 @@ class StatusChangeHistory(models.Model):
 signals.post_save.connect(StatusChangeHistory.signal_handler)
 
 
+def warm_content_type_cache(using=None):
+    """
+    Loads the content types of every StatusModel in one query, so the first history write or
+    read of each model doesn't pay for its own lookup.
+    """
+    from django.apps import apps
+
+    status_models = [model for model in apps.get_models() if issubclass(model, StatusModel)]
+
+    if status_models:
+        ContentType.objects.db_manager(using).get_for_models(*status_models)
+
+
+def _latest_status_changes(history, latest, using):
+    """Limits a StatusChangeHistory queryset to the newest `latest` rows of each object"""
+
+    features = connections[using].features
+
+    if django.VERSION >= (4, 2) and features.supports_over_clause:
+        # Filtering on a window function is only supported by the ORM from Django 4.2
+        return history.annotate(
+            _recency=models.Window(
+                RowNumber(),
+                partition_by=[models.F('object_id')],
+                order_by=models.F('timestamp').desc()
+            )
+        ).filter(_recency__lte=latest)
+
+    if features.allow_sliced_subqueries_with_in:
+        newest = StatusChangeHistory.objects.filter(
+            content_type=models.OuterRef('content_type'),
+            object_id=models.OuterRef('object_id')
+        ).order_by('-timestamp').values('pk')[:latest]
+
+        return history.filter(pk__in=models.Subquery(newest))
+
+    return None
+
+
+def prefetch_status_changes(instances, latest=None, using=None):
+    """
+    Loads the status history of many StatusModel instances with one query per model and
+    primes each instance's `status_changes`, so reading it afterwards doesn't touch the database.
+
+    `latest` keeps only the N most recent changes of each instance.
+    """
+    by_model = defaultdict(list)
+
+    for instance in instances:
+        if instance.pk is not None:
+            by_model[instance._meta.concrete_model].append(instance)
+
+    for model, model_instances in by_model.items():
+        db = using or router.db_for_read(StatusChangeHistory, instance=model_instances[0])
+        content_type = ContentType.objects.db_manager(db).get_for_model(model)
+
+        history = StatusChangeHistory.objects.using(db).filter(
+            content_type=content_type,
+            object_id__in={instance.pk for instance in model_instances}
+        )
+
+        limit_in_python = False
+
+        if latest is not None:
+            limited = _latest_status_changes(history, latest, db)
+            limit_in_python = limited is None
+            history = history if limit_in_python else limited
+
+        changes = defaultdict(list)
+
+        for change in history:
+            changes[change.object_id].append(change)
+
+        for instance in model_instances:
+            instance_changes = changes[instance.pk]
+
+            if limit_in_python:
+                instance_changes = instance_changes[:latest]
+
+            # The same shape prefetch_related leaves behind for a GenericRelation
+            queryset = StatusChangeHistory.objects.using(db).filter(
+                content_type=content_type, object_id=instance.pk
+            )
+            queryset._result_cache = instance_changes
+            queryset._prefetch_done = True
+
+            instance.__dict__.setdefault('_prefetched_objects_cache', {})['status_changes'] = queryset
+
+    return instances
+
+
+def build_read_only(model, db, field_names, values):
+    """
+    An instance from a database row without going through Model.__init__ or from_db: the field values
+    go straight into its __dict__. There's no change tracking, so it can't be saved.
+    """
+    instance = model.__new__(model)
+    instance.__dict__.update(zip(field_names, values))
+
+    state = instance._state = ModelState()
+    state.adding = False
+    state.db = db
+
+    instance._read_only = True
+    return instance
+
+
+class ReadOnlyModelIterable(ModelIterable):
+    """ModelIterable building its instances with `build_read_only`. Related objects are built as usual"""
+
+    def __iter__(self):
+        queryset = self.queryset
+        db = queryset.db
+        compiler = queryset.query.get_compiler(using=db)
+        results = compiler.execute_sql(chunked_fetch=self.chunked_fetch, chunk_size=self.chunk_size)
+
+        select, klass_info, annotation_col_map = compiler.select, compiler.klass_info, compiler.annotation_col_map
+        model = klass_info['model']
+        select_fields = klass_info['select_fields']
+        start, end = select_fields[0], select_fields[-1] + 1
+        field_names = [column[0].target.attname for column in select[start:end]]
+        related_populators = get_related_populators(klass_info, select, db)
+
+        known_related_objects = [
+            (field, related_objs, [
+                field.attname if from_field == 'self' else queryset.model._meta.get_field(from_field).attname
+                for from_field in field.from_fields
+            ])
+            for field, related_objs in queryset._known_related_objects.items()
+        ]
+
+        for row in compiler.results_iter(results):
+            instance = build_read_only(model, db, field_names, row[start:end])
+
+            for populator in related_populators:
+                populator.populate(row, instance)
+
+            if annotation_col_map:
+                for name, position in annotation_col_map.items():
+                    setattr(instance, name, row[position])
+
+            for field, related_objs, attnames in known_related_objects:
+                if field.is_cached(instance):
+                    continue
+                key = tuple(getattr(instance, attname) for attname in attnames)
+                related = related_objs.get(key[0] if len(key) == 1 else key)
+                if related is not None:
+                    setattr(instance, field.name, related)
+
+            yield instance
+
+
 class StatusModelQuerySet(models.QuerySet):
 
     def __init__(self, *args, **kwargs):
         super(StatusModelQuerySet, self).__init__(*args, **kwargs)
 
         self.allow_deleted_in_all = False
+        self.status_changes_prefetch = None
+        self.fan_out = False
 
     def all(self):
         if self.allow_deleted_in_all:
             return self._chain()
-        return self.exclude(status=StatusModel.STATUSES['DELETED'])
+        return self.exclude(status=DELETED)
 
     def enabled(self):
-        return self.filter(status=StatusModel.STATUSES['ENABLED'])
+        return self.filter(status=ENABLED)
 
     def deleted(self):
-        qs = self.filter(status=StatusModel.STATUSES['DELETED'])
+        qs = self.filter(status=DELETED)
         qs.allow_deleted_in_all = True
         return qs
 
     def suspended(self):
-        return self.filter(status=StatusModel.STATUSES['SUSPENDED'])
+        return self.filter(status=SUSPENDED)
 
     def archived(self):
-        return self.filter(status=StatusModel.STATUSES['ARCHIVED'])
+        return self.filter(status=ARCHIVED)
+
+    def with_status_changes(self, latest=None):
+        """Prefetch status history for every result in a single query. See `prefetch_status_changes`"""
+        qs = self._chain()
+        qs.status_changes_prefetch = {'latest': latest}
+        return qs
+
+    def including_deleted(self):
+        qs = self._chain()
+        qs.allow_deleted_in_all = True
+        return qs
+
+    def read_only(self):
+        """
+        Builds instances straight from the rows, skipping Model.__init__ and the status change tracking
+        every StatusModel sets up, for large reads such as exports and reports. The instances read like
+        any other but raise ReadOnlyInstance on save. See benchmarks/status_model_rows.py
+        """
+        qs = self._chain()
+        qs._iterable_class = ReadOnlyModelIterable
+        return qs
+
+    def across_shards(self):
+        """
+        Runs the query on every shard and merges the results in order. Does nothing unless
+        DATABASE_SHARDS is set or once a database is chosen with `using()`. See core.sharding
+        """
+        qs = self._chain()
+        qs.fan_out = True
+        return qs
+
+    def shard_querysets(self):
+        """This queryset on each shard when it fans out, otherwise None"""
+        if not self.fan_out or self._db is not None or not is_sharded():
+            return None
+
+        return [self.using(alias) for alias in get_shards()]
+
+    def chunked(self, size=1000, throttle=None):
+        """
+        Walks the rows in primary key order and yields them as lists of up to `size`. Each chunk is its
+        own query, with select_related, prefetch_related and with_status_changes applied per chunk, so
+        memory stays flat however many rows there are and no read is held open between chunks.
+        The queryset's own ordering is replaced by the primary key.
+
+        `throttle` sleeps that many seconds between chunks, to leave the database room for other work.
+        """
+        queryset = self.order_by('pk')
+        get_key = self._get_chunk_key()
+        last = None
+
+        while True:
+            page = queryset if last is None else queryset.filter(pk__gt=last)
+
+            if get_key is None:
+                # The rows may not carry their key, e.g. values_list(), so read the keys first
+                keys = list(page.values_list('pk', flat=True)[:size])
+                chunk = list(queryset.filter(pk__in=keys)) if keys else []
+            else:
+                chunk = list(page[:size])
+                keys = [get_key(row) for row in chunk]
+
+            if chunk:
+                yield chunk
+
+            if len(keys) < size:
+                return
+
+            last = keys[-1]
+
+            if throttle:
+                time.sleep(throttle)
+
+    def _get_chunk_key(self):
+        """Reads the primary key from a row of this queryset, or None when the rows don't include it"""
+        if issubclass(self._iterable_class, ModelIterable):
+            return operator.attrgetter('pk')
+
+        if issubclass(self._iterable_class, ValuesIterable):
+            names = self._fields or [field.attname for field in self.model._meta.concrete_fields]
+
+            for name in ('pk', self.model._meta.pk.attname):
+                if name in names:
+                    return operator.itemgetter(name)
+
+        return None
+
+    def create(self, **kwargs):
+        if self._db is not None or getattr(self.model, 'shard_by', None) is None or not is_sharded():
+            return super(StatusModelQuerySet, self).create(**kwargs)
+
+        # Let the row's owner pick the shard, rather than the queryset's default database
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def set_status(self, status, batch_size=500):
+        """
+        Moves every row to `status` with set based UPDATEs rather than a save per object.
+        History is written with one bulk insert per batch and owners' counters are adjusted per batch
+        through the model's `bulk_update_live_counters`. No signals are sent.
+
+        Each batch commits on its own. Wrap the call in a transaction to move all of the rows or none.
+
+        Returns how many rows moved from each previous status, e.g. {ENABLED: 120, SUSPENDED: 3}.
+        """
+        shards = self.shard_querysets()
+        if shards is not None:
+            moved = defaultdict(int)
+            for shard in shards:
+                for previous, count in shard.set_status(status, batch_size).items():
+                    moved[previous] += count
+            return dict(moved)
+
+        # Resolve self.db through the write router, as update() and delete() do
+        self._for_write = True
+        using = self.db
+
+        model = self.model
+        fields = ('pk', 'status') + tuple(model.bulk_counter_fields)
+
+        timestamp = now()
+        moved = defaultdict(int)
+        content_type = None
+
+        # Walk the keys a batch at a time, so neither the rows nor a transaction are held for all of them
+        for keys in self.exclude(status=status).values('pk').using(using).chunked(batch_size):
+            with transaction.atomic(using=using):
+                # Locked and read again through this queryset's filters, the row may have changed since
+                # its key was read
+                batch = list(
+                    self.filter(pk__in=[key['pk'] for key in keys]).using(using)
+                    .exclude(status=status).order_by().select_for_update().values(*fields)
+                )
+
+                if not batch:
+                    continue
+
+                model._base_manager.using(using).filter(pk__in=[row['pk'] for row in batch]).update(
+                    status=status, status_update_timestamp=timestamp
+                )
+
+                if model.track_status_changes:
+                    content_type = content_type or ContentType.objects.db_manager(using).get_for_model(model)
+
+                    StatusChangeHistory.objects.using(using).bulk_create([
+                        StatusChangeHistory(content_type=content_type, object_id=row['pk'], status=status, timestamp=timestamp)
+                        for row in batch
+                    ])
+
+                flipped = [row for row in batch if (row['status'] != DELETED) != (status != DELETED)]
+                if flipped:
+                    model.bulk_update_live_counters(flipped, status != DELETED, using=using)
+
+                for row in batch:
+                    moved[row['status']] += 1
+
+        return dict(moved)
 
     def delete(self):
         """Soft delete by default"""
-        deleted_count = 0
-        for obj in self:
-            obj.delete()
-            deleted_count += 1
-        return deleted_count, {}  # To be same shape of a django queryset delete
+        moved = self.set_status(DELETED)
+        return sum(moved.values()), {}  # To be same shape of a django queryset delete
 
-    @transaction.atomic()
     def update(self, **kwargs):
         """Intercept updates to go through status change machinery if update is being updated"""
+        shards = self.shard_querysets()
+        if shards is not None:
+            return sum(shard.update(**kwargs) for shard in shards)
+
         if 'status' not in kwargs:
             return super(StatusModelQuerySet, self).update(**kwargs)
 
         status = kwargs.pop('status')
+        self._for_write = True
 
-        # Find the items with different status and save those. Then do the update sans status
-        for obj in self.exclude(status=status):
-            obj.status = status
-            obj.save()
+        with transaction.atomic(using=self.db):
+            # Move the rows with a different status in bulk. Then do the update sans status
+            moved = self.set_status(status)
 
-        return super(StatusModelQuerySet, self).update(**kwargs)
+            if not kwargs:
+                return sum(moved.values())
+
+            return super(StatusModelQuerySet, self).update(**kwargs)
 
     def _delete(self):
         """Do a DB delete"""
-        return super(StatusModelQuerySet, self).delete()
+        shards = self.shard_querysets()
+        if shards is not None:
+            deleted = [shard._delete() for shard in shards]
+            return sum(total for total, _ in deleted), {}
+
+        # Through Django's collector a chunk at a time, which loads every related row it cascades to
+        self._for_write = True
+
+        deleted, per_model = 0, Counter()
+
+        for keys in self.values('pk').chunked():
+            total, counts = models.QuerySet.delete(
+                self.model._base_manager.using(self.db).filter(pk__in=[key['pk'] for key in keys])
+            )
+            deleted += total
+            per_model.update(counts)
+
+        return deleted, dict(per_model)
+
+    def count(self):
+        shards = self.shard_querysets()
+        if shards is None:
+            return super(StatusModelQuerySet, self).count()
+
+        if self.query.low_mark or self.query.high_mark is not None:
+            return len(self)
+
+        return sum(shard.count() for shard in shards)
+
+    def exists(self):
+        shards = self.shard_querysets()
+        if shards is None:
+            return super(StatusModelQuerySet, self).exists()
+
+        return any(shard.exists() for shard in shards)
 
     def _clone(self):
         new = super(StatusModelQuerySet, self)._clone()
         new.allow_deleted_in_all = self.allow_deleted_in_all
+        new.status_changes_prefetch = self.status_changes_prefetch
+        new.fan_out = self.fan_out
         return new
 
+    def _fetch_shards(self, shards):
+        """Fetches from every shard and merges the rows in the query's order, then applies its slice"""
+        low, high = self.query.low_mark, self.query.high_mark
+
+        if low or high is not None:
+            # Each shard may hold every row of the slice
+            shards = [shard._chain() for shard in shards]
+            for shard in shards:
+                shard.query.clear_limits()
+                shard.query.set_limits(high=high)
+
+        results = [list(shard) for shard in shards]
+
+        ordering = self.query.order_by or (self.query.get_meta().ordering if self.query.default_ordering else ())
+
+        if ordering and all(isinstance(name, str) and name != '?' for name in ordering):
+            if issubclass(self._iterable_class, ModelIterable):
+                get_value = _get_path
+            else:
+                get_value = _get_item if results and results[0] and isinstance(results[0][0], dict) else None
+
+            if get_value:
+                nulls_largest = connections[shards[0].db].features.nulls_order_largest
+                merged = list(merge_sorted(results, ordering, get_value, nulls_largest))
+            else:
+                merged = sum(results, [])
+        else:
+            merged = sum(results, [])
+
+        return merged[low:high]
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            shards = self.shard_querysets()
+            if shards is not None:
+                # Each shard has run its own prefetches
+                self._result_cache = self._fetch_shards(shards)
+                self._prefetch_done = True
+                return
+
+        fetching = self._result_cache is None
+
+        super(StatusModelQuerySet, self)._fetch_all()
+
+        if fetching and self.status_changes_prefetch is not None and issubclass(self._iterable_class, ModelIterable):
+            prefetch_status_changes(self._result_cache, using=self.db, **self.status_changes_prefetch)
+
+
+def _get_path(instance, path):
+    for part in path.split('__'):
+        instance = getattr(instance, part)
+        if instance is None:
+            break
+    return instance
+
+
+def _get_item(row, name):
+    return row[name]
+
 
 class StatusModelManager(models.Manager):
 
@@ -185,19 +632,32 @@ class StatusModelManager(models.Manager):
     def archived(self):
         return self._get_queryset().archived()
 
+    def with_status_changes(self, latest=None):
+        return self.get_queryset().with_status_changes(latest=latest)
+
+    def including_deleted(self):
+        return self._get_queryset().including_deleted()
+
+    def across_shards(self):
+        return self.get_queryset().across_shards()
+
+    def read_only(self):
+        return self.get_queryset().read_only()
+
+    def chunked(self, size=1000, throttle=None):
+        return self.get_queryset().chunked(size, throttle)
+
 
 class StatusModel(models.Model):
 
     STATUS_CHOICES = STATUS_CHOICES
 
-    STATUSES = {
-        v.upper(): k for k, v in STATUS_CHOICES
-    }
+    STATUSES = STATUSES
 
     status = models.IntegerField(
         db_index=True,
         help_text="The status of this instance",
-        default=STATUSES['ENABLED'],
+        default=ENABLED,
         choices=STATUS_CHOICES
     )
 
@@ -215,6 +675,15 @@ class StatusModel(models.Model):
     track_status_changes = True
     """Subclasses or instance can set this to False to disable history tracking of instances"""
 
+    bulk_counter_fields = ()
+    """Columns `StatusModelQuerySet.set_status` reads from each changed row for `bulk_update_live_counters`"""
+
+    shard_by = None
+    """Path to the owner id whose shard holds the row, e.g. 'owner_id'. None keeps the model unsharded"""
+
+    _read_only = False
+    """Set on instances built by `StatusModelQuerySet.read_only()`, which have no change tracking"""
+
     class Meta:
         abstract = True
 
@@ -223,17 +692,29 @@ class StatusModel(models.Model):
 
         # Store the current status on the instance so the update timestamp can be updated
         # When it changes
-
         self._status = self.status
-        self._status_changed = None
 
     def save(self, *args, **kwargs):
 
+        if self._read_only:
+            raise ReadOnlyInstance('{} was loaded with read_only() and can\'t be saved'.format(self._meta.label))
+
         if self._status != self.status or not self.status_update_timestamp:
             self.status_update_timestamp = now()
-            self._status_changed = self.status_update_timestamp
 
-        resp = super(StatusModel, self).save(*args, **kwargs)
+        was_live = not self._state.adding and self._status != DELETED
+
+        if self.pk is None and self.shard_by is not None and is_sharded():
+            # Per database auto increments would collide across shards
+            self.pk = allocate_id(self.__class__)
+
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+
+        # Counters must move with the row or not at all
+        with transaction.atomic(using=using):
+            resp = super(StatusModel, self).save(*args, **kwargs)
+
+            self.update_live_counters(was_live, self.is_live(), using=self._state.db)
 
         self._status_reset()
         return resp
@@ -243,7 +724,7 @@ class StatusModel(models.Model):
         'Deletes' the instance by setting the status to DELETED
         """
 
-        self.status = self.STATUSES['DELETED']
+        self.status = DELETED
         self.save(using=using)
 
         return 1, {}
@@ -252,24 +733,57 @@ class StatusModel(models.Model):
         """Actually deletes the model through django ORM"""
         return super(StatusModel, self).delete(*args, **kwargs)
 
+    def is_live(self):
+        """Anything not soft deleted counts towards its owner"""
+        return self.status != DELETED
+
+    def update_live_counters(self, was_live, is_live, using=None):
+        """
+        Hook for subclasses that keep denormalised counters of their live rows, e.g. per owner.
+        Called inside the saving transaction on every save, and after a hard delete.
+        Implementations should use F() expressions so concurrent writers don't lose updates.
+        """
+        pass
+
+    @classmethod
+    def bulk_update_live_counters(cls, rows, is_live, using=None):
+        """
+        The set based counterpart of `update_live_counters`, called by `StatusModelQuerySet.set_status`.
+        `rows` are dicts of pk, previous status and `bulk_counter_fields` of rows that have just
+        become live (`is_live`) or stopped being live.
+        """
+        pass
+
+    @classmethod
+    def hard_delete_signal_handler(cls, sender, instance, using, *_, **__):
+        """
+        Connect to post_delete for models that implement `update_live_counters`. This catches
+        every hard delete: `_delete()`, queryset `_delete()` and cascades.
+        """
+        if sender._meta.parents:
+            # Multi-table children are deleted with their parent row, which is counted instead
+            return
+
+        instance.update_live_counters(instance.is_live(), False, using=using)
+
     # TODO: Should there be limitations on what statuses an object can move between?
     # TODO: EG. Can you archive a soft deleted object?
 
     def enable(self, using=None):
         """Sets status to ENABLED"""
 
-        self.status = self.STATUSES['ENABLED']
+        self.status = ENABLED
         return self.save(using=using)
 
     def suspend(self, using=None):
         """Sets status to SUSPENDED"""
 
-        self.status = self.STATUSES['SUSPENDED']
+        self.status = SUSPENDED
         return self.save(using=using)
 
     def archive(self, using=None):
         """Sets status to ARCHIVED"""
-        self.status = self.STATUSES['ARCHIVED']
+        self.status = ARCHIVED
         return self.save(using=using)
 
     def enable_status_change_tracking(self):
@@ -282,7 +796,65 @@ class StatusModel(models.Model):
         return self._status
 
     def _status_reset(self):
-        self._status_changed = None
         self._status = self.status
 
 
+JOB_STATUS_CHOICES = (
+    (0, 'Pending'),
+    (1, 'Running'),
+    (2, 'Done'),
+    (3, 'Failed')
+)
+
+
+class ShardSequence(models.Model):
+    """The last id handed out for a sharded model, so ids are unique across shards. See core.sharding"""
+
+    name = models.CharField(max_length=100, unique=True)
+
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{} {}'.format(self.name, self.last_value)
+
+
+class Job(TimestampedModel):
+    """
+    A unit of background work, queued in the database so no broker is needed. See core.jobs.
+
+    `key` makes enqueueing idempotent: while a job is pending or running, queueing the same key again
+    is a no-op. `task` is the dotted path of a module level function called with the JSON `args`.
+    """
+
+    STATUSES = {
+        'PENDING': 0,
+        'RUNNING': 1,
+        'DONE': 2,
+        'FAILED': 3,
+    }
+
+    key = models.CharField(max_length=255, unique=True)
+    task = models.CharField(max_length=255)
+    args = models.TextField(default='[]', help_text="JSON list of positional arguments")
+
+    status = models.SmallIntegerField(choices=JOB_STATUS_CHOICES, default=0)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+
+    run_after = models.DateTimeField(default=now, help_text="Not run before this time. Retries are pushed back")
+    claim_token = models.CharField(max_length=32, blank=True, default='', editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ('run_after', 'id')
+
+        indexes = [
+            # What runners poll: pending jobs that are due, oldest first
+            models.Index(fields=['status', 'run_after', 'id'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return "<Job {} {}>".format(self.key, self.get_status_display())
@@ -0,0 +1,153 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates by seeking past the last row of the previous page instead of using OFFSET,
+    so page 2,000 of a large library costs the same as page 1.
+
+    `ordering` must identify rows uniquely, so it should always end with the primary key.
+    Fields may follow relations (e.g. `audioasset__duration`) as long as they are select_related
+    and never NULL. The cursor is an opaque token holding the ordering values of the last row served.
+
+    Querysets marked `across_shards()` page every shard with the same seek and merge the pages.
+    """
+
+    ordering = ('-created_at', '-id')
+
+    page_size = 50
+    max_page_size = 500
+
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+        self.request = None
+        self.next_cursor = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.next_cursor = None
+
+        page_size = self.get_page_size(request)
+        fields = self._get_fields(queryset.model)
+
+        cursor = self.decode_cursor(request, fields)
+
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(fields, cursor))
+
+        page = list(queryset.order_by(*self.ordering)[:page_size + 1])
+
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = [
+                field.value_from_object(self._follow(last, path)) for path, field, _ in fields
+            ]
+
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_cursor)
+        )
+
+    def get_seek_filter(self, fields, values):
+        """
+        Builds the row comparison (a, b) < (x, y) as (a < x) OR (a = x AND b < y), which
+        every backend can answer from a composite index on the ordering columns.
+        """
+        seek = Q()
+        equal = Q()
+
+        for (path, field, descending), value in zip(fields, values):
+            lookup = '{}__{}'.format(path, 'lt' if descending else 'gt')
+            seek |= equal & Q(**{lookup: value})
+            equal &= Q(**{path: value})
+
+        return seek
+
+    def encode_cursor(self, values):
+        payload = json.dumps(values, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError(values)
+            return [field.to_python(value) for (_, field, _), value in zip(fields, values)]
+        except (TypeError, ValueError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_fields(self, model):
+        fields = []
+
+        for name in self.ordering:
+            path = name.lstrip('-')
+            parts = path.split('__')
+            opts = model._meta
+
+            for part in parts[:-1]:
+                opts = opts.get_field(part).related_model._meta
+
+            fields.append((path, opts.get_field(parts[-1]), name.startswith('-')))
+
+        return fields
+
+    @staticmethod
+    def _follow(obj, path):
+        for part in path.split('__')[:-1]:
+            obj = getattr(obj, part)
+        return obj
@@ -0,0 +1,93 @@
+"""
+Primary/replica routing.
+
+Reads only go to a replica inside `replica_reads()`, which ReplicaPinningMiddleware opens for
+safe-method requests from clients that haven't written recently. Everything else (unsafe requests,
+background jobs, management commands, the shell) reads from the primary, so code that writes and
+then reads back never has to think about replication lag.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Lets reads in this thread go to a replica until the block exits or something is written"""
+    previous = getattr(_state, 'replica_reads', False), getattr(_state, 'wrote', False)
+
+    _state.replica_reads = enabled
+    _state.wrote = False
+    _state.replica = None
+
+    try:
+        yield
+    finally:
+        _state.replica_reads, _state.wrote = previous
+
+
+def wrote():
+    """Whether anything has been routed for writing since `replica_reads` was entered"""
+    return getattr(_state, 'wrote', False)
+
+
+def _other_database(hints):
+    """The database of an instance hint outside the primary and its replicas, which Django's default keeps to"""
+    instance = hints.get('instance')
+    db = instance._state.db if instance is not None else None
+
+    if db is not None and db != DEFAULT_DB_ALIAS and db not in get_replicas():
+        return db
+
+    return None
+
+
+class PrimaryReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        other = _other_database(hints)
+        if other is not None:
+            return other
+
+        replicas = get_replicas()
+
+        if not replicas or not getattr(_state, 'replica_reads', False) or getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+
+        # One replica per request keeps its reads consistent with each other
+        alias = getattr(_state, 'replica', None)
+
+        if alias not in replicas:
+            alias = _state.replica = random.choice(replicas)
+
+        return alias
+
+    def db_for_write(self, model, **hints):
+        other = _other_database(hints)
+        if other is not None:
+            return other
+
+        # Reads after a write see it, for the rest of the request
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS}.union(get_replicas())
+
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary
+        return db not in get_replicas()
@@ -0,0 +1,53 @@
+from rest_framework import serializers
+
+from core.models import StatusChangeHistory, STATUS_CHOICES
+
+
+class StatusChangeHistorySerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = StatusChangeHistory
+        fields = ['status', 'status_display', 'timestamp']
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    A status transition for many rows, picked by `ids` or by `filter`, never both.
+    `filter` names must be keys of the `filters` dict in the context, which maps them to ORM lookups.
+    """
+
+    STATUS_NAMES = {name.lower(): value for value, name in STATUS_CHOICES}
+
+    status = serializers.ChoiceField(choices=sorted(STATUS_NAMES))
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, min_length=1, max_length=10000)
+    filter = serializers.DictField(required=False)
+
+    def validate_status(self, value):
+        return self.STATUS_NAMES[value]
+
+    def validate_filter(self, value):
+        allowed = self.context['filters']
+        unknown = sorted(set(value) - set(allowed))
+
+        if not value:
+            raise serializers.ValidationError('At least one filter is required')
+
+        if unknown:
+            raise serializers.ValidationError('Unknown filters: {}. Allowed: {}'.format(
+                ', '.join(unknown), ', '.join(sorted(allowed))
+            ))
+
+        lookups = {}
+
+        for name, filter_value in value.items():
+            if allowed[name] == 'status' and filter_value in self.STATUS_NAMES:
+                filter_value = self.STATUS_NAMES[filter_value]
+            lookups[allowed[name]] = filter_value
+
+        return lookups
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Give either ids or filter')
+        return attrs
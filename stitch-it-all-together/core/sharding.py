@@ -0,0 +1,247 @@
+"""
+Owner-scoped sharding.
+
+Everything a stitcher creates lives on one database alias, picked from DATABASE_SHARDS by
+consistent hashing of the stitcher id, so adding a shard only moves about 1/N of the owners.
+Stitchers, users and other global tables stay on `default`.
+
+Models opt in with a `shard_by` attribute naming the path to the owner id (e.g. 'owner_id' or
+'project.owner_id'). `related_shard_by` maps a related model (by label) to the attribute holding
+that relation's owner id, for relations that cross shards, such as a stitch of another stitcher's media.
+
+Sharded rows get ids from a central ShardSequence so ids stay unique across shards, and querysets
+marked `across_shards()` fan out to every shard and merge the results in order. Aggregates and
+joins to global tables don't cross databases, so code that needs them should stay on one shard.
+
+With DATABASE_SHARDS unset, which is the default, none of this does anything.
+"""
+import bisect
+import hashlib
+import heapq
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Max
+
+VNODES = 64
+"""Points on the ring per shard. More points spread owners more evenly"""
+
+ID_BLOCK_SIZE = 100
+"""Ids reserved from the ShardSequence at a time, per process"""
+
+
+class ShardRing(object):
+
+    def __init__(self, aliases, vnodes=VNODES):
+        points = sorted(
+            (self.hash('{}#{}'.format(alias, i)), alias) for alias in aliases for i in range(vnodes)
+        )
+
+        self.aliases = tuple(aliases)
+        self._hashes = [point for point, _ in points]
+        self._aliases = [alias for _, alias in points]
+
+    @staticmethod
+    def hash(key):
+        return int(hashlib.md5(str(key).encode('utf-8')).hexdigest()[:16], 16)
+
+    def get(self, key):
+        """The alias owning `key`: the first point clockwise from its hash"""
+        index = bisect.bisect(self._hashes, self.hash(key)) % len(self._hashes)
+        return self._aliases[index]
+
+
+_rings = {}
+
+
+def get_shards():
+    return tuple(getattr(settings, 'DATABASE_SHARDS', ()))
+
+
+def is_sharded():
+    return bool(get_shards())
+
+
+def shard_for(owner_id):
+    """The alias holding everything owned by `owner_id`. Rows without an owner live on the first shard"""
+    shards = get_shards()
+
+    if not shards:
+        return None
+
+    if owner_id is None:
+        return shards[0]
+
+    ring = _rings.get(shards)
+
+    if ring is None:
+        ring = _rings[shards] = ShardRing(shards)
+
+    return ring.get(owner_id)
+
+
+def home_db(model, using=None):
+    """
+    The database for an unsharded `model` (e.g. Stitcher or Job) while working with rows on `using`.
+    Unless `using` is a shard that's `using` itself, so single database setups are unaffected.
+    """
+    if using is None or using not in get_shards():
+        return using
+
+    return router.db_for_write(model)
+
+
+def _owner_model():
+    return apps.get_model(getattr(settings, 'SHARD_OWNER_MODEL', 'stitchers.Stitcher'))
+
+
+def get_owner_id(instance):
+    """Follows the `shard_by` path of a sharded instance to its owner id"""
+    if isinstance(instance, _owner_model()):
+        return instance.pk
+
+    value = instance
+
+    for part in instance.shard_by.split('.'):
+        value = getattr(value, part)
+        if value is None:
+            break
+
+    return value
+
+
+class ShardRouter(object):
+    """
+    Routes sharded models by the instance hint Django passes on saves and relation lookups. Without
+    a hint it has no opinion, so queries need `across_shards()` or an explicit `using()`.
+    """
+
+    def _route(self, model, instance):
+        if instance is None or getattr(model, 'shard_by', None) is None or not is_sharded():
+            return None
+
+        crossing = getattr(instance, 'related_shard_by', {}).get(model._meta.label_lower)
+        if crossing:
+            return shard_for(getattr(instance, crossing))
+
+        if isinstance(instance, (model, _owner_model())):
+            return shard_for(get_owner_id(instance))
+
+        if getattr(instance, 'shard_by', None) is not None:
+            # A relation between two rows on the same shard
+            return instance._state.db or shard_for(get_owner_id(instance))
+
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = get_shards()
+
+        if shards and {obj1._state.db, obj2._state.db} <= set(shards) | {'default'}:
+            return True
+
+        return None
+
+
+_id_blocks = {}
+_id_lock = threading.Lock()
+
+
+def _id_model(model):
+    """The model whose table the primary key belongs to, e.g. MediaItem for an ImageAsset"""
+    opts = model._meta.concrete_model._meta
+
+    while opts.pk.remote_field is not None and opts.pk.remote_field.parent_link:
+        opts = opts.pk.remote_field.model._meta
+
+    return opts.model
+
+
+def _reserve_ids(model, size):
+    from core.models import ShardSequence
+
+    using = router.db_for_write(ShardSequence)
+    name = model._meta.label_lower
+
+    with transaction.atomic(using=using):
+        sequences = ShardSequence.objects.using(using).filter(name=name)
+
+        if not sequences.update(last_value=F('last_value') + size):
+            # Start above any id already handed out, e.g. before sharding was turned on
+            start = max(
+                model._base_manager.using(alias).aggregate(top=Max('pk'))['top'] or 0
+                for alias in set(get_shards()) | {using}
+            )
+            try:
+                with transaction.atomic(using=using):
+                    ShardSequence.objects.using(using).create(name=name, last_value=start + size)
+            except IntegrityError:
+                # Another process created it first
+                sequences.update(last_value=F('last_value') + size)
+
+        last = sequences.values_list('last_value', flat=True).get()
+
+    return last - size + 1, last + 1
+
+
+def allocate_id(model):
+    """A primary key for a new row of a sharded model, unique across every shard"""
+    model = _id_model(model)
+
+    with _id_lock:
+        next_id, end = _id_blocks.get(model, (0, 0))
+
+        if next_id >= end:
+            next_id, end = _reserve_ids(model, getattr(settings, 'SHARD_ID_BLOCK_SIZE', ID_BLOCK_SIZE))
+
+        _id_blocks[model] = (next_id + 1, end)
+
+    return next_id
+
+
+class _Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def ordering_key(ordering, get_value, nulls_largest=False):
+    """
+    A sort key for rows ordered by `ordering` (field names, '-' for descending). NULLs sort first
+    ascending, as on SQLite and MySQL, or last with `nulls_largest`, as on PostgreSQL.
+    """
+    fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    def key(row):
+        parts = []
+
+        for name, descending in fields:
+            value = get_value(row, name)
+            part = ((value is None) == nulls_largest, value if value is not None else 0)
+            parts.append(_Descending(part) if descending else part)
+
+        return parts
+
+    return key
+
+
+def merge_sorted(results, ordering, get_value, nulls_largest=False):
+    """
+    Merges per-shard results, each already sorted by `ordering`, into one sorted iterator.
+    `nulls_largest` has to match where the shards' backend sorts NULLs
+    """
+    return heapq.merge(*results, key=ordering_key(ordering, get_value, nulls_largest))
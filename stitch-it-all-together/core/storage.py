@@ -0,0 +1,391 @@
+"""
+Local file storage in two tiers.
+
+Files live under MEDIA_ROOT, the hot tier, until `freeze` moves them to COLD_STORAGE_ROOT, a
+directory on cheaper disk, gzipped when COLD_STORAGE_COMPRESS is on. `thaw` moves them back. A
+file keeps its name on either tier, so rows and URLs never change. Opening a cold file thaws it
+first, and exists(), size() and delete() look at both tiers.
+
+Web servers only see the hot tier. Have them pass misses under MEDIA_URL on to Django (e.g. nginx's
+`try_files $uri @django`), where core.views.serve_media thaws the file and serves it.
+
+Without COLD_STORAGE_ROOT this is a plain FileSystemStorage.
+
+CompressedStorage adds compression on save on top, for files that compress well such as text documents.
+Web servers find those under their name plus .gz or .zst only. nginx serves the gzipped ones with
+`gzip_static always; gunzip on;`, decompressing for clients that don't accept gzip, and everything
+else it doesn't find goes to serve_media as above.
+"""
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+from django.utils.functional import cached_property
+
+GZIP_SUFFIX = '.gz'
+RAW_SUFFIX = '.raw'
+"""Every cold copy gets one of these, so a compressed copy of `a` never collides with a file called `a.gz`"""
+
+COMPRESS_LEVEL = 6
+
+GZIP_SIZE_LIMIT = 1 << 32
+"""gzip records the size modulo this, so larger files are never gzipped and gzip_size stays exact"""
+
+
+def gzip_size(f):
+    """The uncompressed size of an open gzip file, modulo 4 GiB, read from the end of its trailer"""
+    f.seek(-4, os.SEEK_END)
+    return struct.unpack('<I', f.read(4))[0]
+
+
+class TieredStorage(FileSystemStorage):
+
+    def __init__(self, cold_location=None, compress=None, **kwargs):
+        super(TieredStorage, self).__init__(**kwargs)
+        self._cold_location = cold_location
+        self._compress = compress
+
+    @property
+    def cold_location(self):
+        """Root of the cold tier, or None when there isn't one. Read on every use, like the settings it comes from"""
+        location = self._value_or_setting(self._cold_location, getattr(settings, 'COLD_STORAGE_ROOT', None))
+        return os.path.abspath(location) if location else None
+
+    @property
+    def compress(self):
+        return self._value_or_setting(self._compress, getattr(settings, 'COLD_STORAGE_COMPRESS', True))
+
+    def _cold_copy(self, name):
+        """(path, compressed) of the cold copy of `name`, or None"""
+        if not self.cold_location:
+            return None
+
+        path = safe_join(self.cold_location, name)
+
+        for suffix, compressed in ((GZIP_SUFFIX, True), (RAW_SUFFIX, False)):
+            if os.path.exists(path + suffix):
+                return path + suffix, compressed
+
+        return None
+
+    def _write_atomically(self, path, source, compressed):
+        """Streams `source` to `path` through a temporary file, so readers never see half a file"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.tier-')
+
+        try:
+            with os.fdopen(descriptor, 'wb') as target:
+                if compressed:
+                    with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=COMPRESS_LEVEL) as compressor:
+                        shutil.copyfileobj(source, compressor)
+                else:
+                    shutil.copyfileobj(source, target)
+
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def compress_cold(self, name):
+        """Whether the cold copy of `name` is gzipped"""
+        return self.compress
+
+    def get_stored(self, name):
+        """(stored name, content coding) of `name`. Files are always stored as they are here"""
+        return name, None
+
+    def is_cold(self, name):
+        return not os.path.exists(self.path(name)) and self._cold_copy(name) is not None
+
+    def freeze(self, name):
+        """Moves `name` to the cold tier. Returns False when it isn't on the hot tier"""
+        if not self.cold_location:
+            return False
+
+        hot = self.path(name)
+
+        try:
+            source = open(hot, 'rb')
+        except FileNotFoundError:
+            return False
+
+        compressed = self.compress_cold(name) and os.fstat(source.fileno()).st_size < GZIP_SIZE_LIMIT
+
+        with source:
+            self._write_atomically(
+                safe_join(self.cold_location, name) + (GZIP_SUFFIX if compressed else RAW_SUFFIX), source, compressed
+            )
+
+        # Only once the cold copy is complete. A stale copy in the other format would shadow it
+        stale = safe_join(self.cold_location, name) + (RAW_SUFFIX if compressed else GZIP_SUFFIX)
+        for path in (hot, stale):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return True
+
+    def thaw(self, name):
+        """Moves `name` back to the hot tier. Returns False when it isn't on the cold tier"""
+        copy = self._cold_copy(name)
+
+        if copy is None:
+            return False
+
+        path, compressed = copy
+
+        try:
+            source = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+        except FileNotFoundError:
+            # Thawed by someone else in the meantime
+            return False
+
+        with source:
+            self._write_atomically(self.path(name), source, False)
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        return True
+
+    def _open(self, name, mode='rb'):
+        if self.cold_location and not os.path.exists(self.path(name)):
+            self.thaw(name)
+
+        return super(TieredStorage, self)._open(name, mode)
+
+    def exists(self, name):
+        return super(TieredStorage, self).exists(name) or self._cold_copy(name) is not None
+
+    def size(self, name):
+        if os.path.exists(self.path(name)):
+            return super(TieredStorage, self).size(name)
+
+        copy = self._cold_copy(name)
+
+        if copy is None:
+            # Raises the usual FileNotFoundError
+            return super(TieredStorage, self).size(name)
+
+        path, compressed = copy
+
+        if not compressed:
+            return os.path.getsize(path)
+
+        with open(path, 'rb') as f:
+            return gzip_size(f)
+
+    def delete(self, name):
+        super(TieredStorage, self).delete(name)
+
+        if self.cold_location:
+            path = safe_join(self.cold_location, name)
+
+            for suffix in (GZIP_SUFFIX, RAW_SUFFIX):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+
+
+ENCODING_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+"""Content codings CompressedStorage can store, and the suffix of the stored file"""
+
+SAMPLE_SIZE = 64 * 1024
+"""Leading bytes compressed to tell whether a file is worth compressing"""
+
+MIN_SAVING = 0.1
+"""Files are stored as they are unless compression saves at least this fraction"""
+
+ZSTD_LEVEL = 10
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured('zstd compression needs the zstandard package')
+
+    return zstandard
+
+
+def encode(source, target, encoding, size=-1):
+    """Compresses the file `source` into the file `target`"""
+    if encoding == 'zstd':
+        _zstandard().ZstdCompressor(level=ZSTD_LEVEL, write_content_size=True).copy_stream(source, target, size=size)
+    else:
+        with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=COMPRESS_LEVEL, mtime=0) as compressor:
+            shutil.copyfileobj(source, compressor)
+
+
+def decode(source, encoding):
+    """A readable, decompressing file over the compressed file `source`"""
+    if encoding == 'zstd':
+        return _zstandard().ZstdDecompressor().stream_reader(source)
+
+    return gzip.GzipFile(fileobj=source, mode='rb')
+
+
+class DecodedFile(File):
+    """A file CompressedStorage compressed, read back as it was uploaded. Closing it closes the stored file"""
+
+    def __init__(self, stored, encoding, name, storage):
+        super(DecodedFile, self).__init__(decode(stored, encoding), name)
+        self.mode = 'rb'
+        self.stored = stored
+        self.storage = storage
+
+    @cached_property
+    def size(self):
+        return self.storage.size(self.name)
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.stored.close()
+
+
+class CompressedStorage(TieredStorage):
+    """
+    Tiered storage that compresses files as they are saved, with gzip or zstd as DOCUMENT_COMPRESSION
+    says, when that saves at least MIN_SAVING. A compressed file is stored under its name plus the
+    coding's suffix, e.g. notes.txt.gz, which is the layout nginx's gzip_static serves as is to
+    clients accepting it. The name itself stays the one the file was saved as.
+
+    open() decompresses as it reads, size() is the uploaded size and stored_size() the compressed one.
+    Files of GZIP_SIZE_LIMIT or more are never gzipped, gzip can't record their size.
+    """
+
+    def __init__(self, encoding=None, **kwargs):
+        super(CompressedStorage, self).__init__(**kwargs)
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        """The content coding new files are compressed with, or None to store them as they are"""
+        encoding = self._value_or_setting(self._encoding, getattr(settings, 'DOCUMENT_COMPRESSION', 'gzip'))
+
+        if encoding is not None and encoding not in ENCODING_SUFFIXES:
+            raise ImproperlyConfigured('Unknown compression {}, use one of {}'.format(
+                encoding, ', '.join(sorted(ENCODING_SUFFIXES))
+            ))
+
+        return encoding
+
+    def get_stored(self, name):
+        """(stored name, content coding) of `name`. The coding is None when it's stored as it is"""
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if super(CompressedStorage, self).exists(name + suffix):
+                return name + suffix, encoding
+
+        return name, None
+
+    def compress_cold(self, name):
+        # Compressing again gains nothing
+        return super(CompressedStorage, self).compress_cold(name) and not name.endswith(
+            tuple(ENCODING_SUFFIXES.values())
+        )
+
+    def _worth_compressing(self, content, encoding):
+        content.seek(0)
+        head = content.read(SAMPLE_SIZE)
+        content.seek(0)
+
+        if not head:
+            return False
+
+        sample = BytesIO()
+        encode(BytesIO(head), sample, encoding, len(head))
+        return sample.tell() <= len(head) * (1 - MIN_SAVING)
+
+    def _save(self, name, content):
+        encoding = self.encoding
+
+        if encoding == 'gzip' and content.size >= GZIP_SIZE_LIMIT:
+            encoding = None
+
+        if encoding is None or not self._worth_compressing(content, encoding):
+            return super(CompressedStorage, self)._save(name, content)
+
+        suffix = ENCODING_SUFFIXES[encoding]
+
+        with tempfile.TemporaryFile() as compressed:
+            content.seek(0)
+            encode(content, compressed, encoding, content.size)
+
+            if compressed.tell() > content.size * (1 - MIN_SAVING):
+                return super(CompressedStorage, self)._save(name, content)
+
+            compressed.seek(0)
+            stored = super(CompressedStorage, self)._save(name + suffix, File(compressed, name + suffix))
+
+        return stored[:-len(suffix)]
+
+    def _open(self, name, mode='rb'):
+        stored, encoding = self.get_stored(name)
+        f = super(CompressedStorage, self)._open(stored, mode)
+
+        if encoding is None:
+            return f
+
+        return DecodedFile(f, encoding, name, self)
+
+    def exists(self, name):
+        return self.get_stored(name)[1] is not None or super(CompressedStorage, self).exists(name)
+
+    def size(self, name):
+        stored, encoding = self.get_stored(name)
+
+        if encoding is None:
+            return super(CompressedStorage, self).size(name)
+
+        with super(CompressedStorage, self)._open(stored, 'rb') as f:
+            if encoding == 'gzip':
+                return gzip_size(f)
+
+            size = _zstandard().frame_content_size(f.read(18))
+
+        if size < 0:
+            with self.open(name) as f:
+                size = sum(len(chunk) for chunk in f.chunks())
+
+        return size
+
+    def stored_size(self, name):
+        """Bytes `name` takes on the hot tier, compressed if it is"""
+        return super(CompressedStorage, self).size(self.get_stored(name)[0])
+
+    def delete(self, name):
+        for suffix in ENCODING_SUFFIXES.values():
+            super(CompressedStorage, self).delete(name + suffix)
+
+        super(CompressedStorage, self).delete(name)
+
+    def freeze(self, name):
+        return super(CompressedStorage, self).freeze(self.get_stored(name)[0])
+
+    def thaw(self, name):
+        return super(CompressedStorage, self).thaw(self.get_stored(name)[0])
+
+    def is_cold(self, name):
+        return super(CompressedStorage, self).is_cold(self.get_stored(name)[0])
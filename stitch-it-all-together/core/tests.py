@@ -1,15 +1,49 @@
-from datetime import datetime
+import gzip
+import importlib
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
 from unittest import mock
 
 from freezegun import freeze_time
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.db import router
+from django.http import HttpResponse
+from django.urls import Resolver404, clear_url_caches, resolve
 from django.db import connection
 from django.utils.timezone import now
 from django.db.models import Model
 from django.db.models.base import ModelBase
 from django.contrib.contenttypes.models import ContentType
 
-from .models import StatusModel, StatusChangeHistory
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+
+from .admin import EstimatedCountPaginator
+from .db import database_from_env, replicas_from_env
+from .middleware import ReplicaPinningMiddleware
+from .routers import replica_reads
+from .sharding import ShardRing, merge_sorted
+from .storage import TieredStorage, CompressedStorage
+from .views import serve_media
+from .management.commands.profile_startup import group_import_times, parse_importtime
+from .jobs import enqueue, claim_jobs, execute_job, run_pending, requeue_stale, JobQueueFull, PENDING, RUNNING, DONE, FAILED
+from .models import StatusModel, StatusChangeHistory, Job, ReadOnlyInstance, prefetch_status_changes
+
+# Calls made by job_task_spy, which the job tests run as a task
+job_calls = []
+
+
+def job_task_spy(*args):
+    job_calls.append(args)
+
+    if args and args[0] == 'fail':
+        raise ValueError('Asked to fail')
 
 
 class AbstractModelTestCase(TestCase):
@@ -339,6 +373,589 @@ class TestStatusModel(AbstractModelTestCase):
 
         self.model.objects.all()._delete()
 
+    def test_prefetch_status_changes(self):
+        self.model.track_status_changes = True
+
+        instances = [self.model.objects.create() for _ in range(3)]
+
+        for instance in instances:
+            for timestamp, transition in (
+                    ('2020-01-01', instance.archive),
+                    ('2020-01-02', instance.suspend),
+                    ('2020-01-03', instance.enable)):
+                with freeze_time(timestamp):
+                    transition()
+
+        ContentType.objects.get_for_model(self.model)  # Warm the cache as the app does at startup
+
+        with self.assertNumQueries(2):
+            fetched = list(self.model.objects.filter(pk__in=[i.pk for i in instances]).with_status_changes(latest=2))
+
+            for instance in fetched:
+                self.assertEqual(
+                    [change.status for change in instance.status_changes.all()],
+                    [StatusModel.STATUSES['ENABLED'], StatusModel.STATUSES['SUSPENDED']]
+                )
+
+        # Without a limit the whole timeline is loaded
+        with self.assertNumQueries(1):
+            prefetch_status_changes(fetched)
+
+        for instance in fetched:
+            self.assertEqual(instance.status_changes.count(), 3)
+
+        self.model.objects.all()._delete()
+
+    def test_chunked(self):
+        self.model.track_status_changes = True
+        self.model.objects.bulk_create([self.model(status_update_timestamp=now()) for _ in range(6)])
+
+        self.instance.archive()
+        pks = sorted(self.model.objects.values_list('pk', flat=True))
+
+        # One query per chunk, and the last short one ends the walk
+        with self.assertNumQueries(3):
+            chunks = list(self.model.objects.order_by('-pk').chunked(3))
+
+        self.assertEqual([[instance.pk for instance in chunk] for chunk in chunks], [pks[:3], pks[3:6], pks[6:]])
+
+        # Prefetches run per chunk
+        with self.assertNumQueries(6):
+            chunks = list(self.model.objects.with_status_changes().chunked(3))
+
+        self.assertEqual(len(chunks[0][0].status_changes.all()), 1)
+
+        # Rows without their key look it up first
+        self.assertEqual(
+            [chunk for chunk in self.model.objects.values_list('status', flat=True).chunked(4)],
+            [[StatusModel.STATUSES['ARCHIVED']] + [StatusModel.STATUSES['ENABLED']] * 3, [StatusModel.STATUSES['ENABLED']] * 3]
+        )
+        self.assertEqual([len(chunk) for chunk in self.model.objects.values('pk').chunked(7)], [7])
+        self.assertEqual(list(self.model.objects.filter(pk=0).chunked()), [])
+
+        with mock.patch('core.models.time.sleep') as sleep:
+            list(self.model.objects.chunked(2, throttle=0.5))
+
+        self.assertEqual(sleep.call_count, 3)
+        sleep.assert_called_with(0.5)
+
+        self.model.objects.all()._delete()
+
+    def test_set_status_in_batches(self):
+        self.model.objects.bulk_create([self.model(status_update_timestamp=now()) for _ in range(4)])
+
+        # Per batch of two: its keys, a savepoint, the locked read, the update and the release
+        with self.assertNumQueries(3 * 5):
+            moved = self.model.objects.all().set_status(StatusModel.STATUSES['SUSPENDED'], batch_size=2)
+
+        self.assertEqual(moved, {StatusModel.STATUSES['ENABLED']: 5})
+        self.assertEqual(self.model.objects.suspended().count(), 5)
+
+        self.assertEqual(self.model.objects.all()._delete()[0], 5)
+        self.assertFalse(self.model.all_objects.exists())
+
+    def test_read_only(self):
+        self.instance.archive()
+
+        instance = self.model.objects.read_only().get(pk=self.instance_pk)
+
+        self.assertEqual((instance.pk, instance.status), (self.instance_pk, StatusModel.STATUSES['ARCHIVED']))
+        self.assertEqual(instance.status_update_timestamp, self.instance.status_update_timestamp)
+        self.assertFalse(instance._state.adding)
+        self.assertNotIn('_status', instance.__dict__)
+
+        # Filters, iterator() and deferred fields behave as usual
+        self.assertEqual(list(self.model.objects.read_only().archived().iterator()), [instance])
+        self.assertEqual(list(self.model.objects.read_only().enabled()), [])
+
+        deferred = self.model.objects.read_only().only('pk').get(pk=self.instance_pk)
+        self.assertEqual(deferred.status, StatusModel.STATUSES['ARCHIVED'])
+
+        with self.assertRaises(ReadOnlyInstance):
+            instance.enable()
+
+        self.assertEqual(self.model.objects.get(pk=self.instance_pk).status, StatusModel.STATUSES['ARCHIVED'])
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+
+    def test_count_is_capped(self):
+        content_type = ContentType.objects.get_for_model(Job)
+        start = now()
+
+        StatusChangeHistory.objects.bulk_create([
+            StatusChangeHistory(
+                content_type=content_type, object_id=i, status=StatusModel.STATUSES['ENABLED'],
+                timestamp=start + timedelta(seconds=i)
+            ) for i in range(25)
+        ])
+
+        paginator = EstimatedCountPaginator(StatusChangeHistory.objects.all(), 10)
+        paginator.count_cap = 20
+
+        self.assertEqual(paginator.count, 20)
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(len(paginator.page(2)), 10)
+
+        paginator = EstimatedCountPaginator(StatusChangeHistory.objects.filter(object_id__lt=5), 10)
+        paginator.count_cap = 20
+
+        self.assertEqual(paginator.count, 5)
+
+
+class DatabaseProfileTestCase(TestCase):
+
+    def test_sqlite_defaults(self):
+        database = database_from_env('/srv/stitch', environ={'SQLITE_MMAP_SIZE': '0'})
+
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['NAME'], '/srv/stitch/db.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(dict(database['PRAGMAS']), {
+            'journal_mode': 'wal', 'synchronous': 'normal', 'mmap_size': '0', 'busy_timeout': '5000'
+        })
+
+    def test_server_backend(self):
+        database = database_from_env('/srv/stitch', environ={
+            'DATABASE_ENGINE': 'postgresql', 'DATABASE_NAME': 'stitch', 'DATABASE_HOST': 'db',
+            'DATABASE_CONN_MAX_AGE': 'none', 'DATABASE_HEALTH_CHECKS': 'off',
+        })
+
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['NAME'], database['HOST'], database['PORT']), ('stitch', 'db', ''))
+        self.assertIsNone(database['CONN_MAX_AGE'])
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('PRAGMAS', database)
+
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTestCase(TestCase):
+
+    def test_replicas_from_env(self):
+        primary = database_from_env('/srv/stitch', environ={})
+        replicas = replicas_from_env(primary, environ={'DATABASE_REPLICAS': '/srv/a.sqlite3, /srv/b.sqlite3'})
+
+        self.assertEqual(sorted(replicas), ['replica1', 'replica2'])
+        self.assertEqual(replicas['replica2']['NAME'], '/srv/b.sqlite3')
+        self.assertEqual(replicas['replica2']['TEST'], {'MIRROR': 'default'})
+
+    def test_reads_only_go_to_replicas_when_asked(self):
+        self.assertEqual(router.db_for_read(StatusChangeHistory), 'default')
+
+        with replica_reads():
+            self.assertEqual(StatusChangeHistory.objects.all().db, 'replica1')
+            self.assertEqual(StatusChangeHistory.objects.select_for_update().db, 'default')
+
+            # Reads after a write go to the primary for the rest of the block
+            router.db_for_write(StatusChangeHistory)
+            self.assertEqual(StatusChangeHistory.objects.all().db, 'default')
+
+        self.assertEqual(router.db_for_read(StatusChangeHistory), 'default')
+
+    def test_middleware_pins_after_writes(self):
+        factory = RequestFactory()
+        routed = []
+
+        def view(request):
+            routed.append(router.db_for_read(StatusChangeHistory))
+            if request.method == 'POST':
+                router.db_for_write(StatusChangeHistory)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+
+        response = middleware(factory.get('/'))
+        self.assertNotIn(middleware.cookie_name, response.cookies)
+
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.cookies[middleware.cookie_name]['max-age'], 5)
+
+        request = factory.get('/')
+        request.COOKIES[middleware.cookie_name] = '1'
+        middleware(request)
+
+        self.assertEqual(routed, ['replica1', 'default', 'default'])
+
+
+class ShardRingTestCase(TestCase):
+
+    def test_owners_spread_and_mostly_stay_put(self):
+        owners = range(10000)
+
+        three = ShardRing(['default', 'shard1', 'shard2'])
+        placement = {owner: three.get(owner) for owner in owners}
+
+        counts = [list(placement.values()).count(alias) for alias in three.aliases]
+        self.assertTrue(all(2500 < count < 4200 for count in counts), counts)
+
+        # Adding a shard only takes owners from the others, roughly a quarter of them
+        four = ShardRing(['default', 'shard1', 'shard2', 'shard3'])
+        moved = [owner for owner in owners if four.get(owner) != placement[owner]]
+
+        self.assertTrue(1500 < len(moved) < 3500, len(moved))
+        self.assertEqual({four.get(owner) for owner in moved}, {'shard3'})
+
+    def test_merge_sorted(self):
+        shards = [
+            [{'a': 5, 'b': None}, {'a': 3, 'b': 1}, {'a': 1, 'b': 2}],
+            [{'a': 4, 'b': 7}, {'a': 3, 'b': 2}],
+        ]
+
+        merged = merge_sorted(shards, ['-a', 'b'], lambda row, name: row[name])
+
+        self.assertEqual([(row['a'], row['b']) for row in merged], [(5, None), (4, 7), (3, 1), (3, 2), (1, 2)])
+
+    def test_merge_sorted_nulls(self):
+        shards = [[{'a': None}, {'a': 2}], [{'a': 1}, {'a': 3}]]
+
+        # SQLite and MySQL put NULLs first
+        merged = merge_sorted(shards, ['a'], lambda row, name: row[name])
+        self.assertEqual([row['a'] for row in merged], [None, 1, 2, 3])
+
+        merged = merge_sorted([shard[::-1] for shard in shards], ['-a'], lambda row, name: row[name])
+        self.assertEqual([row['a'] for row in merged], [3, 2, 1, None])
+
+        # PostgreSQL puts them last
+        shards = [[{'a': 2}, {'a': None}], [{'a': 1}, {'a': 3}]]
+        merged = merge_sorted(shards, ['a'], lambda row, name: row[name], nulls_largest=True)
+        self.assertEqual([row['a'] for row in merged], [1, 2, 3, None])
+
+
+class StartupProfileTestCase(TestCase):
+
+    IMPORTTIME = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       200 |        200 |   allauth.account.utils',
+        'import time:       100 |        300 | allauth.account',
+        'import time:        50 |        350 | allauth',
+        'import time:      1000 |       1000 |     django.db.models',
+        'import time:        40 |       1040 | projects.models',
+        'a warning on stderr',
+    ]
+
+    def test_parse(self):
+        imports = list(parse_importtime(self.IMPORTTIME))
+
+        self.assertEqual([i.module for i in imports], [
+            'allauth.account.utils', 'allauth.account', 'allauth', 'django.db.models', 'projects.models'
+        ])
+        self.assertEqual([i.depth for i in imports], [1, 0, 0, 2, 0])
+        self.assertEqual((imports[1].self_us, imports[1].cumulative_us), (100, 300))
+
+    def test_group_by_app(self):
+        groups = group_import_times(parse_importtime(self.IMPORTTIME), ['allauth', 'allauth.account', 'projects'])
+
+        # Submodules count towards the most specific app, anything else towards its package
+        self.assertEqual(groups, [('django', 1000, 1), ('allauth.account', 300, 2), ('allauth', 50, 1), ('projects', 40, 1)])
+
+    def test_api_settings_leave_out_admin_and_registration(self):
+        from stitch import settings_api
+
+        self.assertIn('projects', settings_api.INSTALLED_APPS)
+
+        for app in ('django.contrib.admin', 'django_extensions', 'allauth.socialaccount', 'rest_auth.registration'):
+            self.assertNotIn(app, settings_api.INSTALLED_APPS)
+
+        self.assertNotIn('django.contrib.messages.middleware.MessageMiddleware', settings_api.MIDDLEWARE)
+
+
+class JobTestCase(TestCase):
+
+    task = 'core.tests.job_task_spy'
+
+    def setUp(self):
+        del job_calls[:]
+
+    def test_enqueue_is_idempotent(self):
+        enqueue(self.task, [1], on_commit=False)
+        enqueue(self.task, [1], on_commit=False)
+        enqueue(self.task, [2], on_commit=False)
+
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(sorted(job_calls), [(1,), (2,)])
+
+        # Done jobs are queued again, pending ones absorb repeats
+        enqueue(self.task, [1], on_commit=False)
+        enqueue(self.task, [1], on_commit=False)
+
+        self.assertEqual(Job.objects.filter(status=PENDING).count(), 1)
+
+    def test_enqueue_waits_for_commit(self):
+        with mock.patch('core.jobs.transaction.on_commit') as on_commit:
+            enqueue(self.task, [1])
+
+        self.assertFalse(Job.objects.exists())
+
+        on_commit.call_args[0][0]()
+        self.assertEqual(Job.objects.get().key, 'core.tests.job_task_spy:[1]')
+
+    def test_retries_with_backoff(self):
+        enqueue(self.task, ['fail'], max_attempts=2, on_commit=False)
+
+        self.assertEqual(run_pending(), 1)
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (PENDING, 1))
+        self.assertIn('Asked to fail', job.last_error)
+        self.assertGreater(job.run_after, now() + timedelta(seconds=20))
+
+        # Not due yet
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.update(run_after=now())
+        run_pending()
+
+        self.assertEqual(Job.objects.values_list('status', 'attempts').get(), (FAILED, 2))
+
+    def test_claims_are_exclusive(self):
+        for i in range(5):
+            enqueue(self.task, [i], on_commit=False)
+
+        first = claim_jobs(3)
+        second = claim_jobs(3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(job.pk for job in first) & set(job.pk for job in second))
+        self.assertEqual(claim_jobs(3), [])
+
+        self.assertTrue(execute_job(first[0].pk))
+        self.assertEqual(Job.objects.get(pk=first[0].pk).status, DONE)
+
+        # A runner that died with jobs claimed
+        Job.objects.filter(status=RUNNING).update(claimed_at=now() - timedelta(hours=2))
+        self.assertEqual(requeue_stale(3600), 4)
+
+    def test_backpressure(self):
+        with self.settings(JOB_QUEUE_LIMIT=2):
+            enqueue(self.task, [1], on_commit=False)
+            enqueue(self.task, [2], on_commit=False)
+
+            with self.assertRaises(JobQueueFull):
+                enqueue(self.task, [3], on_commit=False)
+
+    def test_run_jobs_command(self):
+        enqueue(self.task, [1], on_commit=False)
+
+        out = StringIO()
+        call_command('run_jobs', workers=0, once=True, stdout=out)
+
+        self.assertIn('Ran 1 jobs', out.getvalue())
+        self.assertEqual(job_calls, [(1,)])
+
+
+
+class TieredStorageTestCase(TestCase):
+
+    def setUp(self):
+        self.hot = tempfile.mkdtemp()
+        self.cold = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.hot, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.cold, ignore_errors=True)
+
+        self.storage = TieredStorage(location=self.hot, cold_location=self.cold)
+        self.content = b'stitch ' * 1000
+        self.name = self.storage.save('uploads/1/document/notes.txt', ContentFile(self.content))
+
+    def test_freeze_and_thaw(self):
+        self.assertTrue(self.storage.freeze(self.name))
+        self.assertFalse(self.storage.freeze(self.name))
+
+        # Gzipped on the cold tier, and still there as far as anyone asking can tell
+        cold_path = os.path.join(self.cold, self.name + '.gz')
+        self.assertLess(os.path.getsize(cold_path), len(self.content))
+        self.assertFalse(os.path.exists(self.storage.path(self.name)))
+        self.assertTrue(self.storage.is_cold(self.name))
+        self.assertTrue(self.storage.exists(self.name))
+        self.assertEqual(self.storage.size(self.name), len(self.content))
+
+        # A new file can't take the name
+        self.assertNotEqual(self.storage.save(self.name, ContentFile(b'other')), self.name)
+
+        self.assertTrue(self.storage.thaw(self.name))
+        self.assertFalse(os.path.exists(cold_path))
+
+        with self.storage.open(self.name) as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_open_thaws(self):
+        self.storage._compress = False
+        self.storage.freeze(self.name)
+
+        self.assertTrue(os.path.exists(os.path.join(self.cold, self.name + '.raw')))
+        self.assertEqual(self.storage.size(self.name), len(self.content))
+
+        with self.storage.open(self.name) as f:
+            self.assertEqual(f.read(), self.content)
+
+        self.assertFalse(self.storage.is_cold(self.name))
+
+    def test_too_large_to_gzip(self):
+        # gzip would only record the size modulo the limit
+        with mock.patch('core.storage.GZIP_SIZE_LIMIT', len(self.content)):
+            self.storage.freeze(self.name)
+
+        self.assertTrue(os.path.exists(os.path.join(self.cold, self.name + '.raw')))
+        self.assertEqual(self.storage.size(self.name), len(self.content))
+
+    def test_delete_both_tiers(self):
+        self.storage.freeze(self.name)
+        self.storage.delete(self.name)
+
+        self.assertFalse(self.storage.exists(self.name))
+        self.assertEqual(os.listdir(os.path.join(self.cold, 'uploads/1/document')), [])
+
+    def test_single_tier(self):
+        storage = TieredStorage(location=self.hot)
+
+        with self.settings(COLD_STORAGE_ROOT=None):
+            self.assertFalse(storage.freeze(self.name))
+            self.assertFalse(storage.is_cold(self.name))
+            self.assertTrue(storage.exists(self.name))
+
+    def test_serve_media_thaws(self):
+        self.storage.freeze(self.name)
+
+        storage = CompressedStorage(location=self.hot, cold_location=self.cold)
+
+        with mock.patch('core.views.media_storage', storage), self.settings(MEDIA_ROOT=self.hot):
+            response = serve_media(RequestFactory().get('/media/' + self.name), self.name)
+
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertFalse(self.storage.is_cold(self.name))
+
+
+class CompressedStorageTestCase(TestCase):
+
+    def setUp(self):
+        self.hot = tempfile.mkdtemp()
+        self.cold = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.hot, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.cold, ignore_errors=True)
+
+        self.storage = CompressedStorage(location=self.hot, cold_location=self.cold, encoding='gzip')
+        self.text = b'Verse one, the same old line\n' * 500
+
+    def _serve(self, name, **headers):
+        with mock.patch('core.views.media_storage', self.storage), self.settings(MEDIA_ROOT=self.hot):
+            return serve_media(RequestFactory().get('/media/' + name, **headers), name)
+
+    def test_text_is_compressed(self):
+        name = self.storage.save('uploads/1/document/lyrics.txt', ContentFile(self.text))
+
+        self.assertEqual(name, 'uploads/1/document/lyrics.txt')
+        self.assertTrue(os.path.exists(os.path.join(self.hot, name + '.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.hot, name)))
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), len(self.text))
+        self.assertLess(self.storage.stored_size(name), len(self.text) / 10)
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), self.text)
+            self.assertEqual(f.size, len(self.text))
+
+        # The same name again doesn't clobber it
+        self.assertNotEqual(self.storage.save(name, ContentFile(self.text)), name)
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_media_route_with_compression(self):
+        import stitch.urls
+
+        def media_routed(path='uploads/1/document/lyrics.txt'):
+            clear_url_caches()
+            try:
+                return resolve('/media/' + path, importlib.reload(stitch.urls)).func
+            except Resolver404:
+                return None
+
+        self.addCleanup(importlib.reload, stitch.urls)
+        self.addCleanup(clear_url_caches)
+
+        with self.settings(DEBUG=False, COLD_STORAGE_ROOT=None, MEDIA_URL='/media/'):
+            with self.settings(DOCUMENT_COMPRESSION=None):
+                self.assertIsNone(media_routed())
+
+            with self.settings(DOCUMENT_COMPRESSION='gzip'):
+                self.assertIs(media_routed(), serve_media)
+                # The rest stays with the web server
+                self.assertIsNone(media_routed('uploads/1/image/2020/1/photo.png'))
+
+            with self.settings(DOCUMENT_COMPRESSION='gzip', COLD_STORAGE_ROOT=self.cold):
+                self.assertIs(media_routed('uploads/1/image/2020/1/photo.png'), serve_media)
+
+    def test_too_large_to_gzip_stored_as_is(self):
+        with mock.patch('core.storage.GZIP_SIZE_LIMIT', len(self.text)):
+            name = self.storage.save('uploads/1/document/long.txt', ContentFile(self.text))
+
+        self.assertEqual(self.storage.get_stored(name), (name, None))
+        self.assertEqual(self.storage.size(name), len(self.text))
+
+    def test_incompressible_stored_as_is(self):
+        data = os.urandom(10000)
+        name = self.storage.save('uploads/1/document/scan.pdf', ContentFile(data))
+
+        self.assertTrue(os.path.exists(os.path.join(self.hot, name)))
+        self.assertEqual(self.storage.stored_size(name), len(data))
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_cold_tier(self):
+        name = self.storage.save('uploads/1/document/lyrics.txt', ContentFile(self.text))
+
+        self.assertTrue(self.storage.freeze(name))
+        self.assertTrue(self.storage.is_cold(name))
+        # Not compressed a second time
+        self.assertTrue(os.path.exists(os.path.join(self.cold, name + '.gz.raw')))
+        self.assertEqual(self.storage.size(name), len(self.text))
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), self.text)
+
+        self.assertFalse(self.storage.is_cold(name))
+
+    def test_serve_encoded(self):
+        name = self.storage.save('uploads/1/document/lyrics.txt', ContentFile(self.text))
+
+        response = self._serve(name, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.text)
+
+        for accept in ('', 'gzip;q=0', 'br'):
+            response = self._serve(name, HTTP_ACCEPT_ENCODING=accept)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(b''.join(response.streaming_content), self.text)
+
+    def test_uncompressed_setting(self):
+        storage = CompressedStorage(location=self.hot)
+
+        with self.settings(DOCUMENT_COMPRESSION=None):
+            name = storage.save('uploads/1/document/lyrics.txt', ContentFile(self.text))
+
+        self.assertEqual(storage.stored_size(name), len(self.text))
 
+    @unittest.skipUnless(importlib.util.find_spec('zstandard'), 'zstandard is not installed')
+    def test_zstd(self):
+        storage = CompressedStorage(location=self.hot, encoding='zstd')
+        name = storage.save('uploads/1/document/lyrics.txt', ContentFile(self.text))
 
+        self.assertTrue(os.path.exists(os.path.join(self.hot, name + '.zst')))
+        self.assertEqual(storage.size(name), len(self.text))
 
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), self.text)
@@ -1,11 +1,63 @@
+import mimetypes
+
+from django.conf import settings
+from django.http import FileResponse
+from django.views.static import serve
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
+from .storage import CompressedStorage
+
+media_storage = CompressedStorage()
+"""Reads every local media file, compressed or not, on either tier"""
+
 
 @api_view(['GET'])
 def api_root(request, format=None):
     return Response({
         'stitchers': reverse('stitcher-list', request=request, format=format),
-        'projects': reverse('project-list', request=request, format=format)
+        'projects': reverse('project-list', request=request, format=format),
+        'media': reverse('mediaitem-list', request=request, format=format)
     })
+
+
+def accepts_encoding(request, encoding):
+    """Whether the Accept-Encoding header allows `encoding`, without q=0"""
+    for accepted in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        token, _, params = accepted.strip().partition(';')
+
+        if token.strip().lower() in (encoding, '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+
+    return False
+
+
+def serve_media(request, path):
+    """
+    Local media, thawing files on the cold tier first. See core.storage. The web server should
+    serve MEDIA_ROOT itself and only pass on what it doesn't find there.
+
+    Compressed files go out as stored with Content-Encoding to clients that accept it, and are
+    decompressed as they stream to the rest.
+    """
+    media_storage.thaw(path)
+    stored, encoding = media_storage.get_stored(path)
+
+    if encoding is None:
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if accepts_encoding(request, encoding):
+        response = FileResponse(open(media_storage.path(stored), 'rb'), content_type=content_type)
+        response['Content-Encoding'] = encoding
+    else:
+        response = FileResponse(media_storage.open(path), content_type=content_type)
+
+    # Named after the stored file otherwise
+    if response.has_header('Content-Disposition'):
+        del response['Content-Disposition']
+
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,16 @@
+"""
+Entry points of job worker processes, see core.jobs.run_worker_pool.
+
+Spawned workers import these before Django is set up, so nothing here may import models at module level.
+"""
+
+
+def init_worker():
+    """Sets up Django in a fresh worker process. Each worker opens its own database connection"""
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    from .jobs import execute_job
+    return execute_job(job_id)
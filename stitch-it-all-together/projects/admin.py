@@ -1,20 +1,82 @@
 from django.contrib import admin
+from django.utils.html import format_html
 
-from .models import Project, ImageAsset, AudioAsset, VideoAsset, DocumentAsset
+from core.admin import LargeTableAdmin
+from stitchers.models import Stitcher
+
+from .models import Project, Stitch, ImageAsset, AudioAsset, VideoAsset, DocumentAsset
 # Register your models here.
 
 
-class ProjectAdmin(admin.ModelAdmin):
-    pass
+class OwnerListFilter(admin.SimpleListFilter):
+    """
+    Filters by owner id without listing every stitcher as a choice. Only the selected owner is
+    looked up, and the owner column links to it.
+    """
+
+    title = 'owner'
+    parameter_name = 'owner'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+
+        if not value or not value.isdigit():
+            return []
+
+        stitcher = Stitcher.objects.select_related('user').filter(pk=value).first()
+
+        return [(value, str(stitcher) if stitcher else value)]
+
+    def has_output(self):
+        return bool(self.lookup_choices)
+
+    def queryset(self, request, queryset):
+        value = self.value()
+
+        if value and value.isdigit():
+            return queryset.filter(owner_id=value)
+
+        return queryset
+
+
+class OwnedAdmin(LargeTableAdmin):
 
+    raw_id_fields = ['owner']
+    list_select_related = ['owner__user']
 
-class MediaItemAdmin(admin.ModelAdmin):
-    readonly_fields = ['size', 'status_update_timestamp']
+    def owner_link(self, obj):
+        if obj.owner_id is None:
+            return '-'
+        return format_html('<a href="?{}={}">{}</a>', OwnerListFilter.parameter_name, obj.owner_id, obj.owner)
+
+    owner_link.short_description = 'owner'
+    owner_link.admin_order_field = 'owner'
+
+
+class ProjectAdmin(OwnedAdmin):
+
+    list_display = ['title', 'type', 'status', 'is_private', 'owner_link', 'stitch_count', 'created_at']
+    list_filter = ['status', 'type', 'is_private', OwnerListFilter]
+    search_fields = ['title']
+
+
+class StitchAdmin(LargeTableAdmin):
+
+    list_display = ['project', 'position', 'contributor', 'created_at']
+    list_select_related = ['project', 'contributor__user']
+    raw_id_fields = ['project', 'media_item', 'contributor']
+
+
+class MediaItemAdmin(OwnedAdmin):
+
+    list_display = ['__str__', 'status', 'size', 'mimetype', 'owner_link', 'created_at']
+    list_filter = ['status', OwnerListFilter]
+    readonly_fields = ['size', 'content_hash', 'mimetype', 'status_update_timestamp']
 
 
 admin.site.register(Project, ProjectAdmin)
+admin.site.register(Stitch, StitchAdmin)
 admin.site.register(ImageAsset, MediaItemAdmin)
 admin.site.register(AudioAsset, MediaItemAdmin)
 admin.site.register(VideoAsset, MediaItemAdmin)
 admin.site.register(DocumentAsset, MediaItemAdmin)
-
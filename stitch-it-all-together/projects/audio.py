@@ -0,0 +1,347 @@
+"""
+WAV reading and waveform peaks for AudioAsset.
+
+NumPy is imported inside the functions that need it so processes that never touch audio don't pay for it.
+"""
+import mmap
+import struct
+from collections import namedtuple
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+PEAKS_MAGIC = b'WPK1'
+
+PEAK_LEVELS = (256, 1024, 4096, 16384)
+"""Frames per bucket for each zoom level, finest first. Each level must be a multiple of the first"""
+
+BLOCK_FRAMES = 1 << 20
+"""Frames decoded at a time, which bounds memory use whatever the length of the file"""
+
+MAX_DATA_SIZE = 0xFFFFFFFF - 36
+"""Largest data chunk a WAV header can describe. The RIFF size field counts 36 more bytes"""
+
+WavInfo = namedtuple('WavInfo', [
+    'format_tag', 'channels', 'sample_rate', 'bits_per_sample', 'block_align', 'data_offset', 'data_size'
+])
+
+PeakLevel = namedtuple('PeakLevel', ['frames_per_bucket', 'peaks'])
+
+
+class WavError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+def read_wav_info(fileobj, max_chunks=64, file_size=None):
+    """
+    Parses the RIFF/WAVE headers of an open binary file, seeking over every chunk body except `fmt `.
+    Only a few dozen bytes are read however large the file is.
+
+    `fileobj` may hold just the start of the file when `file_size` gives the full length.
+    """
+    fileobj.seek(0)
+
+    riff = fileobj.read(12)
+
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise WavError('Not a RIFF/WAVE file')
+
+    fmt = None
+
+    for _ in range(max_chunks):
+        header = fileobj.read(8)
+
+        if len(header) < 8:
+            break
+
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+        if chunk_id == b'fmt ':
+            body = fileobj.read(min(chunk_size, 40))
+
+            if len(body) < 16:
+                raise WavError('Truncated fmt chunk')
+
+            format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack('<HHIIHH', body[:16])
+
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # The real format is the first two bytes of the sub format GUID
+                format_tag = struct.unpack('<H', body[24:26])[0]
+
+            if not channels or not block_align:
+                raise WavError('Invalid fmt chunk: {} channels, {} bytes per frame'.format(channels, block_align))
+
+            # Decoders step through the data a frame at a time, PCM frames have a fixed size
+            frame_size = channels * ((bits_per_sample + 7) // 8)
+            if format_tag in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) and block_align != frame_size:
+                raise WavError('Invalid fmt chunk: {} bytes per frame for {} channels of {} bits'.format(
+                    block_align, channels, bits_per_sample
+                ))
+
+            fmt = (format_tag, channels, sample_rate, bits_per_sample, block_align)
+
+            fileobj.seek(chunk_size - len(body) + (chunk_size & 1), 1)
+
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise WavError('data chunk before fmt chunk')
+
+            data_offset = fileobj.tell()
+
+            # Streamed files may leave the size unset, so trust the file length over the header
+            if file_size is None:
+                fileobj.seek(0, 2)
+                file_size = fileobj.tell()
+            data_size = min(chunk_size, file_size - data_offset)
+
+            return WavInfo(*fmt, data_offset=data_offset, data_size=data_size)
+
+        else:
+            fileobj.seek(chunk_size + (chunk_size & 1), 1)
+
+    raise WavError('No data chunk found')
+
+
+def frames_to_float(data, info):
+    """Decodes raw interleaved frames into a float32 array of shape (frames, channels) in [-1, 1]"""
+    import numpy as np
+
+    width = info.bits_per_sample // 8
+    frames = len(data) // info.block_align
+    data = data[:frames * info.block_align]
+
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        samples = np.frombuffer(data, dtype='<f{}'.format(width)).astype(np.float32)
+
+    elif info.format_tag == WAVE_FORMAT_PCM and width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+
+    elif info.format_tag == WAVE_FORMAT_PCM and width in (2, 4):
+        samples = np.frombuffer(data, dtype='<i{}'.format(width)).astype(np.float32) / float(1 << (8 * width - 1))
+
+    elif info.format_tag == WAVE_FORMAT_PCM and width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples & 0x800000, samples - 0x1000000, samples).astype(np.float32) / float(1 << 23)
+
+    else:
+        raise WavError('Unsupported WAV encoding (format {}, {} bits)'.format(info.format_tag, info.bits_per_sample))
+
+    return samples.reshape(frames, info.channels)
+
+
+def float_to_frames(samples, info):
+    """Encodes a float array of shape (frames, channels) back into raw interleaved frames of `info`'s format"""
+    import numpy as np
+
+    width = info.bits_per_sample // 8
+    samples = np.clip(samples.reshape(-1), -1.0, 1.0)
+
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        return samples.astype('<f{}'.format(width)).tobytes()
+
+    if info.format_tag == WAVE_FORMAT_PCM and width == 1:
+        return np.round(samples * 127 + 128).astype(np.uint8).tobytes()
+
+    if info.format_tag == WAVE_FORMAT_PCM and width in (2, 4):
+        scale = float((1 << (8 * width - 1)) - 1)
+        return np.round(samples.astype(np.float64) * scale).astype('<i{}'.format(width)).tobytes()
+
+    if info.format_tag == WAVE_FORMAT_PCM and width == 3:
+        ints = np.round(samples * 8388607.0).astype('<i4')
+        return ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+    raise WavError('Unsupported WAV encoding (format {}, {} bits)'.format(info.format_tag, info.bits_per_sample))
+
+
+def write_wav_header(fileobj, info, data_size):
+    """Writes a canonical 44 byte header. Call again with the final size once the data is written"""
+    if data_size > MAX_DATA_SIZE:
+        raise WavError('{} bytes of audio don\'t fit in a WAV file'.format(data_size))
+
+    byte_rate = info.sample_rate * info.block_align
+
+    fileobj.write(b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE')
+    fileobj.write(b'fmt ' + struct.pack(
+        '<IHHIIHH', 16, info.format_tag, info.channels, info.sample_rate, byte_rate, info.block_align, info.bits_per_sample
+    ))
+    fileobj.write(b'data' + struct.pack('<I', data_size))
+
+
+def iter_frame_blocks(fileobj, info, block_frames=BLOCK_FRAMES):
+    """
+    Yields the data chunk as float32 blocks of at most `block_frames` frames.
+
+    Real files are memory mapped so blocks are decoded straight from the page cache, anything
+    else (e.g. remote storage) is read block by block.
+    """
+    block_bytes = block_frames * info.block_align
+
+    try:
+        mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        mapped = None
+
+    if mapped is None:
+        fileobj.seek(info.data_offset)
+        remaining = info.data_size
+
+        while remaining > 0:
+            data = fileobj.read(min(block_bytes, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield frames_to_float(data, info)
+        return
+
+    # Decoded blocks are copies, so pages behind the cursor can be dropped. Otherwise a long file ends
+    # up wholly resident in this process (madvise is Python 3.8+, older versions just keep them)
+    madvise = getattr(mapped, 'madvise', None)
+    dontneed = getattr(mmap, 'MADV_DONTNEED', None)
+
+    view = memoryview(mapped)
+
+    try:
+        end = info.data_offset + info.data_size
+        released = 0
+
+        for start in range(info.data_offset, end, block_bytes):
+            yield frames_to_float(view[start:min(start + block_bytes, end)], info)
+
+            if madvise is not None and dontneed is not None:
+                done = min(start + block_bytes, end)
+                done -= done % mmap.PAGESIZE
+                if done > released:
+                    madvise(dontneed, released, done - released)
+                    released = done
+    finally:
+        view.release()
+
+        try:
+            mapped.close()
+        except BufferError:
+            # A block is still referenced, e.g. from the traceback of a decoding error. The map
+            # closes once that is collected
+            pass
+
+
+def _reduce_peaks(mins, maxs, factor):
+    import numpy as np
+
+    buckets = -(-len(mins) // factor)
+    pad = buckets * factor - len(mins)
+
+    mins = np.concatenate([mins, np.full(pad, mins[-1] if len(mins) else 0, dtype=mins.dtype)])
+    maxs = np.concatenate([maxs, np.full(pad, maxs[-1] if len(maxs) else 0, dtype=maxs.dtype)])
+
+    return mins.reshape(buckets, factor).min(axis=1), maxs.reshape(buckets, factor).max(axis=1)
+
+
+def compute_peaks(fileobj, levels=PEAK_LEVELS, block_frames=BLOCK_FRAMES):
+    """
+    Computes min/max peaks of every channel mixed together for each zoom level.
+
+    Only the finest level is computed from samples. Coarser levels are reduced from it, so the
+    audio is decoded once. Returns the WavInfo and a list of PeakLevel holding int8 (min, max) pairs.
+    """
+    import numpy as np
+
+    info = read_wav_info(fileobj)
+
+    finest = levels[0]
+    # Keep blocks aligned to whole buckets so no bucket straddles two blocks
+    block_frames = max(finest, block_frames - block_frames % finest)
+
+    mins, maxs = [], []
+
+    for block in iter_frame_blocks(fileobj, info, block_frames):
+        frames = len(block)
+        whole = frames - frames % finest
+
+        if whole:
+            buckets = block[:whole].reshape(-1, finest * info.channels)
+            mins.append(buckets.min(axis=1))
+            maxs.append(buckets.max(axis=1))
+
+        if whole < frames:
+            tail = block[whole:]
+            mins.append(np.array([tail.min()], dtype=np.float32))
+            maxs.append(np.array([tail.max()], dtype=np.float32))
+
+    finest_mins = np.concatenate(mins) if mins else np.zeros(0, dtype=np.float32)
+    finest_maxs = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.float32)
+
+    result = []
+
+    for frames_per_bucket in levels:
+        level_mins, level_maxs = (
+            (finest_mins, finest_maxs) if frames_per_bucket == finest
+            else _reduce_peaks(finest_mins, finest_maxs, frames_per_bucket // finest)
+        )
+
+        pairs = np.empty(len(level_mins) * 2, dtype=np.int8)
+        pairs[0::2] = np.clip(np.round(level_mins * 127), -127, 127)
+        pairs[1::2] = np.clip(np.round(level_maxs * 127), -127, 127)
+
+        result.append(PeakLevel(frames_per_bucket, pairs.tobytes()))
+
+    return info, result
+
+
+def encode_peaks(info, levels):
+    """
+    The sidecar format, little endian:
+
+        b'WPK1', sample rate (u32), channels (u16), level count (u16)
+        per level: frames per bucket (u32), bucket count (u32)
+        per level: bucket count pairs of (min, max) as int8
+    """
+    parts = [PEAKS_MAGIC, struct.pack('<IHH', info.sample_rate, info.channels, len(levels))]
+
+    for level in levels:
+        parts.append(struct.pack('<II', level.frames_per_bucket, len(level.peaks) // 2))
+
+    parts.extend(level.peaks for level in levels)
+
+    return b''.join(parts)
+
+
+def decode_peaks_header(data):
+    """Returns (sample rate, channels, [(frames per bucket, bucket count, offset)]) from a sidecar"""
+    if data[:4] != PEAKS_MAGIC:
+        raise WavError('Not a peaks file')
+
+    sample_rate, channels, level_count = struct.unpack('<IHH', data[4:12])
+
+    levels = []
+    offset = 12 + 8 * level_count
+
+    for i in range(level_count):
+        frames_per_bucket, buckets = struct.unpack('<II', data[12 + 8 * i:20 + 8 * i])
+        levels.append((frames_per_bucket, buckets, offset))
+        offset += buckets * 2
+
+    return sample_rate, channels, levels
+
+
+def extract_peaks_level(data, index):
+    """Cuts a single zoom level out of a sidecar, as a sidecar of its own"""
+    sample_rate, channels, levels = decode_peaks_header(data)
+
+    # Negative indexes would count from the coarsest level
+    if index < 0:
+        raise IndexError('No peaks level {}'.format(index))
+
+    frames_per_bucket, buckets, offset = levels[index]
+
+    return b''.join([
+        PEAKS_MAGIC,
+        struct.pack('<IHH', sample_rate, channels, 1),
+        struct.pack('<II', frames_per_bucket, buckets),
+        data[offset:offset + buckets * 2]
+    ])
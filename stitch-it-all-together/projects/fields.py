@@ -0,0 +1,37 @@
+from django.db import models
+from django.db.models.fields.files import FieldFile, ImageFieldFile, ImageFileDescriptor
+
+from .ingest import get_ingest_result
+
+
+class IngestedImageFieldFile(ImageFieldFile):
+
+    def _get_image_dimensions(self):
+        # A new upload has its dimensions from the ingest pass, don't open it again to find them
+        if not self._committed and not hasattr(self, '_dimensions_cache'):
+            result = get_ingest_result(self, image=True)
+            self._dimensions_cache = (result.width, result.height)
+
+        return super(IngestedImageFieldFile, self)._get_image_dimensions()
+
+
+class IngestedImageFileDescriptor(ImageFileDescriptor):
+
+    def __set__(self, instance, value):
+        previous = instance.__dict__.get(self.field.attname)
+
+        # Storing an upload assigns the name it was stored under. Its dimensions are already known,
+        # so skip the forced update that would open the stored copy to measure it again
+        if (isinstance(value, str) and isinstance(previous, FieldFile) and previous.name == value
+                and hasattr(previous, '_dimensions_cache')):
+            instance.__dict__[self.field.attname] = value
+            return
+
+        super(IngestedImageFileDescriptor, self).__set__(instance, value)
+
+
+class IngestedImageField(models.ImageField):
+    """An ImageField whose new uploads are measured by projects.ingest, in the same read as everything else"""
+
+    attr_class = IngestedImageFieldFile
+    descriptor_class = IngestedImageFileDescriptor
@@ -0,0 +1,94 @@
+"""
+Single pass inspection of uploaded files.
+
+One read of an upload gives its size, SHA-256, sniffed MIME type and, for images, its dimensions.
+The result is cached on the uploaded file object. FileValidatorFunction, MediaItem.save and
+IngestedImageField then all use it, and storing the file is the only other time it is read.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.db.models.fields.files import FieldFile
+
+CHUNK_SIZE = 1 << 20
+"""Bytes hashed per read. Large enough that hashing releases the GIL for most of the work"""
+
+HEAD_SIZE = 64 * 1024
+"""Leading bytes kept for sniffers that need more than the MIME type, e.g. WAV headers"""
+
+SNIFF_SIZE = 2048
+"""Leading bytes given to libmagic"""
+
+IngestResult = namedtuple('IngestResult', ['size', 'content_hash', 'mimetype', 'width', 'height', 'head'])
+
+
+def sniff_mimetype(head):
+    """The MIME type libmagic finds in the leading bytes, or None without python-magic"""
+    try:
+        import magic
+    except ImportError:
+        return None
+
+    return magic.from_buffer(head[:SNIFF_SIZE], mime=True)
+
+
+def ingest(fileobj, image=False, chunk_size=CHUNK_SIZE):
+    """
+    Reads `fileobj` once from the start and returns an IngestResult. Leaves it rewound.
+    With `image`, Pillow's incremental parser is fed until it has read the image header.
+    Pixel data is never decoded. width and height stay None when the header can't be parsed.
+    """
+    parser = None
+
+    if image:
+        from PIL import ImageFile
+        parser = ImageFile.Parser()
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    width = height = None
+
+    fileobj.seek(0)
+
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+
+        if len(head) < HEAD_SIZE:
+            head += chunk[:HEAD_SIZE - len(head)]
+
+        if parser is not None:
+            try:
+                parser.feed(chunk)
+            except Exception:
+                # Not an image Pillow understands. Validation reports it
+                parser = None
+            else:
+                if parser.image is not None:
+                    width, height = parser.image.size
+                    parser = None
+
+    fileobj.seek(0)
+
+    return IngestResult(size, digest.hexdigest(), sniff_mimetype(head), width, height, head)
+
+
+def _upload(file):
+    # A FieldFile holding an upload that hasn't been stored yet wraps the uploaded file itself
+    return file.file if isinstance(file, FieldFile) else file
+
+
+def get_ingest_result(file, image=False):
+    """
+    The IngestResult of an uploaded file (or a FieldFile wrapping one), read on first use and
+    cached on the upload. Asking for image dimensions after a pass without them reads it again.
+    """
+    upload = _upload(file)
+    cached = getattr(upload, '_ingest', None)
+
+    if cached is None or (image and not cached[1]):
+        cached = (ingest(upload, image=image), image)
+        upload._ingest = cached
+
+    return cached[0]
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from projects.audio import WavError
+from projects.models import AudioAsset
+
+
+class Command(BaseCommand):
+    help = "Compute waveform peak sidecars for audio assets that don't have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate every waveform, not just the missing ones'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Assets loaded per query'
+        )
+        parser.add_argument(
+            '--throttle', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.all()
+
+        if not options['all']:
+            queryset = queryset.filter(waveform='')
+
+        generated = failed = 0
+
+        for batch in queryset.chunked(options['batch_size'], throttle=options['throttle']):
+            for asset in batch:
+                try:
+                    asset.generate_waveform()
+                    generated += 1
+                except (WavError, OSError) as e:
+                    failed += 1
+                    self.stderr.write('Audio asset {}: {}'.format(asset.pk, e))
+
+        self.stdout.write('Generated {} waveforms, {} failed'.format(generated, failed))
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from projects.audio import WavError
+from projects.models import AudioAsset
+
+
+def read_metadata(asset):
+    try:
+        asset.read_wav_metadata()
+        return None
+    except (WavError, OSError) as e:
+        return e
+
+
+class Command(BaseCommand):
+    help = "Fill the duration, sample rate and channel columns of audio assets from their WAV headers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-read every asset, not just the ones without a duration'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Assets loaded and updated per query'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Headers read concurrently. Reads are tiny and mostly wait on storage'
+        )
+        parser.add_argument(
+            '--throttle', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.only('pk', 'file')
+
+        if not options['all']:
+            queryset = queryset.filter(duration__isnull=True)
+
+        indexed = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for batch in queryset.chunked(options['batch_size'], throttle=options['throttle']):
+                updated = []
+
+                for asset, error in zip(batch, pool.map(read_metadata, batch)):
+                    if error is None:
+                        updated.append(asset)
+                    else:
+                        failed += 1
+                        self.stderr.write('Audio asset {}: {}'.format(asset.pk, error))
+
+                AudioAsset.objects.bulk_update(updated, AudioAsset.WAV_METADATA_FIELDS)
+                indexed += len(updated)
+
+        self.stdout.write('Indexed {} audio assets, {} failed'.format(indexed, failed))
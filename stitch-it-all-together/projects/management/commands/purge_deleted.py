@@ -0,0 +1,123 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.timezone import now
+
+from core.purge import collect, execute
+from core.sharding import get_shards
+from projects.models import MediaItem, Project
+
+
+def delete_file(item):
+    storage, name = item
+
+    try:
+        storage.delete(name)
+        return None
+    except OSError as e:
+        return e
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard delete projects and media that were soft deleted longer ago than the retention window, "
+        "along with everything cascading from them and their stored files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=getattr(settings, 'DELETED_RETENTION_DAYS', 30),
+            help='Only purge rows deleted at least this many days ago (default DELETED_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows purged per transaction'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Files deleted concurrently'
+        )
+        parser.add_argument(
+            '--throttle', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be purged without deleting anything'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(days=options['days'])
+        totals = Counter()
+        files = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for using in get_shards() or [DEFAULT_DB_ALIAS]:
+                # Projects first, their stitches may hold on to media that's also going
+                for model in (Project, MediaItem):
+                    deleted, removed, errors = self.purge(model, using, cutoff, pool, options)
+                    totals.update(deleted)
+                    files += removed
+                    failed += errors
+
+        verb = 'Would purge' if options['dry_run'] else 'Purged'
+        self.stdout.write('{} {} rows ({}) and {} files, {} files failed'.format(
+            verb,
+            sum(totals.values()),
+            ', '.join('{} {}'.format(count, label) for label, count in sorted(totals.items())) or 'nothing',
+            files,
+            failed
+        ))
+
+    def purge(self, model, using, cutoff, pool, options):
+        """
+        Purges `model` on one database a batch at a time. Every batch commits on its own, so an
+        interrupted run loses nothing and the next run carries on with what's left.
+        """
+        expired = model.objects.deleted().using(using).filter(status_update_timestamp__lt=cutoff)
+        total = expired.count()
+
+        deleted = Counter()
+        done = removed = failed = 0
+        started = time.time()
+
+        if not total:
+            return deleted, removed, failed
+
+        for keys in expired.values('pk').chunked(options['batch_size'], options['throttle']):
+
+            if options['dry_run']:
+                plan = collect(model, [key['pk'] for key in keys], using)
+                deleted.update(Counter({m._meta.label: len(pks) for m, pks in plan.deletes}))
+                removed += len(plan.files)
+                done += len(keys)
+                continue
+
+            with transaction.atomic(using=using):
+                # Locked and checked again, in case a row was restored since the keys were read
+                pks = list(
+                    expired.filter(pk__in=[key['pk'] for key in keys]).select_for_update().values_list('pk', flat=True)
+                )
+                plan = collect(model, pks, using)
+                deleted.update(execute(plan, using))
+
+            # Only once the rows are gone, so a rollback never leaves rows without their files
+            for (storage, name), error in zip(plan.files, pool.map(delete_file, plan.files)):
+                if error is None:
+                    removed += 1
+                else:
+                    failed += 1
+                    self.stderr.write('{}: {}'.format(name, error))
+
+            done += len(keys)
+
+            self.stdout.write('{} on {}: {}/{} purged, {:.0f} rows/s'.format(
+                model._meta.verbose_name_plural, using, done, total, done / max(time.time() - started, 1e-6)
+            ))
+
+        return deleted, removed, failed
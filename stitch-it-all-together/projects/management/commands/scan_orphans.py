@@ -0,0 +1,141 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.models import DELETED
+from projects.models import MediaItem
+from projects.orphans import OrphanScanError, get_scan_ranges, orphaned_media_items, scan_range
+
+IN_BATCH_SIZE = 500
+
+
+def _batches(pks):
+    for start in range(0, len(pks), IN_BATCH_SIZE):
+        yield pks[start:start + IN_BATCH_SIZE]
+
+
+class Command(BaseCommand):
+    help = (
+        "Find stored files no media row points at, media whose file is missing, and media items "
+        "without an asset row. Reports only, unless --repair is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Delete orphaned files, clear missing waveforms and soft delete media that is missing its file or asset'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows read per query'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Owner directories scanned concurrently'
+        )
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Leave files modified this recently alone, their upload may still be in progress'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            root = default_storage.path('')
+        except NotImplementedError:
+            raise CommandError('Only media on the local filesystem can be scanned')
+
+        ranges = get_scan_ranges(root)
+        scan = self._scanner(root, options)
+
+        files = 0
+        orphaned_files = []
+        missing = []
+
+        try:
+            if options['workers'] > 1:
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    results = list(pool.map(scan, ranges))
+            else:
+                results = [scan(scan_range_) for scan_range_ in ranges]
+        except OrphanScanError as e:
+            raise CommandError(str(e))
+
+        for result in results:
+            files += result.files
+            orphaned_files.extend(result.orphaned_files)
+            # Only MEDIA_ROOT is walked, so files moved to cold storage aren't missing
+            missing.extend(
+                ref for ref in result.missing if not ref.model._meta.get_field(ref.field).storage.exists(ref.name)
+            )
+
+        for name in orphaned_files:
+            self.stdout.write('Orphaned file: {}'.format(name))
+
+        for ref in missing:
+            self.stdout.write('Missing file: {} {} {} {}'.format(
+                ref.model._meta.verbose_name, ref.pk, ref.field, ref.name
+            ))
+
+        orphaned_items = []
+        for pks in orphaned_media_items(options['batch_size']):
+            orphaned_items.extend(pks)
+            for pk in pks:
+                self.stdout.write('Orphaned media item: {}'.format(pk))
+
+        self.stdout.write('Scanned {} files in {} ranges: {} orphaned files, {} missing files, {} orphaned media items'.format(
+            files, len(ranges), len(orphaned_files), len(missing), len(orphaned_items)
+        ))
+
+        if options['repair']:
+            self.repair(orphaned_files, missing, orphaned_items)
+
+    def _scanner(self, root, options):
+        grace = options['grace_hours'] * 3600
+        threaded = options['workers'] > 1
+
+        def scan(range_):
+            try:
+                return scan_range(root, range_, options['batch_size'], grace)
+            finally:
+                # Each worker thread has connections of its own
+                if threaded:
+                    connections.close_all()
+
+        return scan
+
+    def repair(self, orphaned_files, missing, orphaned_items):
+        removed = failed = 0
+
+        for name in orphaned_files:
+            try:
+                default_storage.delete(name)
+                removed += 1
+            except OSError as e:
+                failed += 1
+                self.stderr.write('{}: {}'.format(name, e))
+
+        # A waveform can be generated again, so only the column is cleared. Anything else is unusable
+        waveforms = defaultdict(list)
+        broken = set(orphaned_items)
+
+        for ref in missing:
+            if ref.field == 'waveform':
+                waveforms[ref.model].append(ref.pk)
+            else:
+                broken.add(ref.pk)
+
+        for model, pks in waveforms.items():
+            for batch in _batches(pks):
+                model.objects.including_deleted().across_shards().filter(pk__in=batch).update(waveform='')
+
+        # Through set_status, so the owner's counters and the history are kept right
+        broken = sorted(broken)
+        for batch in _batches(broken):
+            MediaItem.objects.including_deleted().filter(pk__in=batch).across_shards().set_status(DELETED)
+
+        self.stdout.write('Deleted {} files ({} failed), cleared {} waveforms and deleted {} media items'.format(
+            removed, failed, sum(len(pks) for pks in waveforms.values()), len(broken)
+        ))
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from core.models import ARCHIVED, ENABLED, SUSPENDED
+from projects.models import MediaItem
+
+
+def hot_path(file):
+    """Where the file is on the hot tier, compressed or not"""
+    return file.storage.path(file.storage.get_stored(file.name)[0])
+
+
+def freeze(file):
+    """Bytes moved off the hot tier, 0 when the file wasn't there"""
+    try:
+        size = os.path.getsize(hot_path(file))
+    except FileNotFoundError:
+        return 0
+
+    return size if file.storage.freeze(file.name) else 0
+
+
+def last_used(file):
+    """When the file was last read or written, going by the hot tier's atime. None once it's cold"""
+    try:
+        stat = os.stat(hot_path(file))
+    except FileNotFoundError:
+        return None
+
+    return max(stat.st_atime, stat.st_mtime)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the files of archived media, and of media nobody has used for a while, to cold storage. "
+        "Archiving an item moves its files as well, this catches bulk status changes and unused files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--unused-days', type=float, default=getattr(settings, 'COLD_STORAGE_UNUSED_DAYS', None),
+            help='Also move files not read for this many days (default COLD_STORAGE_UNUSED_DAYS). '
+                 'Relies on the file system recording access times, as relatime does'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Media items loaded per query'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Files moved concurrently'
+        )
+        parser.add_argument(
+            '--throttle', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would move without moving anything'
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'COLD_STORAGE_ROOT', None):
+            raise CommandError('COLD_STORAGE_ROOT is not set')
+
+        queryset = MediaItem.objects.with_type_instances().across_shards()
+        sweeps = [('archived', queryset.filter(status=ARCHIVED), None)]
+
+        if options['unused_days'] is not None:
+            cutoff = now() - timedelta(days=options['unused_days'])
+            sweeps.append((
+                'unused',
+                # Nothing created since the cutoff can have gone unused that long
+                queryset.filter(status__in=(ENABLED, SUSPENDED), created_at__lt=cutoff),
+                cutoff.timestamp()
+            ))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for label, items, cutoff in sweeps:
+                files = moved = 0
+
+                for batch in items.chunked(options['batch_size'], throttle=options['throttle']):
+                    candidates = self.get_candidates(batch, cutoff)
+
+                    if options['dry_run']:
+                        files += len(candidates)
+                        moved += sum(os.path.getsize(hot_path(file)) for file in candidates)
+                        continue
+
+                    for size in pool.map(freeze, candidates):
+                        if size:
+                            files += 1
+                            moved += size
+
+                verb = 'Would move' if options['dry_run'] else 'Moved'
+                self.stdout.write('{} {} files of {} media to cold storage, {} bytes'.format(verb, files, label, moved))
+
+    def get_candidates(self, batch, cutoff):
+        """Files of the batch still on the hot tier and, given a cutoff, last used before it"""
+        candidates = []
+
+        for item in batch:
+            for file in item.get_stored_files():
+                if not getattr(file.storage, 'cold_location', None):
+                    continue
+
+                used = last_used(file)
+
+                if used is not None and (cutoff is None or used < cutoff):
+                    candidates.append(file)
+
+        return candidates
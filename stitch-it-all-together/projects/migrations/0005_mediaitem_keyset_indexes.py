@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_audioasset_documentasset_imageasset_mediaitem_videoasset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['created_at', 'id'], name='mediaitem_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='mediaitem_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_mediaitem_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['is_private', 'owner'], name='project_visibility_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_project_visibility_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioasset',
+            name='waveform',
+            field=models.FileField(blank=True, editable=False, help_text='Precomputed min/max peaks at several zoom levels. See projects.audio.encode_peaks', upload_to='waveforms/'),
+        ),
+    ]
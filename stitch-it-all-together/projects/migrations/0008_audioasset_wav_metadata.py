@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_audioasset_waveform'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioasset',
+            name='bits_per_sample',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='audioasset',
+            name='channels',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='audioasset',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, help_text='Length in seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='audioasset',
+            name='frame_count',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='audioasset',
+            name='sample_rate',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='audioasset',
+            index=models.Index(fields=['duration', 'mediaitem_ptr'], name='audioasset_duration_idx'),
+        ),
+    ]
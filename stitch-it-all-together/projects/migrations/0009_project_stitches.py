@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stitchers', '0003_stitcher_storage_quota'),
+        ('projects', '0008_audioasset_wav_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='stitch_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Stitch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('position', models.PositiveIntegerField()),
+                ('contributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stitches', to='stitchers.stitcher')),
+                ('media_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stitches', to='projects.mediaitem')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stitches', to='projects.project')),
+            ],
+            options={
+                'ordering': ['project', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stitch',
+            constraint=models.UniqueConstraint(fields=('project', 'position'), name='stitch_project_position_uniq'),
+        ),
+    ]
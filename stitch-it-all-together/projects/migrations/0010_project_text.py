@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stitchers', '0003_stitcher_storage_quota'),
+        ('projects', '0009_project_stitches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectText',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='projects.project')),
+                ('text', models.TextField(blank=True, default='')),
+                ('revision', models.PositiveIntegerField(default=0)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TextSegment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('revision', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('line_start', models.PositiveIntegerField(editable=False)),
+                ('line_count', models.PositiveIntegerField(editable=False)),
+                ('contributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_segments', to='stitchers.stitcher')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_segments', to='projects.project')),
+            ],
+            options={
+                'ordering': ['project', 'revision'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='textsegment',
+            constraint=models.UniqueConstraint(fields=('project', 'revision'), name='textsegment_project_revision_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:31
+
+from django.db import migrations, models
+import projects.fields
+import projects.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_project_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='SHA-256 of the file', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='mimetype',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Sniffed from the file contents. Blank when python-magic isn't installed", max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='imageasset',
+            name='file',
+            field=projects.fields.IngestedImageField(height_field='height', upload_to=projects.models.MediaItem.upload_to, width_field='width'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_mediaitem_ingest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['type', 'status'], name='project_type_idx'),
+        ),
+    ]
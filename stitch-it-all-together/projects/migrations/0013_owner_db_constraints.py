@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stitchers', '0003_stitcher_storage_quota'),
+        ('projects', '0012_project_type_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediaitem',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Null allowed for things like files used in the system or a base suite of templates', null=True, on_delete=django.db.models.deletion.CASCADE, to='stitchers.stitcher'),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='projects', to='stitchers.stitcher'),
+        ),
+        migrations.AlterField(
+            model_name='stitch',
+            name='contributor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='stitches', to='stitchers.stitcher'),
+        ),
+        migrations.AlterField(
+            model_name='stitch',
+            name='media_item',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='stitches', to='projects.mediaitem'),
+        ),
+        migrations.AlterField(
+            model_name='textsegment',
+            name='contributor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='text_segments', to='stitchers.stitcher'),
+        ),
+    ]
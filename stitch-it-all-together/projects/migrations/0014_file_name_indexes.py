@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:12
+
+from django.db import migrations, models
+import projects.fields
+import projects.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_owner_db_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audioasset',
+            name='file',
+            field=models.FileField(db_index=True, upload_to=projects.models.MediaItem.upload_to, validators=[projects.models.FileValidatorFunction(allowed_extensions=[], allowed_mimetypes=['audio/vnd.wave', 'audio/wav', 'audio/wave', 'audio/x-wav'], max_file_size=None)]),
+        ),
+        migrations.AlterField(
+            model_name='audioasset',
+            name='waveform',
+            field=models.FileField(blank=True, db_index=True, editable=False, help_text='Precomputed min/max peaks at several zoom levels. See projects.audio.encode_peaks', upload_to='waveforms/'),
+        ),
+        migrations.AlterField(
+            model_name='documentasset',
+            name='file',
+            field=models.FileField(db_index=True, upload_to=projects.models.MediaItem.upload_to, validators=[projects.models.FileValidatorFunction(allowed_extensions=[], allowed_mimetypes=['text/text', 'application/pdf'], max_file_size=None)]),
+        ),
+        migrations.AlterField(
+            model_name='imageasset',
+            name='file',
+            field=projects.fields.IngestedImageField(db_index=True, height_field='height', upload_to=projects.models.MediaItem.upload_to, width_field='width'),
+        ),
+        migrations.AlterField(
+            model_name='videoasset',
+            name='file',
+            field=models.FileField(db_index=True, upload_to=projects.models.MediaItem.upload_to, validators=[projects.models.FileValidatorFunction(allowed_extensions=[], allowed_mimetypes=['video/mpg', 'video/mov', 'application/csv'], max_file_size=None)]),
+        ),
+    ]
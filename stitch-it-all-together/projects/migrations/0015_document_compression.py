@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:20
+
+import core.storage
+from django.db import migrations, models
+import projects.models
+
+
+def backfill_stored_size(apps, schema_editor):
+    # Everything stored so far is stored as uploaded
+    MediaItem = apps.get_model('projects', 'MediaItem')
+    MediaItem.objects.using(schema_editor.connection.alias).update(stored_size=models.F('size'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_file_name_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='stored_size',
+            field=models.IntegerField(default=0, editable=False, help_text='Bytes the file takes in storage. Less than size when the storage compresses it'),
+        ),
+        migrations.AlterField(
+            model_name='documentasset',
+            name='file',
+            field=models.FileField(db_index=True, storage=core.storage.CompressedStorage(), upload_to=projects.models.MediaItem.upload_to, validators=[projects.models.FileValidatorFunction(allowed_extensions=[], allowed_mimetypes=['text/text', 'application/pdf'], max_file_size=None)]),
+        ),
+        migrations.RunPython(backfill_stored_size, migrations.RunPython.noop),
+    ]
@@ -1,27 +1,65 @@
+import importlib.util
 import warnings
 import os
+from collections import Counter, defaultdict
+from io import BytesIO
 
 from django.db import models
 
-from django.db import models
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models, router, transaction
+from django.db.models import signals
 from django.utils.timezone import now
 
 from core.models import StatusModel, StatusModelQuerySet, StatusModelManager
-from core.models import TimestampedModel
+from core.models import Job, TimestampedModel, ARCHIVED, ENABLED
+from core.jobs import enqueue, JobQueueFull
+from core.storage import CompressedStorage
+from core.sharding import home_db, is_sharded, shard_for
+
+from stitchers.models import Stitcher
 
+from .fields import IngestedImageField
+from .ingest import get_ingest_result
 from .utils import FileValidatorFunction
 
 
 class MediaItemQuerySet(StatusModelQuerySet):
 
     def for_stitcher(self, stitcher):
-        return self.filter(owner=stitcher)
+        """Media of a stitcher, given as an instance or an id. Read from the stitcher's shard when sharded"""
+        owner_id = getattr(stitcher, 'pk', stitcher)
+        queryset = self.filter(owner_id=owner_id)
+
+        if is_sharded() and self._db is None:
+            queryset = queryset.using(shard_for(owner_id))
+
+        return queryset
 
     def for_user(self, user):
+        if is_sharded():
+            # Stitchers aren't on the shards to join against
+            owner_id = Stitcher.objects.filter(user=user).values_list('pk', flat=True).first()
+            return self.none() if owner_id is None else self.for_stitcher(owner_id)
         return self.filter(owner__user=user)
 
     def public(self):
-        return self.filter(owner__isnull=True)
+        return self.filter(owner__isnull=True).across_shards()
+
+    def visible_to(self, user):
+        """Media the library lists to the user: the public media plus, once signed in, their own"""
+        if user is None or not user.is_authenticated:
+            return self.public()
+
+        # Resolve the owner as a subquery on owner_id, as ProjectQuerySet.visible_to does
+        stitchers = Stitcher.objects.filter(user=user).values('pk')
+
+        if is_sharded():
+            # Stitchers live on default, so there's nothing on the shards to run the subquery against
+            stitchers = list(stitchers.values_list('pk', flat=True))
+
+        return self.filter(models.Q(owner__isnull=True) | models.Q(owner__in=stitchers)).across_shards()
 
     def images(self):
         return self.filter(imageasset__isnull=False)
@@ -35,6 +73,44 @@ class MediaItemQuerySet(StatusModelQuerySet):
     def documents(self):
         return self.filter(documentasset__isnull=False)
 
+    def with_type_instances(self):
+        """
+        Joins every asset table in the same query so `get_type_instance` is answered from
+        the relation cache rather than probing each subclass table per row.
+        """
+        return self.select_related(*MediaItem.TYPE_RELATIONS)
+
+
+class ProjectQuerySet(StatusModelQuerySet):
+
+    def visible_to(self, user):
+        """
+        Projects the user may read: every public project plus their own private ones.
+
+        Mirrors `IsOwnerOrReadOnly` for safe methods so private rows are filtered in SQL
+        rather than fetched and rejected one at a time.
+        """
+        if user is None or not user.is_authenticated:
+            return self.filter(is_private=False).across_shards()
+
+        # Resolve the owner as a subquery on owner_id so (is_private, owner) can be used
+        stitchers = self.model._meta.get_field('owner').related_model.objects.filter(user=user).values('pk')
+
+        if is_sharded():
+            # Stitchers live on default, so there's nothing on the shards to run the subquery against
+            stitchers = list(stitchers.values_list('pk', flat=True))
+
+        return self.filter(models.Q(is_private=False) | models.Q(owner__in=stitchers)).across_shards()
+
+
+class ProjectManager(StatusModelManager):
+
+    def _get_queryset(self):
+        return ProjectQuerySet(model=self.model, using=self._db, hints=self._hints)
+
+    def visible_to(self, user):
+        return self.get_queryset().visible_to(user)
+
 
 class MediaItemManager(StatusModelManager):
 
@@ -52,6 +128,9 @@ class MediaItemManager(StatusModelManager):
     def public(self):
         return self.get_queryset().public()
 
+    def visible_to(self, user):
+        return self.get_queryset().visible_to(user)
+
     def images(self):
         return self.get_queryset().filter(imageasset__isnull=False)
 
@@ -64,6 +143,9 @@ class MediaItemManager(StatusModelManager):
     def documents(self):
         return self.get_queryset().filter(documentasset__isnull=False)
 
+    def with_type_instances(self):
+        return self.get_queryset().with_type_instances()
+
 
 class MediaItemError(Exception):
     def __init__(self, msg):
@@ -91,6 +173,11 @@ class MediaItem(StatusModel, TimestampedModel):
 
     asset_type_name = 'file'
 
+    shard_by = 'owner_id'
+
+    TYPE_RELATIONS = ('imageasset', 'audioasset', 'videoasset', 'documentasset')
+    """Reverse relations from a media item to each asset table"""
+
     track_status_changes = False
 
     name = models.CharField(max_length=255)
@@ -99,16 +186,39 @@ class MediaItem(StatusModel, TimestampedModel):
 
     size = models.IntegerField(help_text="The size of the file in bytes", editable=False, default=0)
 
+    stored_size = models.IntegerField(
+        help_text="Bytes the file takes in storage. Less than size when the storage compresses it", editable=False, default=0
+    )
+
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False, help_text="SHA-256 of the file")
+
+    mimetype = models.CharField(
+        max_length=100, blank=True, default='', editable=False,
+        help_text="Sniffed from the file contents. Blank when python-magic isn't installed"
+    )
+
     owner = models.ForeignKey(
         'stitchers.Stitcher',
         null=True,
         blank=True,
         help_text="Null allowed for things like files used in the system or a base suite of templates",
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        # Stitchers stay on the default database when media is sharded
+        db_constraint=False
     )
 
     objects = MediaItemManager()
 
+    _counted_as = None
+    """The (owner id, size) this item was last counted under, when it has been loaded from the database"""
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the media library, globally and per owner
+            models.Index(fields=['created_at', 'id'], name='mediaitem_created_idx'),
+            models.Index(fields=['owner', 'created_at', 'id'], name='mediaitem_owner_created_idx'),
+        ]
+
     @staticmethod
     def upload_to(instance, filename):
         base_dir = 'public' if not instance.owner else instance.owner.pk
@@ -132,9 +242,8 @@ class MediaItem(StatusModel, TimestampedModel):
         A Validation error will be raised if the allowed mimetypes aren't satisfied or if the upload
         is too large.
         """
-        try:
-            import magic
-        except ImportError:
+        # Only check it's there. Importing libmagic is left to the first upload, not every worker start
+        if importlib.util.find_spec('magic') is None:
             warnings.warn(
                 "python-magic not installed. Simplified file type checking will take place. "
                 "More details https://github.com/ahupp/python-magic"
@@ -159,6 +268,61 @@ class MediaItem(StatusModel, TimestampedModel):
             self.asset_type_name, self.name
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(MediaItem, cls).from_db(db, field_names, values)
+
+        if 'owner_id' in instance.__dict__ and 'size' in instance.__dict__:
+            instance._counted_as = (instance.owner_id, instance.size)
+
+        return instance
+
+    def update_live_counters(self, was_live, is_live, using=None):
+        """Keeps the owner's media count and storage used current, including owner and size changes"""
+
+        before = (self._counted_as or (self.owner_id, self.size)) if was_live else None
+        after = (self.owner_id, self.size) if is_live else None
+
+        self._counted_as = (self.owner_id, self.size)
+
+        if before == after:
+            return
+
+        deltas = {}
+
+        if before is not None and before[0] is not None:
+            count, size = deltas.get(before[0], (0, 0))
+            deltas[before[0]] = (count - 1, size - before[1])
+
+        if after is not None and after[0] is not None:
+            count, size = deltas.get(after[0], (0, 0))
+            deltas[after[0]] = (count + 1, size + after[1])
+
+        for owner_id, (count, size) in deltas.items():
+            if count or size:
+                Stitcher.objects.using(home_db(Stitcher, using)).filter(pk=owner_id).update(
+                    media_count=models.F('media_count') + count,
+                    storage_used=models.F('storage_used') + size
+                )
+
+    bulk_counter_fields = ('owner_id', 'size')
+
+    @classmethod
+    def bulk_update_live_counters(cls, rows, is_live, using=None):
+        sign = 1 if is_live else -1
+        deltas = defaultdict(lambda: [0, 0])
+
+        for row in rows:
+            if row['owner_id'] is not None:
+                deltas[row['owner_id']][0] += sign
+                deltas[row['owner_id']][1] += sign * row['size']
+
+        for owner_id, (count, size) in deltas.items():
+            Stitcher.objects.using(home_db(Stitcher, using)).filter(pk=owner_id).update(
+                media_count=models.F('media_count') + count,
+                storage_used=models.F('storage_used') + size
+            )
+
     def get_file_size(self):
         return 0
 
@@ -181,6 +345,41 @@ class MediaItem(StatusModel, TimestampedModel):
             "Orhaned Media Item: {}".format(self.pk)
         )
 
+    def get_stored_size(self):
+        file = getattr(self, 'file', None)
+        stored_size = getattr(getattr(file, 'storage', None), 'stored_size', None)
+
+        return stored_size(file.name) if file and stored_size else self.size
+
+    def get_stored_files(self):
+        """The files this item keeps in storage, e.g. an audio asset's file and waveform"""
+        asset = self.get_type_instance()
+
+        return [
+            getattr(asset, field.name) for field in asset._meta.concrete_fields
+            if isinstance(field, models.FileField) and getattr(asset, field.name)
+        ]
+
+    def move_to_tier(self, cold):
+        """
+        Moves the stored files to the cold tier, or back to the hot one, where their storage has
+        tiers (see core.storage). Returns how many files moved.
+        """
+        moved = 0
+
+        for file in self.get_stored_files():
+            if getattr(file.storage, 'cold_location', None):
+                moved += file.storage.freeze(file.name) if cold else file.storage.thaw(file.name)
+
+        return moved
+
+    def get_post_process_tasks(self):
+        """
+        (task, args) pairs queued as background jobs once a newly stored file is committed.
+        Anything slow to compute from the file belongs here rather than in save()
+        """
+        return []
+
     def save(self, *args, **kwargs):
 
         if not isinstance(self, (ImageAsset, AudioAsset, VideoAsset, DocumentAsset)):
@@ -188,19 +387,64 @@ class MediaItem(StatusModel, TimestampedModel):
                 "Saving of MediaItem base item not allowed. Please use type instance"
             )
 
-        self.size = self.get_type_instance().get_file_size()
+        file = getattr(self, 'file', None)
+        file_changed = bool(file) and not file._committed
 
+        # Named after the upload, before storing it gives it a path
         if not self.name:
             self.name = self.get_file_name()
-        return super().save(*args, **kwargs)
+
+        if file_changed:
+            # Read once for everything. Usually already done by validation
+            ingested = get_ingest_result(file, image=isinstance(self, ImageAsset))
+
+            self.size = ingested.size
+            self.content_hash = ingested.content_hash
+            self.mimetype = ingested.mimetype or ''
+
+            # Stored ahead of the row rather than by the field, so the row gets what it takes in storage
+            file.save(file.name, file.file, save=False)
+
+        elif self._state.adding:
+            self.size = self.get_type_instance().get_file_size()
+
+        if file_changed or self._state.adding:
+            self.stored_size = self.get_stored_size()
+
+        # Archiving moves the files to cold storage, enabling moves them back
+        retier = (
+            not self._state.adding and self._status != self.status and self.status in (ARCHIVED, ENABLED)
+            and getattr(settings, 'COLD_STORAGE_ROOT', None)
+        )
+
+        resp = super().save(*args, **kwargs)
+
+        if file_changed:
+            try:
+                for task, task_args in self.get_post_process_tasks():
+                    enqueue(task, task_args, using=home_db(Job, self._state.db))
+            except JobQueueFull:
+                # The file is stored and the row saved by now. Uploads are refused ahead of this, anything
+                # else is left to the management commands, e.g. generate_waveforms
+                pass
+
+        if retier:
+            try:
+                enqueue('projects.tasks.sync_storage_tier', [self.pk], using=home_db(Job, self._state.db))
+            except JobQueueFull:
+                # Left to the tier_media sweep. Cold files are thawed when they're opened regardless
+                pass
+
+        return resp
 
 
 class ImageAsset(MediaItem):
 
     asset_type_name = 'image'
 
-    file = models.ImageField(
+    file = IngestedImageField(
         upload_to=MediaItem.upload_to,
+        db_index=True,
         width_field='width',
         height_field='height'
     )
@@ -228,6 +472,7 @@ class AudioAsset(MediaItem):
 
     file = models.FileField(
         upload_to=MediaItem.upload_to,
+        db_index=True,
         validators=(
             MediaItem.get_upload_file_validator(
                 allowed_mimetypes=ALLOWED_MIMETYPES
@@ -235,12 +480,102 @@ class AudioAsset(MediaItem):
         )
     )
 
+    waveform = models.FileField(
+        upload_to='waveforms/',
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="Precomputed min/max peaks at several zoom levels. See projects.audio.encode_peaks"
+    )
+
+    # Read from the WAV headers when the file is stored, so listings never open the file
+
+    duration = models.FloatField(null=True, blank=True, editable=False, help_text="Length in seconds")
+    sample_rate = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    channels = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    bits_per_sample = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    frame_count = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    WAV_METADATA_FIELDS = ('duration', 'sample_rate', 'channels', 'bits_per_sample', 'frame_count')
+
+    class Meta:
+        indexes = [
+            # Sorting and filtering the audio library by length, paged by keyset
+            models.Index(fields=['duration', 'mediaitem_ptr'], name='audioasset_duration_idx'),
+        ]
+
     def get_file_size(self):
         return self.file.size
 
     def get_file_name(self):
         return self.file.name
 
+    def read_wav_metadata(self):
+        """Fills the WAV columns from the fmt and data chunk headers. Only a few dozen bytes are read"""
+        from .audio import read_wav_info, WavError
+
+        if self.file._committed:
+            with self.file.open('rb') as audio:
+                info = read_wav_info(audio)
+        else:
+            # A fresh upload. The headers are almost always within the bytes kept by the ingest pass
+            ingested = get_ingest_result(self.file)
+
+            try:
+                info = read_wav_info(BytesIO(ingested.head), file_size=ingested.size)
+            except WavError:
+                if len(ingested.head) >= ingested.size:
+                    raise
+
+                # Chunks before the data outgrew the head. Leave the upload rewound for storage to save
+                audio = self.file.file
+                try:
+                    info = read_wav_info(audio)
+                finally:
+                    audio.seek(0)
+
+        self.sample_rate = info.sample_rate
+        self.channels = info.channels
+        self.bits_per_sample = info.bits_per_sample
+        self.frame_count = info.data_size // info.block_align if info.block_align else 0
+        self.duration = self.frame_count / float(info.sample_rate) if info.sample_rate else None
+
+    def get_waveform_name(self):
+        return '{}.peaks'.format(self.pk)
+
+    def generate_waveform(self):
+        """Computes the peaks sidecar from the stored file and saves it, replacing any previous one"""
+        from .audio import compute_peaks, encode_peaks
+
+        with self.file.open('rb') as audio:
+            info, levels = compute_peaks(audio)
+
+        if self.waveform:
+            self.waveform.delete(save=False)
+
+        self.waveform.save(self.get_waveform_name(), ContentFile(encode_peaks(info, levels)), save=False)
+
+        # Only touch the sidecar column so a concurrent edit of the asset isn't overwritten
+        AudioAsset.objects.filter(pk=self.pk).update(waveform=self.waveform.name)
+
+    def get_post_process_tasks(self):
+        # Workers need to know which shard to find the asset on
+        args = [self.pk, self._state.db] if is_sharded() else [self.pk]
+        return [('projects.tasks.generate_waveform', args)]
+
+    def save(self, *args, **kwargs):
+        from .audio import WavError
+
+        # The headers are a few dozen bytes, cheap enough to read while the upload is at hand
+        if self.file and not self.file._committed:
+            try:
+                self.read_wav_metadata()
+            except WavError:
+                for field in self.WAV_METADATA_FIELDS:
+                    setattr(self, field, None)
+
+        return super(AudioAsset, self).save(*args, **kwargs)
+
 
 class VideoAsset(MediaItem):
 
@@ -254,6 +589,7 @@ class VideoAsset(MediaItem):
 
     file = models.FileField(
         upload_to=MediaItem.upload_to,
+        db_index=True,
         validators=(
             MediaItem.get_upload_file_validator(
                 allowed_mimetypes=ALLOWED_MIMETYPES
@@ -277,8 +613,11 @@ class DocumentAsset(MediaItem):
 
     asset_type_name = 'document'
 
+    # Text compresses well. PDFs mostly don't and are stored as they are
     file = models.FileField(
         upload_to=MediaItem.upload_to,
+        storage=CompressedStorage(),
+        db_index=True,
         validators=(
             MediaItem.get_upload_file_validator(
                 allowed_mimetypes=ALLOWED_MIMETYPES
@@ -293,10 +632,20 @@ class DocumentAsset(MediaItem):
         return self.file.name
 
 
+class StitchLimitReached(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
 class Project(StatusModel, TimestampedModel):
 
     track_status_changes = True
 
+    shard_by = 'owner_id'
+
     PROJECT_TYPES = sorted([
         (1, 'Music'),
         (2, 'Lyrics'),
@@ -309,10 +658,175 @@ class Project(StatusModel, TimestampedModel):
     type = models.SmallIntegerField(choices=PROJECT_TYPES, default=1)
     max_stitches = models.PositiveSmallIntegerField(null=True, default=None)
     is_private = models.BooleanField(default=False)
-    owner = models.ForeignKey('stitchers.Stitcher', related_name='projects', on_delete=models.CASCADE)
+    owner = models.ForeignKey(
+        'stitchers.Stitcher', related_name='projects', on_delete=models.CASCADE, db_constraint=False
+    )
+
+    # Stitch positions handed out so far. Only moved by reserve_stitch_position, which is what
+    # enforces max_stitches, so it also counts positions whose stitch was later removed.
+    stitch_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('stitch_count',)
+
+    # Projects built from text segments rather than media
+    TEXT_TYPES = (2, 3, 4)
+
+    objects = ProjectManager()
+
+    class Meta:
+        indexes = [
+            # Backs ProjectQuerySet.visible_to
+            models.Index(fields=['is_private', 'owner'], name='project_visibility_idx'),
+            # The admin type filter
+            models.Index(fields=['type', 'status'], name='project_type_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def is_visible_to(self, user):
+        return not self.is_private or (user is not None and user.is_authenticated and self.owner.user_id == user.pk)
+
+    def update_live_counters(self, was_live, is_live, using=None):
+        if was_live != is_live:
+            Stitcher.objects.using(home_db(Stitcher, using)).filter(pk=self.owner_id).update(
+                project_count=models.F('project_count') + (1 if is_live else -1)
+            )
+
+    bulk_counter_fields = ('owner_id',)
+
+    @classmethod
+    def bulk_update_live_counters(cls, rows, is_live, using=None):
+        per_owner = Counter(row['owner_id'] for row in rows)
+
+        # One UPDATE per distinct delta rather than per owner
+        owners_by_delta = defaultdict(list)
+        for owner_id, count in per_owner.items():
+            owners_by_delta[count if is_live else -count].append(owner_id)
+
+        for delta, owner_ids in owners_by_delta.items():
+            Stitcher.objects.using(home_db(Stitcher, using)).filter(pk__in=owner_ids).update(
+                project_count=models.F('project_count') + delta
+            )
+
+    def reserve_stitch_position(self, using=None):
+        """
+        Claims the next stitch position with a single conditional UPDATE, so concurrent contributors
+        never overshoot max_stitches and no table lock is taken. The row lock it takes is held
+        until the surrounding transaction ends, so keep that transaction short.
+        """
+        using = using or router.db_for_write(Project, instance=self)
+        projects = Project.objects.using(using).enabled().filter(pk=self.pk)
+
+        claimed = projects.filter(
+            models.Q(max_stitches__isnull=True) | models.Q(stitch_count__lt=models.F('max_stitches'))
+        ).update(stitch_count=models.F('stitch_count') + 1)
+
+        if not claimed:
+            raise StitchLimitReached('Project {} does not accept more stitches'.format(self.pk))
+
+        # Our UPDATE holds the row until commit, so this reads back exactly the count it wrote
+        self.stitch_count = projects.values_list('stitch_count', flat=True).get()
+        return self.stitch_count
+
+    def add_stitch(self, media_item, contributor):
+        """Appends media_item to the project at the next free position"""
+        using = router.db_for_write(Stitch, instance=self)
+
+        with transaction.atomic(using=using):
+            position = self.reserve_stitch_position(using=using)
+            return Stitch.objects.using(using).create(
+                project=self, media_item=media_item, contributor=contributor, position=position
+            )
+
+    def is_text(self):
+        return self.type in self.TEXT_TYPES
+
     def save(self, *args, **kwargs):
+        # stitch_count is only ever moved by F() updates. Don't write back a stale copy of it. Inserts,
+        # including forced ones of a row that's gone, write every field
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+
         super(Project, self).save(*args, **kwargs)
+
+
+class Stitch(TimestampedModel):
+    """
+    A contribution to a project, in order. Positions start at 1 and are handed out by
+    Project.reserve_stitch_position.
+    """
+
+    project = models.ForeignKey(Project, related_name='stitches', on_delete=models.CASCADE)
+    # The media is the contributor's, so when sharded it's on the contributor's shard
+    media_item = models.ForeignKey(MediaItem, related_name='stitches', on_delete=models.CASCADE, db_constraint=False)
+    contributor = models.ForeignKey(
+        'stitchers.Stitcher', related_name='stitches', on_delete=models.CASCADE, db_constraint=False
+    )
+    position = models.PositiveIntegerField()
+
+    shard_by = 'project.owner_id'
+    related_shard_by = {'projects.mediaitem': 'contributor_id'}
+
+    class Meta:
+        ordering = ['project', 'position']
+        constraints = [
+            # Also the index the stitches of a project are paged by
+            models.UniqueConstraint(fields=['project', 'position'], name='stitch_project_position_uniq'),
+        ]
+
+    def __str__(self):
+        return '{} #{}'.format(self.project, self.position)
+
+
+class TextSegment(TimestampedModel):
+    """
+    A text contribution. Segments are append only and joined with newlines, so the text at any
+    revision is the first `line_start + line_count` lines of the assembled text.
+    Revisions are stitch positions, handed out by Project.reserve_stitch_position.
+    """
+
+    project = models.ForeignKey(Project, related_name='text_segments', on_delete=models.CASCADE)
+    contributor = models.ForeignKey(
+        'stitchers.Stitcher', related_name='text_segments', on_delete=models.CASCADE, db_constraint=False
+    )
+    revision = models.PositiveIntegerField()
+    text = models.TextField()
+    line_start = models.PositiveIntegerField(editable=False)
+    line_count = models.PositiveIntegerField(editable=False)
+
+    shard_by = 'project.owner_id'
+
+    class Meta:
+        ordering = ['project', 'revision']
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'revision'], name='textsegment_project_revision_uniq'),
+        ]
+
+    def __str__(self):
+        return '{} r{}'.format(self.project, self.revision)
+
+
+class ProjectText(models.Model):
+    """
+    The assembled text of a project, extended in place as segments are appended so reading
+    it never touches the segments.
+    """
+
+    project = models.OneToOneField(Project, primary_key=True, related_name='text', on_delete=models.CASCADE)
+    text = models.TextField(blank=True, default='')
+    revision = models.PositiveIntegerField(default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    shard_by = 'project.owner_id'
+
+    def __str__(self):
+        return '{} r{}'.format(self.project, self.revision)
+
+
+signals.post_delete.connect(StatusModel.hard_delete_signal_handler, sender=Project)
+signals.post_delete.connect(StatusModel.hard_delete_signal_handler, sender=MediaItem)
@@ -0,0 +1,220 @@
+"""
+Finds stored files no media row points at, media rows whose file is gone, and media items that
+have lost their asset row.
+
+Files and rows are both walked in name order and joined in a single merge pass, so neither side is
+ever held in memory: the storage tree with os.scandir, sorting one directory at a time, and the
+asset tables by keyset pagination over their indexed file columns. Each directory under uploads/
+(one per owner) is its own range of names and can be scanned in parallel with the others.
+"""
+import heapq
+import os
+import time
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import CharField, F, Func, Q
+
+from core.storage import CompressedStorage, ENCODING_SUFFIXES
+
+from .models import MediaItem, ImageAsset, AudioAsset, VideoAsset, DocumentAsset
+
+FILE_FIELDS = (
+    (ImageAsset, 'file'),
+    (AudioAsset, 'file'),
+    (AudioAsset, 'waveform'),
+    (VideoAsset, 'file'),
+    (DocumentAsset, 'file'),
+)
+"""Every column naming a stored file"""
+
+SCANNED_DIRS = ('uploads', 'waveforms')
+"""Top level directories the file fields store into. Anything else under MEDIA_ROOT is left alone"""
+
+FileRef = namedtuple('FileRef', ['name', 'model', 'pk', 'field'])
+
+ScanRange = namedtuple('ScanRange', ['directory', 'low', 'high'])
+"""Files under `directory`, joined with the rows naming files from `low` up to but excluding `high`"""
+
+ScanResult = namedtuple('ScanResult', ['directory', 'files', 'orphaned_files', 'missing'])
+
+
+class OrphanScanError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+BYTE_ORDER_TEMPLATES = {
+    'sqlite': '%(expressions)s',
+    'postgresql': '%(expressions)s COLLATE "C"',
+    'mysql': 'BINARY %(expressions)s',
+}
+"""
+Compares names byte by byte, i.e. in the code point order Python sorts the files in. SQLite's
+default BINARY collation already does, other backends' defaults fold case and skip punctuation
+"""
+
+
+def byte_order(field, using):
+    """`field` as an expression that sorts and compares in byte order on the database `using`"""
+    vendor = connections[using].vendor
+
+    if vendor not in BYTE_ORDER_TEMPLATES:
+        raise OrphanScanError('Scanning for orphans isn\'t supported on {}'.format(vendor))
+
+    return Func(F(field), template=BYTE_ORDER_TEMPLATES[vendor], output_field=CharField())
+
+
+def compresses(ref):
+    """Whether the file of `ref` may be stored compressed, under its name plus a suffix"""
+    return isinstance(ref.model._meta.get_field(ref.field).storage, CompressedStorage)
+
+
+def walk_sorted(path, prefix):
+    """
+    (name, mtime) of every file below `path` in name order, names starting with `prefix`.
+    Directories sort as their name plus '/', so the order is that of the full names.
+    """
+    try:
+        with os.scandir(path) as entries:
+            entries = sorted(
+                entries, key=lambda entry: entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name
+            )
+    except FileNotFoundError:
+        return
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_sorted(entry.path, prefix + entry.name + '/')
+        elif entry.is_file(follow_symlinks=False):
+            yield prefix + entry.name, entry.stat(follow_symlinks=False).st_mtime
+
+
+def stored_names(model, field, low, high, batch_size):
+    """
+    FileRefs of the rows of `model` with a `field` name in [low, high), in name order, a batch at a time.
+    Names are ordered and compared in byte order whatever the database's collation.
+    """
+    queryset = model.objects.including_deleted().across_shards().exclude(**{field: ''})
+    queryset = queryset.annotate(name_key=byte_order(field, queryset.db))
+
+    if low:
+        queryset = queryset.filter(name_key__gte=low)
+    if high is not None:
+        queryset = queryset.filter(name_key__lt=high)
+
+    queryset = queryset.order_by('name_key', 'pk').values(field, 'name_key', 'pk')
+    last = None
+
+    while True:
+        page = queryset if last is None else queryset.filter(
+            Q(name_key__gt=last['name_key']) | Q(name_key=last['name_key'], pk__gt=last['pk'])
+        )
+        rows = list(page[:batch_size])
+
+        for row in rows:
+            yield FileRef(row[field], model, row['pk'], field)
+
+        if len(rows) < batch_size:
+            return
+
+        last = rows[-1]
+
+
+def get_scan_ranges(root):
+    """
+    Splits every possible file name into consecutive ranges, starting at each directory under
+    uploads/ and at the other scanned directories, so together they cover every row exactly once.
+    """
+    directories = []
+
+    for top in SCANNED_DIRS:
+        if top == 'uploads':
+            try:
+                with os.scandir(os.path.join(root, top)) as entries:
+                    directories.extend(
+                        'uploads/' + entry.name for entry in entries if entry.is_dir(follow_symlinks=False)
+                    )
+            except FileNotFoundError:
+                pass
+        else:
+            directories.append(top)
+
+    starts = sorted(directory + '/' for directory in directories)
+
+    # Rows before the first directory, e.g. in a directory that was removed, go in a range of their own
+    ranges = [ScanRange(None, '', starts[0] if starts else None)]
+
+    for i, start in enumerate(starts):
+        ranges.append(ScanRange(start[:-1], start, starts[i + 1] if i + 1 < len(starts) else None))
+
+    return ranges
+
+
+def scan_range(root, scan, batch_size=1000, grace=24 * 3600):
+    """
+    Merges the files of one ScanRange with the rows naming them. Files modified within `grace`
+    seconds are never reported, their row may not be committed yet.
+    """
+    files = walk_sorted(os.path.join(root, scan.directory), scan.directory + '/') if scan.directory else iter(())
+    refs = heapq.merge(
+        *[stored_names(model, field, scan.low, scan.high, batch_size) for model, field in FILE_FIELDS],
+        key=lambda ref: (ref.name, ref.pk)
+    )
+
+    cutoff = time.time() - grace
+    prefix = scan.directory + '/' if scan.directory else None
+    count = 0
+    orphaned_files, missing = [], []
+
+    # Compressed copies of rows already passed, e.g. notes.txt.gz for notes.txt. They sort after the
+    # name, so only the few between a row and its copy are ever held
+    compressed = set()
+
+    current, ref = next(files, None), next(refs, None)
+
+    while current is not None or ref is not None:
+        if ref is None or (current is not None and current[0] < ref.name):
+            count += 1
+            if current[0] in compressed:
+                compressed.discard(current[0])
+            elif current[1] < cutoff:
+                # A file nothing points at
+                orphaned_files.append(current[0])
+            current = next(files, None)
+
+        elif current is None or ref.name < current[0]:
+            copies = [
+                ref.name + suffix for suffix in ENCODING_SUFFIXES.values()
+                if compresses(ref) and os.path.exists(os.path.join(root, ref.name + suffix))
+            ]
+
+            if copies:
+                compressed.update(copies)
+            elif (prefix and ref.name.startswith(prefix)) or not os.path.exists(os.path.join(root, ref.name)):
+                # A row without its file. Names outside the scanned directory weren't listed, so look them up
+                missing.append(ref)
+            ref = next(refs, None)
+
+        else:
+            # Matched. Several rows may share a file
+            name = current[0]
+            count += 1
+            while ref is not None and ref.name == name:
+                ref = next(refs, None)
+            current = next(files, None)
+
+    return ScanResult(scan.directory, count, orphaned_files, missing)
+
+
+def orphaned_media_items(batch_size=1000):
+    """Chunks of primary keys of media items without a row in any asset table"""
+    queryset = MediaItem.objects.including_deleted().across_shards().filter(
+        **{relation + '__isnull': True for relation in MediaItem.TYPE_RELATIONS}
+    )
+
+    for chunk in queryset.values('pk').chunked(batch_size):
+        yield [row['pk'] for row in chunk]
@@ -9,8 +9,10 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
+        # Private objects are only readable by their owner.
         if request.method in permissions.SAFE_METHODS:
-            return True
+            is_visible_to = getattr(obj, 'is_visible_to', None)
+            return is_visible_to(request.user) if is_visible_to else True
 
         # Write permissions are only allowed to the owner of the snippet.
         return obj.owner == request.user.stitcher
\ No newline at end of file
@@ -1,6 +1,11 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from projects.models import Project
+from core.jobs import ensure_capacity
+from core.serializers import StatusChangeHistorySerializer
+from projects.ingest import get_ingest_result
+from projects.models import Project, Stitch, TextSegment, MediaItem, ImageAsset, AudioAsset, VideoAsset, DocumentAsset
 
 
 class ProjectSerializer(serializers.HyperlinkedModelSerializer):
@@ -9,4 +14,167 @@ class ProjectSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Project
-        fields = ['id', 'title', 'description', 'type', 'type_display', 'max_stitches', 'owner']
+        fields = ['id', 'title', 'description', 'type', 'type_display', 'max_stitches', 'stitch_count', 'is_private', 'owner']
+
+
+class ProjectHistorySerializer(ProjectSerializer):
+    """A project with its status timeline. Prefetch it with `with_status_changes`"""
+    status_changes = StatusChangeHistorySerializer(many=True, read_only=True)
+
+    class Meta(ProjectSerializer.Meta):
+        fields = ProjectSerializer.Meta.fields + ['status_changes']
+
+
+class MediaItemSerializer(serializers.ModelSerializer):
+    """
+    Flattens any media item into one typed payload.
+
+    Common columns are read from the MediaItem row. Only the file and image dimensions come from
+    the asset row, which is expected to be joined with `MediaItemQuerySet.with_type_instances`.
+    Asset instances loaded that way have the parent columns deferred, so don't read them here.
+    """
+
+    type = serializers.SerializerMethodField()
+    owner = serializers.HyperlinkedRelatedField(view_name='stitcher-detail', read_only=True)
+    url = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    width = serializers.SerializerMethodField()
+    height = serializers.SerializerMethodField()
+    waveform = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
+    sample_rate = serializers.SerializerMethodField()
+    channels = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MediaItem
+        fields = [
+            'id', 'type', 'name', 'description', 'size', 'stored_size', 'owner', 'created_at',
+            'url', 'thumbnail', 'width', 'height', 'waveform', 'duration', 'sample_rate', 'channels'
+        ]
+
+    def get_type(self, obj):
+        return obj.get_type_instance().asset_type_name
+
+    def get_url(self, obj):
+        return self._absolute_url(obj.get_type_instance().file)
+
+    def get_thumbnail(self, obj):
+        # Images are small enough to be their own preview for now
+        asset = obj.get_type_instance()
+        return self._absolute_url(asset.file) if isinstance(asset, ImageAsset) else None
+
+    def get_width(self, obj):
+        return getattr(obj.get_type_instance(), 'width', None)
+
+    def get_height(self, obj):
+        return getattr(obj.get_type_instance(), 'height', None)
+
+    def get_duration(self, obj):
+        return getattr(obj.get_type_instance(), 'duration', None)
+
+    def get_sample_rate(self, obj):
+        return getattr(obj.get_type_instance(), 'sample_rate', None)
+
+    def get_channels(self, obj):
+        return getattr(obj.get_type_instance(), 'channels', None)
+
+    def get_waveform(self, obj):
+        if not getattr(obj.get_type_instance(), 'waveform', None):
+            return None
+        return reverse('mediaitem-waveform', args=[obj.pk], request=self.context.get('request'))
+
+    def _absolute_url(self, file):
+        if not file:
+            return None
+
+        request = self.context.get('request')
+        return request.build_absolute_uri(file.url) if request else file.url
+
+
+class MediaUploadSerializer(serializers.Serializer):
+    """Creates an asset of the requested type. Responds with the media library payload"""
+
+    ASSET_CLASSES = {
+        asset_class.asset_type_name: asset_class
+        for asset_class in (ImageAsset, AudioAsset, VideoAsset, DocumentAsset)
+    }
+
+    type = serializers.ChoiceField(choices=sorted(ASSET_CLASSES))
+    file = serializers.FileField()
+    name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, attrs):
+        asset_class = self.ASSET_CLASSES[attrs['type']]
+
+        # The ingest pass parses the image header, so images are recognised without another read
+        if asset_class is ImageAsset and get_ingest_result(attrs['file'], image=True).width is None:
+            raise serializers.ValidationError({'file': [serializers.ImageField.default_error_messages['invalid_image']]})
+
+        try:
+            asset_class._meta.get_field('file').run_validators(attrs['file'])
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'file': e.messages})
+
+        return attrs
+
+    def create(self, validated_data):
+        asset_class = self.ASSET_CLASSES[validated_data.pop('type')]
+        asset = asset_class(**validated_data)
+
+        # Refuse the upload before storing it when the post-processing it needs is too far behind
+        if asset.get_post_process_tasks():
+            ensure_capacity()
+
+        asset.save(force_insert=True, using=asset_class.objects.db)
+        return asset
+
+    def to_representation(self, instance):
+        return MediaItemSerializer(instance, context=self.context).data
+
+
+class StitchRenderSerializer(serializers.Serializer):
+    """An ordered list of audio asset ids to render into one file. Ids may repeat"""
+
+    media = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=500)
+    crossfade = serializers.FloatField(min_value=0, max_value=30, default=0)
+    name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def validate_media(self, ids):
+        assets = AudioAsset.objects.enabled().across_shards().in_bulk(set(ids))
+        missing = sorted(set(ids) - set(assets))
+
+        if missing:
+            raise serializers.ValidationError('Not audio media items: {}'.format(', '.join(map(str, missing))))
+
+        return [assets[pk] for pk in ids]
+
+
+class StitchSerializer(serializers.ModelSerializer):
+    """A contribution. Contributors may only stitch their own media"""
+
+    contributor = serializers.HyperlinkedRelatedField(view_name='stitcher-detail', read_only=True)
+    # Media lives on its owner's shard, which needn't be the one the default manager reads from
+    media_item = serializers.PrimaryKeyRelatedField(queryset=MediaItem.objects.across_shards())
+
+    class Meta:
+        model = Stitch
+        fields = ['id', 'position', 'media_item', 'contributor', 'created_at']
+        read_only_fields = ['position']
+
+    def validate_media_item(self, media_item):
+        request = self.context.get('request')
+
+        if request is None or media_item.owner_id != request.user.stitcher.pk:
+            raise serializers.ValidationError('You can only stitch your own media')
+
+        return media_item
+
+
+class TextSegmentSerializer(serializers.ModelSerializer):
+    contributor = serializers.HyperlinkedRelatedField(view_name='stitcher-detail', read_only=True)
+
+    class Meta:
+        model = TextSegment
+        fields = ['id', 'revision', 'text', 'line_start', 'line_count', 'contributor', 'created_at']
+        read_only_fields = ['revision']
@@ -0,0 +1,180 @@
+"""
+Renders stitches: an ordered list of WAV files concatenated, optionally crossfaded, into one WAV.
+
+Audio is streamed through in blocks. Only the current block and the frames held back for the next
+crossfade are in memory, so memory use doesn't depend on how long the inputs are.
+"""
+import itertools
+import tempfile
+
+from django.core.files import File
+
+from .audio import (
+    BLOCK_FRAMES, MAX_DATA_SIZE, WavInfo, WavError, read_wav_info, iter_frame_blocks, float_to_frames, write_wav_header
+)
+
+
+class StitchError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+def _take(blocks, frames):
+    """Reads `frames` frames from a block iterator. Returns them and an iterator over the rest"""
+    import numpy as np
+
+    taken, count = [], 0
+
+    for block in blocks:
+        taken.append(block)
+        count += len(block)
+        if count >= frames:
+            break
+
+    if not taken:
+        return None, blocks
+
+    head = np.concatenate(taken)
+    return head[:frames], itertools.chain([head[frames:]], blocks)
+
+
+def _crossfade(tail, head):
+    """Equal power crossfade, so the loudness doesn't dip in the middle of the overlap"""
+    import numpy as np
+
+    position = (np.arange(len(head), dtype=np.float32) + 0.5) / len(head)
+    fade_in = np.sin(position * np.pi / 2)[:, None]
+    fade_out = np.cos(position * np.pi / 2)[:, None]
+
+    return tail * fade_out + head * fade_in
+
+
+def render_stitch(sources, output, crossfade=0.0, block_frames=BLOCK_FRAMES):
+    """
+    Concatenates WAV files into `output`, a writable and seekable binary file.
+
+    `sources` is an iterable of open binary WAV files, read one after the other. All of them must have
+    the same sample rate and channel count. The output uses the encoding of the first source.
+    `crossfade` is the overlap between neighbours in seconds, shortened where a source is shorter.
+    Returns the WavInfo of the rendered file. Raises StitchError before reading a source that could
+    take the render past what a WAV file can hold.
+    """
+    import numpy as np
+
+    target = None
+    fade = 0
+    written = 0
+    carry = None
+
+    def write(frames):
+        nonlocal written
+        if len(frames):
+            data = float_to_frames(frames, target)
+            output.write(data)
+            written += len(data)
+
+    for index, source in enumerate(sources):
+        info = read_wav_info(source)
+
+        if target is None:
+            target = WavInfo(
+                info.format_tag, info.channels, info.sample_rate, info.bits_per_sample, info.block_align,
+                data_offset=44, data_size=0
+            )
+            fade = int(round(crossfade * info.sample_rate))
+            carry = np.zeros((0, info.channels), dtype=np.float32)
+
+            output.seek(0)
+            write_wav_header(output, target, 0)
+
+        elif (info.sample_rate, info.channels) != (target.sample_rate, target.channels):
+            raise StitchError(
+                'Source {} is {} Hz with {} channels, expected {} Hz with {} channels'.format(
+                    index, info.sample_rate, info.channels, target.sample_rate, target.channels
+                )
+            )
+
+        # Crossfades only ever shorten it
+        frames = len(carry) + info.data_size // info.block_align
+        if written + frames * target.block_align > MAX_DATA_SIZE:
+            raise StitchError('Render too large, a WAV file holds at most {} bytes of audio'.format(MAX_DATA_SIZE))
+
+        blocks = iter_frame_blocks(source, info, block_frames)
+
+        if len(carry):
+            head, blocks = _take(blocks, len(carry))
+
+            if head is not None and len(head):
+                overlap = len(head)
+                write(carry[:len(carry) - overlap])
+                blocks = itertools.chain([_crossfade(carry[len(carry) - overlap:], head)], blocks)
+            else:
+                blocks = itertools.chain([carry], blocks)
+
+            carry = carry[:0]
+
+        for block in blocks:
+            if not fade:
+                write(block)
+                continue
+
+            # Hold back the last `fade` frames. They are mixed into the start of the next source
+            combined = np.concatenate([carry, block]) if len(carry) else block
+            write(combined[:max(len(combined) - fade, 0)])
+            carry = combined[max(len(combined) - fade, 0):]
+
+    if target is None:
+        raise StitchError('Nothing to stitch')
+
+    write(carry)
+
+    output.seek(0)
+    write_wav_header(output, target, written)
+    output.seek(0, 2)
+
+    return target._replace(data_size=written)
+
+
+def _open_each(assets):
+    """Opens the asset files one at a time, closing each before the next is opened"""
+    for asset in assets:
+        with asset.file.open('rb') as audio:
+            yield audio
+
+
+def stitch_project_audio(project, assets, crossfade=0.0, name=None):
+    """
+    Renders the audio assets, in order, into a new AudioAsset owned by the project owner.
+    The render is spooled to a temporary file, never held in memory.
+    """
+    from .models import AudioAsset
+
+    if not assets:
+        raise StitchError('Nothing to stitch')
+
+    for asset in assets:
+        if not isinstance(asset, AudioAsset):
+            raise StitchError('Media item {} is not audio'.format(asset.pk))
+
+    with tempfile.TemporaryFile() as rendered:
+        try:
+            render_stitch(_open_each(assets), rendered, crossfade=crossfade)
+        except WavError as e:
+            raise StitchError(str(e))
+
+        size = rendered.tell()
+        remaining = project.owner.storage_remaining()
+
+        if remaining is not None and size > remaining:
+            raise StitchError('Rendered stitch exceeds the remaining storage quota of the project owner')
+
+        rendered.seek(0)
+
+        return AudioAsset.objects.create(
+            owner=project.owner,
+            name=name or '{} (stitched)'.format(project.title),
+            file=File(rendered, name='stitch-{}.wav'.format(project.pk))
+        )
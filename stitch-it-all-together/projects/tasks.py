@@ -0,0 +1,35 @@
+"""
+Media post-processing and storage moves, run by core.jobs workers. See MediaItem.get_post_process_tasks.
+
+Tasks take primary keys rather than instances and must cope with the row being gone by the time
+they run. Errors that a retry could fix (e.g. storage being unavailable) are left to propagate.
+"""
+import warnings
+
+from core.models import ARCHIVED, ENABLED
+
+from .audio import WavError
+from .models import AudioAsset, MediaItem
+
+
+def generate_waveform(asset_id, using=None):
+    asset = AudioAsset.objects.using(using).filter(pk=asset_id).first()
+
+    if asset is None:
+        return
+
+    try:
+        asset.generate_waveform()
+    except WavError as e:
+        # Not a file we can read, retrying won't change that
+        warnings.warn("Waveform for audio asset {} not generated [{}]".format(asset_id, e))
+
+
+def sync_storage_tier(media_item_id, using=None):
+    """Moves an item's files to the tier its status calls for, cold while archived and hot once enabled"""
+    item = MediaItem.objects.using(using).with_type_instances().across_shards().filter(pk=media_item_id).first()
+
+    if item is None or item.status not in (ARCHIVED, ENABLED):
+        return
+
+    item.move_to_tier(cold=item.status == ARCHIVED)
@@ -1,20 +1,50 @@
 import base64
+import hashlib
 import os
 import shutil
+import struct
+import tempfile
+from datetime import timedelta
+from io import StringIO, BytesIO
 
 from unittest import mock
 
-from django.test import TestCase
+from django.db import DatabaseError, connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.core.management import call_command
+from django.utils.timezone import now
+from django.contrib.contenttypes.models import ContentType
 
 
+from core.jobs import run_pending
+from core.models import Job, StatusChangeHistory, StatusModelQuerySet, ARCHIVED
+from core.pagination import KeysetPagination
+from core.routers import replica_reads
+from core.sharding import shard_for
 from stitchers.models import Stitcher
+from .audio import (
+    read_wav_info, compute_peaks, encode_peaks, decode_peaks_header, extract_peaks_level, iter_frame_blocks, WavError,
+    PEAK_LEVELS
+)
+from .permissions import IsOwnerOrReadOnly
+from .ingest import ingest, HEAD_SIZE
+from .orphans import walk_sorted, get_scan_ranges, stored_names, byte_order, ScanRange, OrphanScanError
+from .stitching import render_stitch, StitchError
+from .text import append_text, text_at, unified_diff
+from .uploadhandlers import QuotaUploadHandler, UploadTooLarge
 from .models import (
-    Project, MediaItem, ImageAsset, VideoAsset, AudioAsset, DocumentAsset, MediaItemError, FileValidatorFunction
+    Project, Stitch, MediaItem, ImageAsset, VideoAsset, AudioAsset, DocumentAsset, MediaItemError, FileValidatorFunction,
+    StitchLimitReached, ProjectText
 )
 
 small_png = b'iVBORw0KGgoAAAANSUhEUgAAAAYAAAAECAYAAACtBE5DAAAMSmlDQ1BJQ0MgUHJvZmlsZQAASImVVwdYU8kWnltSSWiBUKSE3kQRp' \
@@ -71,6 +101,35 @@ small_png = b'iVBORw0KGgoAAAANSUhEUgAAAAYAAAAECAYAAACtBE5DAAAMSmlDQ1BJQ0MgUHJvZm
 small_png = base64.b64decode(small_png)
 
 
+def make_wav(frames, sample_rate=8000, bits=16, format_tag=1, extra_chunks=b''):
+    """
+    Builds a WAV file from a float array of shape (frames, channels) in [-1, 1].
+    `extra_chunks` are inserted between the fmt and data chunks, as real files often have.
+    """
+    import numpy as np
+
+    frames = np.asarray(frames, dtype=np.float64)
+    channels = frames.shape[1]
+
+    if format_tag == 3:
+        data = frames.astype('<f4').tobytes()
+    elif bits == 8:
+        data = np.clip(np.round(frames * 127 + 128), 0, 255).astype(np.uint8).tobytes()
+    elif bits == 24:
+        ints = np.clip(np.round(frames * 8388607), -8388608, 8388607).astype('<i4')
+        data = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        data = np.clip(np.round(frames * 32767), -32768, 32767).astype('<i2').tobytes()
+
+    block_align = channels * bits // 8
+    fmt = struct.pack('<HHIIHH', format_tag, channels, sample_rate, sample_rate * block_align, block_align, bits)
+
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + extra_chunks
+    body += b'data' + struct.pack('<I', len(data)) + data
+
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
 class ProjectsTestCase(TestCase):
 
     def setUp(self):
@@ -93,8 +152,102 @@ class ProjectsTestCase(TestCase):
     def test_get_type_display_value(self):
         self.assertEqual(self.test_project.get_type_display(), 'Music')
 
+    def test_read_only_with_related(self):
+        with self.assertNumQueries(1):
+            project = Project.objects.read_only().select_related('owner__user').get(pk=self.test_project.pk)
+            self.assertEqual(project.owner.user.username, 'polkfarody')
+
+        with self.assertNumQueries(1):
+            projects = list(self.test_stitcher.projects.read_only())
+            # The related manager's stitcher is reused, not fetched again
+            self.assertIs(projects[0].owner, self.test_stitcher)
+
+        self.assertEqual(projects, [self.test_project])
+
+
+class ProjectVisibilityTestCase(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', password='owner')
+        self.other = User.objects.create(username='other', password='other')
+
+        self.public_project = Project.objects.create(title='Public', owner=self.owner.stitcher)
+        self.private_project = Project.objects.create(title='Private', owner=self.owner.stitcher, is_private=True)
+        self.others_project = Project.objects.create(title='Others', owner=self.other.stitcher, is_private=True)
+
+        self.client = APIClient()
+
+    def test_visible_to(self):
+        self.assertEqual(
+            set(Project.objects.visible_to(AnonymousUser())),
+            {self.public_project}
+        )
+        self.assertEqual(
+            set(Project.objects.visible_to(self.owner)),
+            {self.public_project, self.private_project}
+        )
+        self.assertEqual(
+            set(Project.objects.visible_to(self.other)),
+            {self.public_project, self.others_project}
+        )
+
+    def test_visible_to_matches_permission_class(self):
+        permission = IsOwnerOrReadOnly()
+
+        for user in (AnonymousUser(), self.owner, self.other):
+            request = mock.Mock(method='GET', user=user)
+
+            self.assertEqual(
+                set(Project.objects.visible_to(user)),
+                {p for p in Project.objects.all() if permission.has_object_permission(request, None, p)}
+            )
+
+    def test_api_hides_private_projects(self):
+        response = self.client.get(reverse('project-list'))
+
+        self.assertEqual([p['id'] for p in response.json()], [self.public_project.pk])
+
+        response = self.client.get(reverse('project-detail', args=[self.private_project.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        self.client.force_authenticate(self.owner)
+
+        response = self.client.get(reverse('project-detail', args=[self.private_project.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+class ProjectHistoryTestCase(TestCase):
 
-class MediaItemTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', password='owner')
+        self.client = APIClient()
+
+    def _create_projects(self, how_many):
+        for i in range(how_many):
+            project = Project.objects.create(title='Project {}'.format(i), owner=self.owner.stitcher)
+            project.archive()
+            project.enable()
+
+    def test_history_query_count_is_constant(self):
+        ContentType.objects.get_for_model(Project)
+
+        self._create_projects(2)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('project-history'))
+
+        self.assertEqual(len(response.json()), 2)
+
+        self._create_projects(5)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('project-history'), {'latest': 1})
+
+        for project in response.json():
+            self.assertEqual([change['status_display'] for change in project['status_changes']], ['Enabled'])
+
+
+class BaseMediaItemTestCase(TestCase):
 
     asset_classes = (ImageAsset, AudioAsset, VideoAsset, DocumentAsset)
 
@@ -134,6 +287,67 @@ class MediaItemTestCase(TestCase):
 
         return mock.patch('magic.from_buffer' if magic else 'random.randint')
 
+    def _create_asset(self, class_, filename=None,  **kwargs):
+        """
+        Mocks mimetype lookups and/or uses small_png to create an Asset object
+        :param class_:
+        """
+
+        assert class_ in self.asset_classes
+
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            if class_ is ImageAsset:
+
+                    uploaded_file = SimpleUploadedFile(
+                        filename if filename else 'small.png',
+                        small_png
+                    )
+
+                    return ImageAsset.objects.create(
+                        file=uploaded_file,
+                        **kwargs
+                    )
+            else:
+
+                # Find a valid mimetype from the class
+                try:
+                    mimetype = class_.ALLOWED_MIMETYPES[0]
+                except (IndexError, AttributeError):
+                    self.assertTrue(False, "{} does not have ALLOWED_MIMETYPES Specified")
+                    return
+
+                with self.get_python_magic_hack() as mocker:
+                    mocker.return_value = mimetype
+
+                    uploaded_file = SimpleUploadedFile(
+                        filename if filename else 'test.{}'.format(mimetype.split('/')[-1]),
+                        b'randomtextinsidethefile'
+                    )
+
+                    return class_.objects.create(
+                        file=uploaded_file,
+                        **kwargs
+                    )
+
+    def _create_many_assets(self, how_many, owner=None):
+        """Shortcut to create a bunch of assets"""
+
+        for i in range(how_many):
+            for class_ in self.asset_classes:
+                self._create_asset(class_, owner=owner)
+
+    def tearDown(self):
+
+        # remove any test media
+        if os.path.exists(self.test_media_root):
+            try:
+                shutil.rmtree(self.test_media_root)
+            except Exception as e:
+                print("Error in teardown [{}]".format(e))
+
+
+class MediaItemTestCase(BaseMediaItemTestCase):
+
     def test_direct_media_item_save(self):
 
         # Disable direct saving of the underlying media item.
@@ -196,6 +410,11 @@ class MediaItemTestCase(TestCase):
 
             self.assertTrue(file_validator(uploaded_file))
 
+            # Uploads are only sniffed once, so this needs a new one
+            uploaded_file = SimpleUploadedFile(
+                'example.txt',
+                b'12345678'
+            )
             uploaded_file.content_type = 'application/octet-stream'
 
             mocker.return_value = 'application/octet-stream'
@@ -203,6 +422,20 @@ class MediaItemTestCase(TestCase):
             with self.assertRaises(ValidationError):
                 file_validator(uploaded_file)
 
+    def test_file_validator_function_magic_failure(self):
+        try:
+            import magic
+        except ImportError:
+            self.skipTest('python-magic is not installed')
+
+        file_validator = FileValidatorFunction(allowed_mimetypes=['text/plain'])
+
+        with self.get_python_magic_hack() as mocker:
+            mocker.side_effect = Exception('could not find any valid magic files')
+
+            with self.assertRaisesRegex(ValidationError, 'Unable to determine content type'):
+                file_validator(SimpleUploadedFile('example.txt', b'12345678'))
+
     def test_file_validator_allowed_extensions(self):
 
         file_validator = FileValidatorFunction(
@@ -254,54 +487,25 @@ class MediaItemTestCase(TestCase):
 
             self.assertEqual(ia.name, 'small.png')
 
-    def _create_asset(self, class_, filename=None,  **kwargs):
-        """
-        Mocks mimetype lookups and/or uses small_png to create an Asset object
-        :param class_:
-        """
-
-        assert class_ in self.asset_classes
+    def test_document_stored_compressed(self):
+        text = b'A story that repeats itself\n' * 200
 
         with self.settings(MEDIA_ROOT=self.test_media_root):
-            if class_ is ImageAsset:
-
-                    uploaded_file = SimpleUploadedFile(
-                        filename if filename else 'small.png',
-                        small_png
-                    )
-
-                    return ImageAsset.objects.create(
-                        file=uploaded_file,
-                        **kwargs
-                    )
-            else:
-
-                # Find a valid mimetype from the class
-                try:
-                    mimetype = class_.ALLOWED_MIMETYPES[0]
-                except (IndexError, AttributeError):
-                    self.assertTrue(False, "{} does not have ALLOWED_MIMETYPES Specified")
-                    return
-
-                with self.get_python_magic_hack() as mocker:
-                    mocker.return_value = mimetype
-
-                    uploaded_file = SimpleUploadedFile(
-                        filename if filename else 'test.{}'.format(mimetype.split('/')[-1]),
-                        b'randomtextinsidethefile'
-                    )
+            with self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'text/text'
+                document = DocumentAsset.objects.create(file=SimpleUploadedFile('story.txt', text))
 
-                    return class_.objects.create(
-                        file=uploaded_file,
-                        **kwargs
-                    )
+            # Counted at its uploaded size, stored at a fraction of it
+            document = DocumentAsset.objects.get(pk=document.pk)
+            self.assertEqual(document.size, len(text))
+            self.assertLess(document.stored_size, len(text) / 10)
+            self.assertTrue(os.path.exists(os.path.join(self.test_media_root, document.file.name + '.gz')))
 
-    def _create_many_assets(self, how_many, owner=None):
-        """Shortcut to create a bunch of assets"""
+            with document.file.open('rb') as f:
+                self.assertEqual(f.read(), text)
 
-        for i in range(how_many):
-            for class_ in self.asset_classes:
-                self._create_asset(class_, owner=owner)
+        image = self._create_asset(ImageAsset)
+        self.assertEqual(image.stored_size, image.size)
 
     def test_the_create_asset_test(self):
         # Sanity test that the creation of test assets works
@@ -416,15 +620,1303 @@ class MediaItemTestCase(TestCase):
 
         self.assertEqual(count, 25)
 
-    def tearDown(self):
 
-        # remove any test media
-        if os.path.exists(self.test_media_root):
-            try:
-                shutil.rmtree(self.test_media_root)
-            except Exception as e:
-                print("Error in teardown [{}]".format(e))
+class MediaLibraryApiTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(MediaLibraryApiTestCase, self).setUp()
+
+        self.client = APIClient()
+
+    def _list(self, **params):
+        response = self.client.get(reverse('mediaitem-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_typed_payloads(self):
+        self._create_many_assets(1, owner=self.test_stitcher_1)
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        results = self._list()['results']
+
+        self.assertEqual(
+            sorted(item['type'] for item in results),
+            ['audio', 'document', 'image', 'video']
+        )
+
+        image = next(item for item in results if item['type'] == 'image')
+
+        self.assertEqual(image['size'], len(small_png))
+        self.assertIsNotNone(image['thumbnail'])
+        self.assertIsNotNone(image['width'])
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self._create_many_assets(2)
+
+        with self.assertNumQueries(1):
+            self._list()
+
+        self._create_many_assets(5)
+
+        with self.assertNumQueries(1):
+            self._list()
+
+    def test_keyset_pages_cover_everything_once(self):
+        self._create_many_assets(3, owner=self.test_stitcher_1)
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        seen = []
+        page = self._list(page_size=5)
+
+        while True:
+            seen.extend(item['id'] for item in page['results'])
+            if not page['next']:
+                break
+            response = self.client.get(page['next'])
+            page = response.json()
+
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(seen, sorted(MediaItem.objects.values_list('pk', flat=True), reverse=True))
+
+    def test_filters(self):
+        self._create_many_assets(2)
+        self._create_many_assets(3, owner=self.test_stitcher_1)
+        self._create_many_assets(1, owner=self.test_stitcher_2)
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        self.assertEqual(len(self._list(type='audio')['results']), 5)
+        self.assertEqual(len(self._list(owner=self.test_stitcher_1.pk)['results']), 12)
+        self.assertEqual(len(self._list(public='true')['results']), 8)
+        self.assertEqual(
+            [item['type'] for item in self._list(type='image', owner=self.test_stitcher_1.pk)['results']],
+            ['image'] * 3
+        )
+
+        response = self.client.get(reverse('mediaitem-list'), {'type': 'hologram'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_hides_other_libraries(self):
+        self._create_many_assets(1)
+        own = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        theirs = self._create_asset(DocumentAsset, owner=self.test_stitcher_2)
+
+        # Anonymous visitors see the public media only
+        self.assertEqual(len(self._list()['results']), 4)
+
+        self.client.force_authenticate(self.test_auth_user_1)
+        listed = [item['id'] for item in self._list()['results']]
+
+        self.assertIn(own.pk, listed)
+        self.assertNotIn(theirs.pk, listed)
+        self.assertEqual(self._list(owner=self.test_stitcher_2.pk)['results'], [])
+
+        # Still reachable by id
+        response = self.client.get(reverse('mediaitem-detail', args=[theirs.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('mediaitem-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def _upload(self, content=small_png, name='small.png', asset_type='image'):
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            return self.client.post(
+                reverse('mediaitem-list'),
+                {'type': asset_type, 'file': SimpleUploadedFile(name, content)},
+                format='multipart'
+            )
+
+    def test_upload(self):
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        response = self._upload()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['type'], 'image')
+        self.assertEqual(response.json()['size'], len(small_png))
+
+        self.test_stitcher_1.refresh_from_db()
+        self.assertEqual(self.test_stitcher_1.storage_used, len(small_png))
+
+    def test_upload_over_quota_is_stopped(self):
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        self.test_stitcher_1.storage_quota = len(small_png) * 2 - 1
+        self.test_stitcher_1.save()
+
+        self.assertEqual(self._upload().status_code, 201)
+
+        # As a new request would, load the user with current counters
+        self.client.force_authenticate(User.objects.get(pk=self.test_auth_user_1.pk))
+
+        response = self._upload()
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(ImageAsset.objects.count(), 1)
+
+    def test_upload_is_read_once(self):
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        with mock.patch('projects.ingest.ingest', wraps=ingest) as ingested:
+            with mock.patch('django.core.files.images.get_image_dimensions') as measured:
+                response = self._upload()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ingested.call_count, 1)
+        self.assertFalse(measured.called)
+
+        asset = ImageAsset.objects.get()
+
+        self.assertEqual((asset.width, asset.height, asset.size), (6, 4, len(small_png)))
+        self.assertEqual(asset.content_hash, hashlib.sha256(small_png).hexdigest())
+
+        response = self._upload(content=b'not an image', name='fake.png')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json())
+
+    def test_upload_refused_when_processing_is_backed_up(self):
+        self.client.force_authenticate(self.test_auth_user_1)
+
+        with self.settings(JOB_QUEUE_LIMIT=0), self.get_python_magic_hack() as mocker:
+            mocker.return_value = 'audio/x-wav'
+            response = self._upload(make_wav([[0.0]] * 100), 'take.wav', 'audio')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(AudioAsset.objects.exists())
+
+        # Images queue nothing, so they don't wait for the backlog
+        with self.settings(JOB_QUEUE_LIMIT=0):
+            self.assertEqual(self._upload().status_code, 201)
+
+    def test_upload_handler_limits(self):
+        handler = QuotaUploadHandler(quota=10, max_file_size=6)
+        handler.new_file('file', 'a.txt', 'text/plain', None)
+
+        self.assertEqual(handler.receive_data_chunk(b'12345', 0), b'12345')
+
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b'67', 5)
+
+        handler = QuotaUploadHandler(quota=10, max_file_size=6)
+
+        for name in ('a.txt', 'b.txt'):
+            handler.new_file('file', name, 'text/plain', None)
+            handler.receive_data_chunk(b'12345', 0)
+
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b'6', 5)
+
+        with self.assertRaises(UploadTooLarge):
+            handler.raise_if_exceeded()
+
+    def test_upload_requires_authentication(self):
+        self.assertIn(self._upload().status_code, (401, 403))
+
+
+class StitcherCountersTestCase(BaseMediaItemTestCase):
+
+    def _counters(self, stitcher):
+        stitcher.refresh_from_db()
+        return stitcher.project_count, stitcher.media_count, stitcher.storage_used
+
+    def test_project_counter_transitions(self):
+        project = Project.objects.create(title='Counted', owner=self.test_stitcher_1)
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 1)
+
+        project.archive()
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 1)
+
+        project.delete()
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 0)
+
+        project.enable()
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 1)
+
+        project._delete()
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 0)
+
+        # Hard deleting something already soft deleted doesn't count twice
+        project = Project.objects.create(title='Counted', owner=self.test_stitcher_1)
+        project.delete()
+        Project.all_objects.filter(pk=project.pk).delete()
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 0)
+
+    def test_media_counters(self):
+        # Saves re-read file sizes from storage
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            image = self._create_asset(ImageAsset, owner=self.test_stitcher_1)
+            audio = self._create_asset(AudioAsset, owner=self.test_stitcher_1)
+
+            total = image.size + audio.size
+            self.assertEqual(self._counters(self.test_stitcher_1), (0, 2, total))
+
+            audio.delete()
+            self.assertEqual(self._counters(self.test_stitcher_1), (0, 1, image.size))
+
+            audio.enable()
+            self.assertEqual(self._counters(self.test_stitcher_1), (0, 2, total))
+
+            # Moving an item between owners moves its usage
+            image = ImageAsset.objects.get(pk=image.pk)
+            image.owner = self.test_stitcher_2
+            image.save()
+            self.assertEqual(self._counters(self.test_stitcher_1), (0, 1, audio.size))
+            self.assertEqual(self._counters(self.test_stitcher_2), (0, 1, image.size))
+
+            # Hard deletes through the child table and the base table
+            ImageAsset.objects.get(pk=image.pk)._delete()
+            self.assertEqual(self._counters(self.test_stitcher_2), (0, 0, 0))
+
+            MediaItem.all_objects.filter(pk=audio.pk).delete()
+            self.assertEqual(self._counters(self.test_stitcher_1), (0, 0, 0))
+
+    def test_saving_stale_stitcher_keeps_counters(self):
+        stale = Stitcher.objects.get(pk=self.test_stitcher_1.pk)
+
+        Project.objects.create(title='Counted', owner=self.test_stitcher_1)
+
+        stale.motto = 'Stale but harmless'
+        stale.save()
+
+        self.assertEqual(self._counters(self.test_stitcher_1)[0], 1)
+
+    def test_reconcile_counters(self):
+        Project.objects.create(title='Counted', owner=self.test_stitcher_1)
+        self._create_asset(ImageAsset, owner=self.test_stitcher_1)
+
+        expected = self._counters(self.test_stitcher_1)
+
+        Stitcher.objects.update(project_count=7, media_count=0, storage_used=12)
+
+        out = StringIO()
+        call_command('reconcile_stitcher_counters', stdout=out)
+
+        self.assertIn('fixed 2', out.getvalue())
+        self.assertEqual(self._counters(self.test_stitcher_1), expected)
+        self.assertEqual(self._counters(self.test_stitcher_2), (0, 0, 0))
+
+
+class WaveformTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(WaveformTestCase, self).setUp()
+
+        import numpy as np
+
+        self.np = np
+        time = np.arange(10000) / 8000.0
+        self.frames = np.stack([0.5 * np.sin(2 * np.pi * 440 * time), 0.25 * np.cos(2 * np.pi * 220 * time)], axis=1)
+
+    def _naive_peaks(self, frames_per_bucket):
+        mixed = self.frames.reshape(-1)
+        per_frame = self.frames.shape[1]
+        step = frames_per_bucket * per_frame
+        return [(mixed[i:i + step].min(), mixed[i:i + step].max()) for i in range(0, len(mixed), step)]
+
+    def test_read_wav_info_skips_other_chunks(self):
+        wav = make_wav(self.frames, extra_chunks=b'LIST' + struct.pack('<I', 5) + b'hello\x00')
+
+        info = read_wav_info(BytesIO(wav))
+
+        self.assertEqual((info.channels, info.sample_rate, info.bits_per_sample), (2, 8000, 16))
+        self.assertEqual(info.data_size, 10000 * 4)
+        self.assertEqual(wav[info.data_offset - 8:info.data_offset - 4], b'data')
+
+        with self.assertRaises(WavError):
+            read_wav_info(BytesIO(small_png))
+
+    def test_read_wav_info_rejects_bad_block_align(self):
+        wav = bytearray(make_wav(self.frames))
+        block_align = wav.index(b'fmt ') + 20
+
+        for value in (0, 3):
+            wav[block_align:block_align + 2] = struct.pack('<H', value)
+
+            with self.assertRaises(WavError):
+                read_wav_info(BytesIO(bytes(wav)))
+
+    def test_unsupported_encoding_raises_wav_error(self):
+        # ADPCM passes the header checks and fails on decoding, while the file is memory mapped
+        with tempfile.TemporaryFile() as f:
+            f.write(make_wav(self.frames, bits=4, format_tag=2))
+            f.flush()
+
+            with self.assertRaises(WavError):
+                compute_peaks(f)
+
+        # Stopping early closes the map too
+        with tempfile.TemporaryFile() as f:
+            f.write(make_wav(self.frames))
+            f.flush()
+
+            blocks = iter_frame_blocks(f, read_wav_info(f), block_frames=1000)
+            next(blocks)
+            blocks.close()
+
+    def test_compute_peaks_matches_naive(self):
+        for bits, format_tag in ((8, 1), (16, 1), (24, 1), (32, 3)):
+            info, levels = compute_peaks(BytesIO(make_wav(self.frames, bits=bits, format_tag=format_tag)), block_frames=3000)
+
+            self.assertEqual([level.frames_per_bucket for level in levels], list(PEAK_LEVELS))
+
+            for level in levels:
+                pairs = self.np.frombuffer(level.peaks, dtype=self.np.int8).reshape(-1, 2)
+                expected = self.np.round(self.np.array(self._naive_peaks(level.frames_per_bucket)) * 127)
+
+                self.assertEqual(len(pairs), len(expected))
+                # 8 bit input is coarser than the int8 output
+                self.assertLessEqual(self.np.abs(pairs - expected).max(), 2 if bits == 8 else 1)
+
+    def test_sidecar_roundtrip(self):
+        info, levels = compute_peaks(BytesIO(make_wav(self.frames)))
+        data = encode_peaks(info, levels)
+
+        sample_rate, channels, header_levels = decode_peaks_header(data)
+
+        self.assertEqual((sample_rate, channels), (8000, 2))
+        self.assertEqual([l[0] for l in header_levels], list(PEAK_LEVELS))
+
+        coarsest = extract_peaks_level(data, len(levels) - 1)
+
+        self.assertEqual(coarsest[-len(levels[-1].peaks):], levels[-1].peaks)
+
+        with self.assertRaises(IndexError):
+            extract_peaks_level(data, -1)
+
+    def test_generate_and_serve_waveform(self):
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            with self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'audio/x-wav'
+                asset = AudioAsset.objects.create(file=SimpleUploadedFile('tone.wav', make_wav(self.frames)))
+
+            asset.generate_waveform()
+            asset.refresh_from_db()
+
+            self.assertEqual(asset.waveform.name, 'waveforms/{}.peaks'.format(asset.pk))
+
+            client = APIClient()
+            item = client.get(reverse('mediaitem-detail', args=[asset.pk])).json()
+
+            response = client.get(item['waveform'], {'level': 3})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(decode_peaks_header(response.content)[2][0][:2], (16384, 1))
+
+            self.assertEqual(client.get(item['waveform'], {'level': 9}).status_code, 400)
+            self.assertEqual(client.get(item['waveform'], {'level': -1}).status_code, 400)
+
+            out = StringIO()
+            call_command('generate_waveforms', stdout=out)
+            self.assertIn('Generated 0 waveforms', out.getvalue())
+
+            AudioAsset.objects.update(waveform='')
+            call_command('generate_waveforms', stdout=out)
+            self.assertIn('Generated 1 waveforms', out.getvalue())
+
+    def test_waveform_generated_by_job(self):
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            with mock.patch('core.jobs.transaction.on_commit', side_effect=lambda func, using=None: func()):
+                with self.get_python_magic_hack() as mocker:
+                    mocker.return_value = 'audio/x-wav'
+                    asset = AudioAsset.objects.create(file=SimpleUploadedFile('tone.wav', make_wav(self.frames)))
+
+            # Saving only queued the work
+            self.assertFalse(AudioAsset.objects.get(pk=asset.pk).waveform)
+            self.assertEqual(Job.objects.get().key, 'projects.tasks.generate_waveform:[{}]'.format(asset.pk))
+
+            self.assertEqual(run_pending(), 1)
+
+        self.assertEqual(AudioAsset.objects.get(pk=asset.pk).waveform.name, 'waveforms/{}.peaks'.format(asset.pk))
+
+    def _create_wav_asset(self, seconds, **kwargs):
+        frames = self.np.zeros((int(8000 * seconds), 1))
+
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            with self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'audio/x-wav'
+                return AudioAsset.objects.create(file=SimpleUploadedFile('clip.wav', make_wav(frames)), **kwargs)
+
+    def test_wav_metadata_indexed_on_save(self):
+        asset = self._create_wav_asset(1.5)
+
+        self.assertEqual(
+            AudioAsset.objects.filter(pk=asset.pk).values_list('duration', 'sample_rate', 'channels', 'frame_count').get(),
+            (1.5, 8000, 1, 12000)
+        )
+
+        # The upload was rewound for storage, so the stored file is complete
+        self.assertEqual(asset.size, len(make_wav(self.np.zeros((12000, 1)))))
+
+    def test_ingest(self):
+        with self.get_python_magic_hack() as mocker:
+            mocker.return_value = 'image/png'
+            result = ingest(BytesIO(small_png), image=True, chunk_size=7)
+
+        self.assertEqual((result.size, result.width, result.height), (len(small_png), 6, 4))
+        self.assertEqual(result.content_hash, hashlib.sha256(small_png).hexdigest())
+        self.assertEqual(result.head, small_png)
+
+        self.assertEqual(ingest(BytesIO(b'not an image'), image=True).width, None)
+
+    def test_wav_metadata_beyond_ingest_head(self):
+        # Metadata chunks pushing the data chunk past the bytes kept by the ingest pass
+        padding = b'x' * HEAD_SIZE
+        wav = make_wav(self.np.zeros((800, 1)), extra_chunks=b'LIST' + struct.pack('<I', len(padding)) + padding)
+
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            with self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'audio/x-wav'
+                asset = AudioAsset.objects.create(file=SimpleUploadedFile('long-header.wav', wav))
+
+        self.assertEqual((asset.frame_count, asset.duration, asset.size), (800, 0.1, len(wav)))
+
+    def test_list_audio_by_duration(self):
+        for seconds in (2, 0.5, 1, 3):
+            self._create_wav_asset(seconds)
+
+        client = APIClient()
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse('mediaitem-list'), {'ordering': 'duration', 'page_size': 2})
+
+        page = response.json()
+        durations = [item['duration'] for item in page['results']]
+
+        durations += [item['duration'] for item in client.get(page['next']).json()['results']]
+
+        self.assertEqual(durations, [0.5, 1, 2, 3])
+
+        response = client.get(reverse('mediaitem-list'), {'min_duration': 1, 'max_duration': 2, 'ordering': '-duration'})
+        self.assertEqual([item['duration'] for item in response.json()['results']], [2, 1])
+
+    def test_index_audio_metadata_command(self):
+        asset = self._create_wav_asset(0.25)
+        AudioAsset.objects.update(duration=None, sample_rate=None)
+
+        out = StringIO()
+
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            call_command('index_audio_metadata', workers=2, stdout=out)
+
+        self.assertIn('Indexed 1 audio assets, 0 failed', out.getvalue())
+        self.assertEqual(AudioAsset.objects.values_list('duration', 'sample_rate').get(pk=asset.pk), (0.25, 8000))
+
+
+class StitchRenderTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(StitchRenderTestCase, self).setUp()
+
+        import numpy as np
+
+        self.np = np
+        self.stems = [
+            np.stack([np.linspace(-0.5, 0.5, frames), np.full(frames, 0.25)], axis=1)
+            for frames in (5000, 300, 7000)
+        ]
+
+    def _render(self, stems, **kwargs):
+        output = BytesIO()
+        info = render_stitch([BytesIO(make_wav(stem)) for stem in stems], output, **kwargs)
+        return info, output.getvalue()
+
+    def _decode(self, wav):
+        info = read_wav_info(BytesIO(wav))
+        return self.np.frombuffer(wav[info.data_offset:], dtype='<i2').reshape(-1, info.channels) / 32767.0
+
+    def test_concatenates_across_blocks(self):
+        info, wav = self._render(self.stems, block_frames=1024)
+
+        self.assertEqual(info.data_size, sum(len(stem) for stem in self.stems) * 4)
+        self.assertEqual(read_wav_info(BytesIO(wav))[:6], info[:6])
+        self.assertLess(self.np.abs(self._decode(wav) - self.np.concatenate(self.stems)).max(), 1e-4)
+
+    def test_crossfade_overlaps_neighbours(self):
+        # 0.1s is 800 frames, longer than the middle stem, so both its overlaps are shortened to 300 frames
+        info, wav = self._render(self.stems, crossfade=0.1, block_frames=1024)
+        rendered = self._decode(wav)
+
+        self.assertEqual(len(rendered), 5000 + 300 + 7000 - 300 - 300)
+
+        # Untouched before the first overlap and after the last
+        self.assertLess(self.np.abs(rendered[:4700] - self.stems[0][:4700]).max(), 1e-4)
+        self.assertLess(self.np.abs(rendered[-6700:] - self.stems[2][300:]).max(), 1e-4)
+
+        # An equal power fade of a signal into itself peaks above the signal halfway through
+        info, wav = self._render([self.stems[0], self.stems[2]], crossfade=0.1)
+        self.assertAlmostEqual(self._decode(wav)[4600, 1], 0.25 * 2 ** 0.5, places=3)
+
+    def test_mismatched_formats_are_rejected(self):
+        stems = [BytesIO(make_wav(self.stems[0])), BytesIO(make_wav(self.stems[1], sample_rate=44100))]
+
+        with self.assertRaises(StitchError):
+            render_stitch(stems, BytesIO())
+
+    def test_render_too_large(self):
+        # Refused before the source that would overflow the header is read, not once it's written
+        with mock.patch('projects.stitching.MAX_DATA_SIZE', 5000 * 4 + 100 * 4):
+            output = BytesIO()
+
+            with self.assertRaisesRegex(StitchError, 'too large'):
+                render_stitch([BytesIO(make_wav(stem)) for stem in self.stems], output)
+
+            self.assertEqual(len(output.getvalue()), 44 + 5000 * 4)
+
+        with self.assertRaises(StitchError):
+            render_stitch([], BytesIO())
+
+    def test_render_endpoint(self):
+        project = Project.objects.create(title='Song', owner=self.test_stitcher_1)
+
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            with self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'audio/x-wav'
+                stems = [
+                    AudioAsset.objects.create(file=SimpleUploadedFile('stem.wav', make_wav(stem)), owner=self.test_stitcher_2)
+                    for stem in self.stems[:2]
+                ]
+
+                client = APIClient()
+                url = reverse('project-render', args=[project.pk])
+                payload = {'media': [stems[1].pk, stems[0].pk, stems[1].pk]}
+
+                client.force_authenticate(self.test_auth_user_2)
+                self.assertEqual(client.post(url, payload, format='json').status_code, 403)
+
+                client.force_authenticate(self.test_auth_user_1)
+                self.assertEqual(client.post(url, {'media': [stems[0].pk, 0]}, format='json').status_code, 400)
+
+                response = client.post(url, payload, format='json')
+
+            self.assertEqual(response.status_code, 201)
+
+            asset = AudioAsset.objects.get(pk=response.json()['id'])
+
+            self.assertEqual(asset.owner, self.test_stitcher_1)
+            self.assertEqual(asset.frame_count, 300 + 5000 + 300)
+            self.assertEqual(asset.name, 'Song (stitched)')
+
+            # Rendering isn't an upload, a backed up queue only delays the waveform
+            with self.settings(JOB_QUEUE_LIMIT=0), self.get_python_magic_hack() as mocker:
+                mocker.return_value = 'audio/x-wav'
+                response = client.post(url, payload, format='json')
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(AudioAsset.objects.get(pk=response.json()['id']).waveform, '')
+
+
+class StitchContributionTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(StitchContributionTestCase, self).setUp()
+
+        self.project = Project.objects.create(title='Round', owner=self.test_stitcher_1, max_stitches=3)
+        self.media_1 = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        self.media_2 = self._create_asset(DocumentAsset, owner=self.test_stitcher_2)
+
+    def test_positions_and_limit(self):
+        # Loaded before anyone contributed, so its stitch_count is stale throughout
+        stale = Project.objects.get(pk=self.project.pk)
+
+        stitches = [self.project.add_stitch(self.media_1, self.test_stitcher_1) for _ in range(2)]
+        stitches.append(stale.add_stitch(self.media_2, self.test_stitcher_2))
+
+        self.assertEqual([stitch.position for stitch in stitches], [1, 2, 3])
+
+        with self.assertRaises(StitchLimitReached):
+            stale.add_stitch(self.media_2, self.test_stitcher_2)
+
+        # Saving a stale copy must not hand out positions again
+        self.project.stitch_count = 0
+        self.project.title = 'Renamed'
+        self.project.save()
+
+        self.assertEqual(Project.objects.values_list('title', 'stitch_count').get(pk=self.project.pk), ('Renamed', 3))
+        self.assertEqual(Stitch.objects.filter(project=self.project).count(), 3)
+
+    def test_saving_a_project_whose_row_is_gone(self):
+        copy = Project.objects.get(pk=self.project.pk)
+        Project.all_objects.filter(pk=self.project.pk)._raw_delete('default')
+
+        # Only the fields besides the counters are written, so nothing is updated
+        with self.assertRaises(DatabaseError):
+            copy.save()
+
+        copy.save(force_insert=True)
+
+        self.assertEqual(Project.objects.values_list('title', flat=True).get(pk=self.project.pk), 'Round')
+
+    def test_unlimited_and_suspended_projects(self):
+        self.project.max_stitches = None
+        self.project.save()
+
+        for _ in range(5):
+            self.project.add_stitch(self.media_1, self.test_stitcher_1)
+
+        self.project.suspend()
+
+        with self.assertRaises(StitchLimitReached):
+            self.project.add_stitch(self.media_1, self.test_stitcher_1)
+
+        self.assertEqual(Project.objects.values_list('stitch_count', flat=True).get(pk=self.project.pk), 5)
+
+    def test_stitches_api(self):
+        client = APIClient()
+        url = reverse('project-stitches', args=[self.project.pk])
+
+        self.assertIn(client.post(url, {'media_item': self.media_2.pk}).status_code, (401, 403))
+
+        client.force_authenticate(self.test_auth_user_2)
+
+        self.assertEqual(client.post(url, {'media_item': self.media_1.pk}).status_code, 400)
+
+        for _ in range(3):
+            response = client.post(url, {'media_item': self.media_2.pk})
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(response.json()['position'], 3)
+        self.assertIn('project', client.post(url, {'media_item': self.media_2.pk}).json())
+
+        page = client.get(url, {'page_size': 2}).json()
+        positions = [stitch['position'] for stitch in page['results']]
+        positions += [stitch['position'] for stitch in client.get(page['next']).json()['results']]
+
+        self.assertEqual(positions, [1, 2, 3])
+
+
+class ProjectTextTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='writer', email='writer@example.com')
+        self.other = User.objects.create(username='reader', email='reader@example.com')
+        self.project = Project.objects.create(title='Tale', type=4, owner=self.user.stitcher)
+
+        self.segments = ['Once upon a time', 'there was a stitcher\nwho wrote', '', 'The end']
+
+    def test_append_and_revisions(self):
+        for text in self.segments[:2]:
+            append_text(self.project, text, self.user.stitcher)
+
+        # Appending costs the same number of queries however long the text is
+        with self.assertNumQueries(7):
+            append_text(self.project, self.segments[2], self.other.stitcher)
+        with self.assertNumQueries(7):
+            append_text(self.project, self.segments[3], self.other.stitcher)
+
+        cached = ProjectText.objects.get(project=self.project)
+
+        self.assertEqual(cached.text, '\n'.join(self.segments))
+        self.assertEqual((cached.revision, cached.line_count), (4, 5))
+
+        self.assertEqual(text_at(self.project, 2), (2, 'Once upon a time\nthere was a stitcher\nwho wrote'))
+        self.assertEqual(text_at(self.project, 0), (0, ''))
+        self.assertEqual(text_at(self.project), (4, cached.text))
+
+    def test_unified_diff(self):
+        for text in self.segments:
+            append_text(self.project, text, self.user.stitcher)
+
+        self.assertEqual(
+            unified_diff(self.project, 1, 3),
+            '--- r1\n+++ r3\n@@ -1,0 +2,3 @@\n+there was a stitcher\n+who wrote\n+\n'
+        )
+        self.assertEqual(unified_diff(self.project, 4, 3), '--- r4\n+++ r3\n@@ -5,1 +4,0 @@\n-The end\n')
+        self.assertEqual(unified_diff(self.project, 4, 4), '--- r4\n+++ r4\n')
+
+    def test_text_api(self):
+        client = APIClient()
+        url = reverse('project-text', args=[self.project.pk])
+
+        client.force_authenticate(self.other)
+
+        for text in self.segments[:2]:
+            self.assertEqual(client.post(url, {'text': text}).status_code, 201)
+
+        self.assertEqual(client.get(url).json(), {'revision': 2, 'text': '\n'.join(self.segments[:2])})
+        self.assertEqual(client.get(url, {'revision': 1}).json()['text'], 'Once upon a time')
+
+        response = client.get(reverse('project-text-diff', args=[self.project.pk]), {'from': 1})
+        self.assertEqual(response.content.decode(), '--- r1\n+++ r2\n@@ -1,0 +2,2 @@\n+there was a stitcher\n+who wrote\n')
+
+        music = Project.objects.create(title='Song', owner=self.user.stitcher)
+        self.assertEqual(client.get(reverse('project-text', args=[music.pk])).status_code, 400)
+
+
+class BulkStatusApiTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(BulkStatusApiTestCase, self).setUp()
+
+        self.admin = User.objects.create(username='moderator', email='moderator@example.com', is_staff=True)
+        self.client = APIClient()
+
+        self.projects = [
+            Project.objects.create(title='Project {}'.format(i), owner=self.test_stitcher_1 if i % 2 else self.test_stitcher_2)
+            for i in range(20)
+        ]
+
+    def _bulk(self, payload, name='project'):
+        return self.client.post(reverse('{}-bulk-status'.format(name)), payload, format='json')
+
+    def _project_counts(self):
+        return list(Stitcher.objects.filter(
+            pk__in=[self.test_stitcher_1.pk, self.test_stitcher_2.pk]
+        ).order_by('pk').values_list('project_count', flat=True))
+
+    def test_bulk_by_ids(self):
+        self.client.force_authenticate(self.test_auth_user_1)
+        self.assertEqual(self._bulk({'status': 'archived', 'ids': [self.projects[0].pk]}).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+
+        ids = [project.pk for project in self.projects[:15]]
+        Project.objects.filter(pk=ids[0]).update(status=Project.STATUSES['SUSPENDED'])
+        StatusChangeHistory.objects.all().delete()
+
+        # Set based: the cost doesn't depend on how many rows move, up to a batch
+        with self.assertNumQueries(6):
+            response = self._bulk({'status': 'archived', 'ids': ids})
+
+        self.assertEqual(response.json(), {'status': 'archived', 'updated': 15, 'from': {'enabled': 14, 'suspended': 1}})
+        self.assertEqual(Project.objects.archived().count(), 15)
+        self.assertEqual(StatusChangeHistory.objects.filter(status=Project.STATUSES['ARCHIVED']).count(), 15)
+
+        # Already there
+        self.assertEqual(self._bulk({'status': 'archived', 'ids': ids}).json()['updated'], 0)
+
+    def test_bulk_by_filter_keeps_counters(self):
+        self.client.force_authenticate(self.admin)
+
+        self.assertEqual(self._project_counts(), [10, 10])
+
+        response = self._bulk({'status': 'deleted', 'filter': {'owner': self.test_stitcher_1.pk}})
+
+        self.assertEqual(response.json()['from'], {'enabled': 10})
+        self.assertEqual(self._project_counts(), [0, 10])
+
+        # Restore them. Deleted rows can be matched too
+        response = self._bulk({'status': 'enabled', 'filter': {'status': 'deleted'}})
+
+        self.assertEqual(response.json()['updated'], 10)
+        self.assertEqual(self._project_counts(), [10, 10])
+
+        self.assertEqual(self._bulk({'status': 'enabled', 'filter': {'title': 'x'}}).status_code, 400)
+        self.assertEqual(self._bulk({'status': 'enabled', 'filter': {}}).status_code, 400)
+        self.assertEqual(self._bulk({'status': 'enabled', 'filter': {'owner': 'x'}}).status_code, 400)
+        self.assertEqual(self._bulk({'status': 'enabled', 'ids': [1], 'filter': {'owner': 1}}).status_code, 400)
+
+    def test_bulk_media(self):
+        self.client.force_authenticate(self.admin)
+
+        assets = [self._create_asset(DocumentAsset, owner=self.test_stitcher_1) for _ in range(3)]
+
+        response = self._bulk({'status': 'deleted', 'filter': {'content_hash': assets[0].content_hash}}, name='mediaitem')
+
+        self.assertEqual(response.json()['updated'], 3)
+
+        self.test_stitcher_1.refresh_from_db()
+        self.assertEqual((self.test_stitcher_1.media_count, self.test_stitcher_1.storage_used), (0, 0))
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_status_changes_are_routed_to_the_primary(self):
+        # replica1 isn't a real database, so anything routed there would fail
+        with replica_reads():
+            self.assertEqual(Project.objects.all().db, 'replica1')
+
+            Project.objects.filter(owner=self.test_stitcher_1).set_status(Project.STATUSES['ARCHIVED'])
+            Project.objects.filter(owner=self.test_stitcher_1).update(status=Project.STATUSES['ENABLED'], is_private=True)
+
+        self.assertEqual(Project.objects.filter(is_private=True).count(), 10)
+
+    def test_set_status_keeps_the_filters(self):
+        projects = Project.objects.filter(owner=self.test_stitcher_1, is_private=False)
+        changed = projects.order_by('pk')[1]
+        chunked = StatusModelQuerySet.chunked
+
+        def made_private_meanwhile(queryset, *args, **kwargs):
+            for chunk in chunked(queryset, *args, **kwargs):
+                Project.objects.filter(pk=changed.pk).update(is_private=True)
+                yield chunk
+
+        with mock.patch.object(StatusModelQuerySet, 'chunked', made_private_meanwhile):
+            moved = projects.set_status(ARCHIVED, batch_size=3)
+
+        # Read before it stopped matching, and left alone once it did
+        self.assertEqual(moved, {Project.STATUSES['ENABLED']: 9})
+        self.assertEqual(Project.all_objects.get(pk=changed.pk).status, Project.STATUSES['ENABLED'])
+
+    def test_restore(self):
+        project = self.projects[1]
+        project.delete()
+
+        url = reverse('project-restore', args=[project.pk])
+
+        self.client.force_authenticate(self.test_auth_user_2)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_authenticate(self.test_auth_user_1)
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Project.objects.get(pk=project.pk).status, Project.STATUSES['ENABLED'])
+        self.assertEqual(self._project_counts(), [10, 10])
+
+    def test_restore_media(self):
+        asset = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        asset.delete()
+
+        url = reverse('mediaitem-restore', args=[asset.pk])
+
+        self.client.force_authenticate(self.test_auth_user_2)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_authenticate(self.test_auth_user_1)
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['type'], 'document')
+        self.assertEqual(DocumentAsset.objects.get(pk=asset.pk).status, DocumentAsset.STATUSES['ENABLED'])
+        self.assertEqual(Stitcher.objects.get(pk=self.test_stitcher_1.pk).media_count, 1)
+
+    def test_restore_private(self):
+        project = self.projects[1]
+        Project.objects.filter(pk=project.pk).update(is_private=True)
+        project.refresh_from_db()
+        project.delete()
+
+        url = reverse('project-restore', args=[project.pk])
+
+        # Hidden from others, so not found rather than forbidden
+        self.client.force_authenticate(self.test_auth_user_2)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.client.force_authenticate(self.test_auth_user_1)
+        self.assertEqual(self.client.post(url).status_code, 200)
+
+
+class AdminChangelistTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(AdminChangelistTestCase, self).setUp()
+
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def _get(self, name, **params):
+        return self.client.get(reverse('admin:{}_changelist'.format(name)), params)
+
+    def _count_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._get(name).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        media = self._create_asset(DocumentAsset, owner=self.test_stitcher_2)
+
+        for name, create in (
+            ('projects_project', lambda i: Project.objects.create(title='P{}'.format(i), owner=self.test_stitcher_1)),
+            ('projects_documentasset', lambda i: self._create_asset(DocumentAsset, owner=self.test_stitcher_2)),
+            ('projects_stitch', lambda i: Project.objects.create(
+                title='S{}'.format(i), owner=self.test_stitcher_1
+            ).add_stitch(media, self.test_stitcher_2)),
+        ):
+            create(0)
+            before = self._count_queries(name)
+
+            for i in range(5):
+                create(i)
+
+            self.assertEqual(self._count_queries(name), before, name)
+
+        self.assertEqual(self._get('core_statuschangehistory').status_code, 200)
+
+    def test_owner_filter(self):
+        Project.objects.create(title='Mine', owner=self.test_stitcher_1)
+        Project.objects.create(title='Theirs', owner=self.test_stitcher_2)
+
+        response = self._get('projects_project', owner=self.test_stitcher_1.pk)
+
+        self.assertEqual([project.title for project in response.context['cl'].result_list], ['Mine'])
+        self.assertContains(response, self.test_stitcher_1.user.username)
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard_a'])
+class ShardingTestCase(BaseMediaItemTestCase):
+    """Runs against a second in-memory database standing in for a shard"""
+
+    # Resolved once setUpClass has added the shard. Naming it here would fail the runner's checks
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases['shard_a'] = dict(
+            connections.databases['default'], NAME='file:memorydb_shard_a?mode=memory&cache=shared', TEST={}
+        )
+        call_command('migrate', database='shard_a', verbosity=0)
+
+        super(ShardingTestCase, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(ShardingTestCase, cls).tearDownClass()
+
+        connections['shard_a'].close()
+        del connections['shard_a']
+        del connections.databases['shard_a']
+
+    def setUp(self):
+        super(ShardingTestCase, self).setUp()
+
+        # A stitcher on each shard
+        self.owners = {}
+        i = 0
+        while len(self.owners) < 2:
+            stitcher = User.objects.create(username='owner{}'.format(i)).stitcher
+            self.owners.setdefault(shard_for(stitcher.pk), stitcher)
+            i += 1
+
+        self.here, self.there = self.owners['default'], self.owners['shard_a']
+
+    def test_rows_live_on_the_owners_shard(self):
+        here = Project.objects.create(title='Here', owner=self.here)
+        there = Project.objects.create(title='There', owner=self.there)
+
+        self.assertEqual((here._state.db, there._state.db), ('default', 'shard_a'))
+        self.assertNotEqual(here.pk, there.pk)
+        self.assertEqual(list(Project.objects.using('shard_a').values_list('title', flat=True)), ['There'])
+
+        # Counters stay with the stitcher
+        self.assertEqual(Stitcher.objects.get(pk=self.there.pk).project_count, 1)
+
+        self.assertEqual(list(self.there.projects.all()), [there])
+        self.assertEqual(Project.objects.visible_to(None).count(), 2)
+        self.assertEqual(Project.objects.visible_to(None).get(pk=there.pk), there)
+
+        moved = Project.objects.across_shards().set_status(Project.STATUSES['DELETED'])
+
+        self.assertEqual(moved, {Project.STATUSES['ENABLED']: 2})
+        self.assertEqual(
+            list(Stitcher.objects.filter(pk__in=[self.here.pk, self.there.pk]).values_list('project_count', flat=True)),
+            [0, 0]
+        )
+
+        # History sits next to its project
+        self.assertTrue(StatusChangeHistory.objects.using('shard_a').filter(object_id=there.pk).exists())
+        self.assertFalse(StatusChangeHistory.objects.using('default').filter(object_id=there.pk).exists())
+
+    def test_keyset_pages_merge_shards(self):
+        for i in range(6):
+            Project.objects.create(title=str(i), owner=self.here if i % 3 else self.there)
+
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        factory = APIRequestFactory()
+        url = '/?page_size=2'
+        titles = []
+
+        while url:
+            page = paginator.paginate_queryset(Project.objects.visible_to(None), Request(factory.get(url)))
+            titles.extend(project.title for project in page)
+            url = paginator.get_next_link()
+
+        self.assertEqual(titles, ['5', '4', '3', '2', '1', '0'])
+
+    def test_contributions_across_shards(self):
+        project = Project.objects.create(title='Theirs', owner=self.there, type=1)
+        media = self._create_asset(DocumentAsset, owner=self.here)
+
+        self.assertEqual(media._state.db, 'default')
+
+        stitch = project.add_stitch(media, self.here)
+        stitch = Stitch.objects.using('shard_a').get(pk=stitch.pk)
+
+        # The media is found on the contributor's shard, not the project's
+        self.assertEqual(stitch.media_item.pk, media.pk)
+
+        text_project = Project.objects.create(title='Words', owner=self.there, type=2)
+        append_text(text_project, 'first line', self.here)
+
+        self.assertEqual(text_at(text_project), (1, 'first line'))
+
+        response = APIClient().get(reverse('project-detail', args=[text_project.pk]))
+        self.assertEqual(response.json()['title'], 'Words')
+
+    def test_stitch_media_from_another_shard(self):
+        project = Project.objects.create(title='Theirs', owner=self.here, type=1)
+        media = self._create_asset(DocumentAsset, owner=self.there)
+
+        self.assertEqual(media._state.db, 'shard_a')
+
+        client = APIClient()
+        client.force_authenticate(self.there.user)
+        response = client.post(reverse('project-stitches', args=[project.pk]), {'media_item': media.pk}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['media_item'], media.pk)
+        self.assertEqual(project.stitches.get().media_item_id, media.pk)
+
+
+class PurgeDeletedTestCase(BaseMediaItemTestCase):
+
+    def _expire(self, *instances):
+        """Soft deletes the instances as if it happened 40 days ago"""
+        for instance in instances:
+            instance.delete()
+            type(instance).all_objects.filter(pk=instance.pk).update(status_update_timestamp=now() - timedelta(days=40))
+
+    def _purge(self, *args):
+        out = StringIO()
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            call_command('purge_deleted', *args, batch_size=2, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def _stored(self, asset):
+        return os.path.exists(os.path.join(self.test_media_root, asset.file.name))
+
+    def test_purge(self):
+        project = Project.objects.create(title='Gone', owner=self.test_stitcher_1, type=1)
+        text_project = Project.objects.create(title='Words', owner=self.test_stitcher_1, type=2)
+        append_text(text_project, 'a line', self.test_stitcher_1)
+
+        live_project = Project.objects.create(title='Live', owner=self.test_stitcher_2, type=1)
+        kept = self._create_asset(DocumentAsset, owner=self.test_stitcher_2)
+        project.add_stitch(kept, self.test_stitcher_2)
+
+        image = self._create_asset(ImageAsset, owner=self.test_stitcher_1)
+        documents = [self._create_asset(DocumentAsset, owner=self.test_stitcher_1) for _ in range(3)]
+        live_project.add_stitch(documents[0], self.test_stitcher_1)
+
+        recent = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        recent.delete()
+
+        self._expire(project, text_project, image, *documents)
+
+        self.assertIn('Would purge', self._purge('--dry-run'))
+        self.assertTrue(Project.all_objects.filter(pk=project.pk).exists())
+        self.assertTrue(self._stored(image))
+
+        output = self._purge()
+
+        self.assertIn('2/2 purged', output)
+        self.assertIn('4/4 purged', output)
+
+        # Rows and their dependents are gone from every table of the hierarchy
+        self.assertEqual(list(Project.all_objects.values_list('title', flat=True)), ['Live'])
+        self.assertFalse(ProjectText.objects.filter(project_id=text_project.pk).exists())
+        self.assertFalse(StatusChangeHistory.objects.filter(object_id__in=[project.pk, text_project.pk]).exists())
+        self.assertEqual(
+            set(MediaItem.all_objects.values_list('pk', flat=True)), {kept.pk, recent.pk}
+        )
+        self.assertFalse(ImageAsset.all_objects.exists())
+        self.assertEqual(set(DocumentAsset.all_objects.values_list('pk', flat=True)), {kept.pk, recent.pk})
+        self.assertEqual(Stitch.objects.count(), 0)
+
+        self.assertFalse(self._stored(image))
+        self.assertFalse(any(self._stored(document) for document in documents))
+        self.assertTrue(self._stored(kept) and self._stored(recent))
+
+        # Counters only ever counted live rows, so they are untouched
+        self.assertEqual(Stitcher.objects.get(pk=self.test_stitcher_1.pk).media_count, 0)
+        self.assertEqual(Stitcher.objects.get(pk=self.test_stitcher_2.pk).media_count, 1)
+
+        # Nothing left to do
+        self.assertIn('Purged 0 rows', self._purge())
+
+
+
+class ScanOrphansTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(ScanOrphansTestCase, self).setUp()
+
+        # A tree of its own, other tests leave their files behind
+        self.test_media_root = os.path.join(settings.MEDIA_ROOT, '__tests__', 'orphans')
+        shutil.rmtree(self.test_media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.test_media_root, ignore_errors=True)
+
+    def _scan(self, *args):
+        out = StringIO()
+        with self.settings(MEDIA_ROOT=self.test_media_root):
+            call_command('scan_orphans', *args, workers=1, batch_size=2, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def _write(self, name, age=0):
+        path = os.path.join(self.test_media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'stray')
+        os.utime(path, (now().timestamp() - age, now().timestamp() - age))
+        return path
+
+    def test_walk_sorted(self):
+        for name in ('b/x', 'a.b', 'a/y', 'a/x', 'a-c'):
+            self._write(os.path.join('tree', name))
+
+        self.assertEqual(
+            [name for name, _ in walk_sorted(os.path.join(self.test_media_root, 'tree'), 'tree/')],
+            sorted(['tree/b/x', 'tree/a.b', 'tree/a/y', 'tree/a/x', 'tree/a-c'])
+        )
+
+    def test_scan_ranges(self):
+        for directory in ('public', '12', '1'):
+            os.makedirs(os.path.join(self.test_media_root, 'uploads', directory))
+
+        self.assertEqual(get_scan_ranges(self.test_media_root), [
+            ScanRange(None, '', 'uploads/1/'),
+            ScanRange('uploads/1', 'uploads/1/', 'uploads/12/'),
+            ScanRange('uploads/12', 'uploads/12/', 'uploads/public/'),
+            ScanRange('uploads/public', 'uploads/public/', 'waveforms/'),
+            ScanRange('waveforms', 'waveforms/', None),
+        ])
+
+    def test_scan_and_repair(self):
+        documents = [self._create_asset(DocumentAsset, owner=self.test_stitcher_1) for _ in range(3)]
+        image = self._create_asset(ImageAsset, owner=self.test_stitcher_2)
+        public = self._create_asset(DocumentAsset)
+
+        with self.settings(MEDIA_ROOT=self.test_media_root), self.get_python_magic_hack() as mocker:
+            mocker.return_value = 'text/text'
+            compressed = DocumentAsset.objects.create(
+                file=SimpleUploadedFile('story.txt', b'Once upon a time\n' * 100), owner=self.test_stitcher_1
+            )
+
+        # Stored as story.txt.gz, which isn't an orphan
+        self.assertTrue(os.path.exists(os.path.join(self.test_media_root, compressed.file.name + '.gz')))
+
+        # A file without a row, one too new to tell, a row without its file and a parent without its asset
+        stray = self._write('uploads/{}/document/old.txt'.format(self.test_stitcher_1.pk), age=3 * 24 * 3600)
+        fresh = self._write('uploads/{}/document/new.txt'.format(self.test_stitcher_2.pk))
+        os.remove(os.path.join(self.test_media_root, documents[1].file.name))
+        DocumentAsset.all_objects.filter(pk=documents[2].pk)._raw_delete('default')
+
+        output = self._scan()
+
+        self.assertIn('Orphaned file: uploads/{}/document/old.txt'.format(self.test_stitcher_1.pk), output)
+        self.assertIn('Missing file: document asset {} file'.format(documents[1].pk), output)
+        self.assertIn('Orphaned media item: {}'.format(documents[2].pk), output)
+        self.assertIn('1 orphaned files, 1 missing files, 1 orphaned media items', output)
+        self.assertNotIn('new.txt', output)
+
+        self.assertNotIn('story', output)
+
+        # Reporting changes nothing
+        self.assertTrue(os.path.exists(stray))
+        self.assertEqual(MediaItem.objects.count(), 6)
+
+        self.assertIn('Deleted 1 files (0 failed), cleared 0 waveforms and deleted 2 media items', self._scan('--repair'))
+
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertEqual(
+            set(MediaItem.objects.values_list('pk', flat=True)), {documents[0].pk, image.pk, public.pk, compressed.pk}
+        )
+        self.assertEqual(Stitcher.objects.get(pk=self.test_stitcher_1.pk).media_count, 2)
+
+        # The orphaned file is gone, the rows are only soft deleted and keep showing up as missing
+        self.assertIn('0 orphaned files, 1 missing files, 1 orphaned media items', self._scan())
+
+    def test_names_joined_in_byte_order(self):
+        # Orders most collations other than SQLite's would disagree with Python on
+        prefix = 'uploads/{}/document/'.format(self.test_stitcher_1.pk)
+        names = [prefix + name for name in ('b.txt', 'B.txt', 'a_b.txt', 'A.txt', 'a-b.txt', 'a b.txt', 'ab.txt', 'a.txt')]
+
+        for name in names:
+            document = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+            os.remove(os.path.join(self.test_media_root, document.file.name))
+            DocumentAsset.all_objects.filter(pk=document.pk).update(file=name)
+            self._write(name, age=3 * 24 * 3600)
+
+        self.assertEqual(
+            [ref.name for ref in stored_names(DocumentAsset, 'file', prefix, None, 3)], sorted(names)
+        )
+        self.assertIn('0 orphaned files, 0 missing files, 0 orphaned media items', self._scan())
+
+    def test_byte_order_per_backend(self):
+        def ordered_sql():
+            return str(DocumentAsset.objects.annotate(name_key=byte_order('file', 'default')).order_by('name_key').query)
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIn('"file" COLLATE "C"', ordered_sql())
+
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            self.assertIn('BINARY "projects_documentasset"."file"', ordered_sql())
+
+        with mock.patch.object(connection, 'vendor', 'oracle'):
+            with self.assertRaises(OrphanScanError):
+                byte_order('file', 'default')
+
+
+class ColdStorageTestCase(BaseMediaItemTestCase):
+
+    def setUp(self):
+        super(ColdStorageTestCase, self).setUp()
+
+        self.cold_root = os.path.join(settings.MEDIA_ROOT, '__tests__', 'cold')
+        shutil.rmtree(self.cold_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.cold_root, ignore_errors=True)
+
+        self.tiered = self.settings(MEDIA_ROOT=self.test_media_root, COLD_STORAGE_ROOT=self.cold_root)
+        self.tiered.enable()
+        self.addCleanup(self.tiered.disable)
+
+    def _is_cold(self, asset):
+        return asset.file.storage.is_cold(asset.file.name)
+
+    def test_archive_and_enable_move_files(self):
+        document = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+
+        with mock.patch('core.jobs.transaction.on_commit', side_effect=lambda func, using=None: func()):
+            document.archive()
+            self.assertEqual(Job.objects.get().key, 'projects.tasks.sync_storage_tier:[{}]'.format(document.pk))
+            self.assertEqual(run_pending(), 1)
+
+            self.assertTrue(self._is_cold(document))
+
+            # Reading it doesn't need the job, and doesn't change what the API reports
+            document = DocumentAsset.objects.get(pk=document.pk)
+            with document.file.open('rb') as f:
+                self.assertTrue(f.read())
+            self.assertFalse(self._is_cold(document))
+
+            # Only a change of status moves anything
+            document.archive()
+            self.assertEqual(run_pending(), 0)
+
+            document.refresh_from_db()
+            document.file.storage.freeze(document.file.name)
+            document.enable()
+            self.assertEqual(run_pending(), 1)
+
+        self.assertFalse(self._is_cold(document))
+
+    def test_sweep(self):
+        archived = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        unused = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+        used = self._create_asset(DocumentAsset, owner=self.test_stitcher_1)
+
+        # Bulk transitions don't queue moves, the sweep picks them up
+        DocumentAsset.objects.filter(pk=archived.pk).set_status(ARCHIVED)
+
+        old = now() - timedelta(days=60)
+        MediaItem.objects.filter(pk__in=[unused.pk, used.pk]).update(created_at=old)
+        os.utime(unused.file.path, (old.timestamp(), old.timestamp()))
+
+        out = StringIO()
+        call_command('tier_media', '--dry-run', unused_days=30, workers=1, stdout=out)
+        self.assertIn('Would move 1 files of archived media', out.getvalue())
+        self.assertFalse(self._is_cold(archived))
 
+        out = StringIO()
+        call_command('tier_media', unused_days=30, workers=1, stdout=out)
 
+        self.assertIn('Moved 1 files of archived media', out.getvalue())
+        self.assertIn('Moved 1 files of unused media', out.getvalue())
+        self.assertEqual([self._is_cold(asset) for asset in (archived, unused, used)], [True, True, False])
 
+        # Cold files aren't missing
+        self.assertNotIn('Missing file', self._scan_orphans())
 
+    def _scan_orphans(self):
+        out = StringIO()
+        call_command('scan_orphans', workers=1, stdout=out, stderr=StringIO())
+        return out.getvalue()
@@ -0,0 +1,112 @@
+"""
+Text stitching for Lyrics, Joke and Story projects.
+
+Each contribution is stored as a TextSegment and appended to the cached ProjectText with a
+single UPDATE, so the cost of a contribution doesn't grow with the length of the story.
+Segments record the line they start at, which lets a diff between two revisions read only
+the segments in between.
+"""
+from django.db import models, router, transaction
+from django.db.models.functions import Concat
+
+from .models import ProjectText, TextSegment
+
+
+def count_lines(text):
+    return text.count('\n') + 1
+
+
+def append_text(project, text, contributor):
+    """Appends a segment at the next stitch position. Raises StitchLimitReached when the project is full"""
+    using = router.db_for_write(TextSegment, instance=project)
+
+    with transaction.atomic(using=using):
+        # Locks the project row until commit, so appends to one project are applied one at a time
+        revision = project.reserve_stitch_position(using=using)
+
+        # Only the line count is read. The text itself is extended by the database
+        line_start = ProjectText.objects.using(using).filter(pk=project.pk).values_list('line_count', flat=True).first()
+
+        if line_start is None:
+            ProjectText.objects.using(using).create(project=project)
+            line_start = 0
+
+        line_count = count_lines(text)
+
+        segment = TextSegment.objects.using(using).create(
+            project=project,
+            contributor=contributor,
+            revision=revision,
+            text=text,
+            line_start=line_start,
+            line_count=line_count
+        )
+
+        ProjectText.objects.using(using).filter(pk=project.pk).update(
+            text=Concat(models.F('text'), models.Value(('\n' if line_start else '') + text), output_field=models.TextField()),
+            revision=revision,
+            line_count=models.F('line_count') + line_count
+        )
+
+    return segment
+
+
+def lines_at(project, revision):
+    """The number of lines the text had at `revision`"""
+    segment = (
+        project.text_segments.filter(revision__lte=revision)
+        .order_by('-revision').only('line_start', 'line_count').first()
+    )
+    return segment.line_start + segment.line_count if segment else 0
+
+
+def text_at(project, revision=None):
+    """Returns (revision, text). Older revisions are cut from the cached text, not rebuilt from segments"""
+    try:
+        cached = ProjectText.objects.db_manager(hints={'instance': project}).get(pk=project.pk)
+    except ProjectText.DoesNotExist:
+        return 0, ''
+
+    if revision is None or revision >= cached.revision:
+        return cached.revision, cached.text
+
+    lines = lines_at(project, revision)
+    return revision, '\n'.join(cached.text.split('\n', lines)[:lines])
+
+
+def unified_diff(project, from_revision, to_revision):
+    """
+    A unified diff of the text between two revisions. Text is append only, so the diff is a
+    single hunk of the lines added after `from_revision` (or removed, when going backwards).
+    Only the segments between the two revisions are read.
+    """
+    sign = '+'
+
+    if to_revision < from_revision:
+        from_revision, to_revision = to_revision, from_revision
+        sign = '-'
+
+    segments = list(
+        project.text_segments.filter(revision__gt=from_revision, revision__lte=to_revision)
+        .order_by('revision').only('text', 'line_start')
+    )
+
+    header = [
+        '--- r{}'.format(from_revision if sign == '+' else to_revision),
+        '+++ r{}'.format(to_revision if sign == '+' else from_revision),
+    ]
+
+    if not segments:
+        return '\n'.join(header) + '\n'
+
+    start = segments[0].line_start
+    added = [line for segment in segments for line in segment.text.split('\n')]
+
+    # The side without the lines is written as "start,0", meaning after line `start`
+    ranges = ('-{},0'.format(start), '+{},{}'.format(start + 1, len(added)))
+    if sign == '-':
+        ranges = ('-{},{}'.format(start + 1, len(added)), '+{},0'.format(start))
+
+    hunk = ['@@ {} {} @@'.format(*ranges)] + [sign + line for line in added]
+
+    return '\n'.join(header + hunk) + '\n'
@@ -0,0 +1,62 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.template.defaultfilters import filesizeformat
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload is too large.'
+    default_code = 'upload_too_large'
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    Counts bytes as the upload streams in and stops reading the request as soon as a limit is passed,
+    before the rest of the body reaches disk.
+
+    `quota` caps the bytes of every file in the request together, `max_file_size` caps each file.
+    Either may be None. It has to run before the handlers that store data, so insert it first.
+    """
+
+    def __init__(self, request=None, quota=None, max_file_size=None):
+        super(QuotaUploadHandler, self).__init__(request)
+
+        self.quota = quota
+        self.max_file_size = max_file_size
+
+        self.total_received = 0
+        self.file_received = 0
+
+        self.error = None
+
+    def new_file(self, *args, **kwargs):
+        super(QuotaUploadHandler, self).new_file(*args, **kwargs)
+        self.file_received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_received += len(raw_data)
+        self.file_received += len(raw_data)
+
+        if self.max_file_size is not None and self.file_received > self.max_file_size:
+            self.error = "{} is larger than the max allowed size of {}".format(
+                self.file_name, filesizeformat(self.max_file_size)
+            )
+        elif self.quota is not None and self.total_received > self.quota:
+            self.error = "Upload exceeds the remaining storage quota of {}".format(
+                filesizeformat(self.quota)
+            )
+
+        if self.error:
+            # Don't read the rest of the body
+            raise StopUpload(connection_reset=True)
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Let the next handler build the file
+        return None
+
+    def raise_if_exceeded(self):
+        if self.error:
+            raise UploadTooLarge(self.error)
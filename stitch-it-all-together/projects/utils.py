@@ -3,6 +3,8 @@ import os
 from django.core.exceptions import ValidationError
 from django.template.defaultfilters import filesizeformat
 
+from .ingest import get_ingest_result
+
 
 class FileValidatorFunction(object):
     """
@@ -26,10 +28,23 @@ class FileValidatorFunction(object):
             self.allowed_extensions
         )
 
-        if max_file_size is not None and uploaded_file.size > max_file_size:
+        # Size, hash and MIME type come from one read of the upload, shared with MediaItem.save.
+        # libmagic runs as part of it, so its failures are reported as they are below
+        try:
+            ingested = get_ingest_result(uploaded_file) if not getattr(uploaded_file, '_committed', False) else None
+        except Exception as e:
+            raise ValidationError(
+                'Unable to determine content type of uploaded file. [{}]'.format(
+                    getattr(e, 'message', str(e))
+                )
+            )
+
+        size = ingested.size if ingested else uploaded_file.size
+
+        if max_file_size is not None and size > max_file_size:
             raise ValidationError(
                 "File size of {} is larger than the max allowed size of {}".format(
-                    filesizeformat(uploaded_file.size),
+                    filesizeformat(size),
                     filesizeformat(max_file_size)
                 )
             )
@@ -38,7 +53,7 @@ class FileValidatorFunction(object):
             if magic:
                 # Use python-magic wrapper over libmagic to extract mimetype from headers
                 try:
-                    mimetype = magic.from_buffer(uploaded_file.read(1024), mime=True)
+                    mimetype = ingested.mimetype if ingested else magic.from_buffer(uploaded_file.read(1024), mime=True)
                     if mimetype not in allowed_mimetypes:
                         raise ValidationError(
                             '{} is not a valid content type for this field'.format(
@@ -93,3 +108,13 @@ class FileValidatorFunction(object):
                 'allowed_extensions': self.allowed_extensions
             }
         )
+
+
+def get_max_file_size(field):
+    """The smallest max_file_size of any FileValidatorFunction on a model field, or None"""
+    sizes = [
+        validator.max_file_size for validator in field.validators
+        if isinstance(validator, FileValidatorFunction) and validator.max_file_size is not None
+    ]
+
+    return min(sizes) if sizes else None
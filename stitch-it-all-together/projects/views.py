@@ -1,20 +1,344 @@
-from rest_framework import permissions
-from rest_framework.viewsets import ModelViewSet
+from django.http import HttpResponse, Http404
+from rest_framework import mixins, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework.response import Response
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from projects.models import Project
+from core.jobs import JobQueueFull
+from core.mixins import StatusActionsMixin
+from core.models import prefetch_status_changes
+from core.pagination import KeysetPagination
+from projects.audio import extract_peaks_level, decode_peaks_header
+from projects.models import Project, MediaItem, AudioAsset, StitchLimitReached
 from projects.permissions import IsOwnerOrReadOnly
-from projects.serializers import ProjectSerializer
+from projects.serializers import (
+    ProjectSerializer, ProjectHistorySerializer, MediaItemSerializer, MediaUploadSerializer, StitchRenderSerializer,
+    StitchSerializer, TextSegmentSerializer
+)
+from projects.stitching import stitch_project_audio, StitchError
+from projects.text import append_text, text_at, unified_diff
+from projects.uploadhandlers import QuotaUploadHandler, UploadTooLarge
+from projects.utils import get_max_file_size
 
 
-class ProjectViewSet(ModelViewSet):
+def get_revision_param(request, name, default=None):
+    value = request.query_params.get(name)
+
+    if value is None:
+        return default
+
+    try:
+        value = int(value)
+        if value < 0:
+            raise ValueError(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a revision number'})
+
+    return value
+
+
+class ProjectViewSet(StatusActionsMixin, ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
-    `update` and `destroy` actions.
+    `update` and `destroy` actions, plus `restore` and admin bulk status changes.
     """
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly]
 
+    bulk_status_filters = {
+        'owner': 'owner_id',
+        'status': 'status',
+        'type': 'type',
+        'is_private': 'is_private',
+        'created_before': 'created_at__lt',
+        'created_after': 'created_at__gte',
+    }
+
+    def get_queryset(self):
+        # Private projects of other stitchers never leave the database
+        return Project.objects.visible_to(self.request.user)
+
+    def get_restore_queryset(self):
+        return super(ProjectViewSet, self).get_restore_queryset().visible_to(self.request.user)
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user.stitcher)
+
+    @action(detail=False, serializer_class=ProjectHistorySerializer)
+    def history(self, request):
+        """
+        Projects with their status timelines. `latest` limits each timeline to its N most recent changes.
+        The history of the whole page is loaded in one query.
+        """
+        latest = request.query_params.get('latest')
+
+        if latest is not None:
+            try:
+                latest = int(latest)
+                if latest < 1:
+                    raise ValueError(latest)
+            except ValueError:
+                raise ValidationError({'latest': 'Must be a positive integer'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        projects = queryset.with_status_changes(latest=latest) if page is None else prefetch_status_changes(page, latest=latest)
+
+        serializer = self.get_serializer(projects, many=True)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get', 'post'], serializer_class=StitchSerializer,
+            permission_classes=[permissions.IsAuthenticatedOrReadOnly])
+    def stitches(self, request, pk=None):
+        """
+        The contributions of a project in order, paged by keyset on position.
+        Any stitcher who can see the project may append one of their media items until max_stitches is reached.
+        """
+        project = self.get_object()
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+
+            try:
+                stitch = project.add_stitch(serializer.validated_data['media_item'], request.user.stitcher)
+            except StitchLimitReached as e:
+                raise ValidationError({'project': str(e)})
+
+            return Response(self.get_serializer(stitch).data, status=status.HTTP_201_CREATED)
+
+        paginator = KeysetPagination(ordering=('position',))
+        page = paginator.paginate_queryset(project.stitches.all(), request, view=self)
+
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=['get', 'post'], serializer_class=TextSegmentSerializer,
+            permission_classes=[permissions.IsAuthenticatedOrReadOnly])
+    def text(self, request, pk=None):
+        """
+        The assembled text of a Lyrics, Joke or Story project, optionally as it was at `revision`.
+        Posting `text` appends a segment, counted against max_stitches like any other stitch.
+        """
+        project = self.get_object()
+
+        if not project.is_text():
+            raise ValidationError({'type': 'Only Lyrics, Joke and Story projects have text'})
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+
+            try:
+                segment = append_text(project, serializer.validated_data['text'], request.user.stitcher)
+            except StitchLimitReached as e:
+                raise ValidationError({'project': str(e)})
+
+            return Response(self.get_serializer(segment).data, status=status.HTTP_201_CREATED)
+
+        revision, text = text_at(project, get_revision_param(request, 'revision'))
+
+        return Response({'revision': revision, 'text': text})
+
+    @action(detail=True, url_path='text/diff', url_name='text-diff',
+            permission_classes=[permissions.IsAuthenticatedOrReadOnly])
+    def text_diff(self, request, pk=None):
+        """A unified diff of the text from revision `from` (default 0) to `to` (default latest)"""
+        project = self.get_object()
+
+        from_revision = get_revision_param(request, 'from', 0)
+        to_revision = get_revision_param(request, 'to', project.stitch_count)
+
+        return HttpResponse(unified_diff(project, from_revision, to_revision), content_type='text/x-diff; charset=utf-8')
+
+    @action(detail=True, methods=['post'], url_path='render', url_name='render', serializer_class=StitchRenderSerializer)
+    def render_audio(self, request, pk=None):
+        """
+        Renders `media`, a list of audio asset ids, into a single WAV owned by the project owner.
+        `crossfade` overlaps neighbouring stems by that many seconds.
+        """
+        project = self.get_object()
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            asset = stitch_project_audio(
+                project,
+                serializer.validated_data['media'],
+                crossfade=serializer.validated_data['crossfade'],
+                name=serializer.validated_data.get('name')
+            )
+        except StitchError as e:
+            raise ValidationError({'media': str(e)})
+
+        return Response(MediaItemSerializer(asset, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+
+class MediaItemViewSet(StatusActionsMixin, mixins.CreateModelMixin, ReadOnlyModelViewSet):
+    """
+    The media library. Newest first, paged by keyset on `(created_at, id)`.
+
+    The list holds the public media and the requester's own. Other stitchers' media is only reachable
+    by id, e.g. through the stitches of a project.
+
+    Filters: `type` (image, audio, video or document), `owner` (stitcher id) and `public`.
+    Audio can also be filtered by `min_duration` and `max_duration` in seconds and ordered by
+    `ordering=duration` or `ordering=-duration`, all answered from indexed columns.
+
+    Uploads are multipart posts of `type` and `file`. They are counted against the stitcher's storage
+    quota while they stream, and rejected with 413 as soon as they pass it.
+    """
+    queryset = MediaItem.objects.with_type_instances().across_shards()
+    serializer_class = MediaItemSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+
+    bulk_status_filters = {
+        'owner': 'owner_id',
+        'status': 'status',
+        'mimetype': 'mimetype',
+        'content_hash': 'content_hash',
+        'larger_than': 'size__gt',
+        'created_before': 'created_at__lt',
+        'created_after': 'created_at__gte',
+    }
+
+    processing_backlog_retry_after = 30
+
+    type_filters = {
+        'image': 'images',
+        'audio': 'audios',
+        'video': 'videos',
+        'document': 'documents',
+    }
+
+    def get_queryset(self):
+        queryset = super(MediaItemViewSet, self).get_queryset()
+        params = self.request.query_params
+
+        if self.action == 'list':
+            # Stitchers' libraries aren't for browsing by everyone
+            queryset = queryset.visible_to(self.request.user)
+
+        asset_type = params.get('type')
+        if asset_type:
+            if asset_type not in self.type_filters:
+                raise ValidationError({'type': 'Must be one of {}'.format(', '.join(sorted(self.type_filters)))})
+            queryset = getattr(queryset, self.type_filters[asset_type])()
+
+        owner = params.get('owner')
+        if owner:
+            try:
+                queryset = queryset.for_stitcher(int(owner))
+            except ValueError:
+                raise ValidationError({'owner': 'Must be a stitcher id'})
+
+        if params.get('public', '').lower() in ('1', 'true', 'yes'):
+            queryset = queryset.public()
+
+        for param, lookup in (('min_duration', 'gte'), ('max_duration', 'lte')):
+            if params.get(param):
+                try:
+                    queryset = queryset.filter(**{'audioasset__duration__' + lookup: float(params[param])})
+                except ValueError:
+                    raise ValidationError({param: 'Must be a number of seconds'})
+
+        if self.get_ordering() is not None:
+            # The keyset can't seek past NULLs
+            queryset = queryset.filter(audioasset__duration__isnull=False)
+
+        return queryset
+
+    def get_ordering(self):
+        """The keyset ordering asked for with `ordering`, or None for the paginator's default"""
+        ordering = self.request.query_params.get('ordering')
+
+        if not ordering:
+            return None
+
+        if ordering not in ('duration', '-duration'):
+            raise ValidationError({'ordering': 'Must be duration or -duration'})
+
+        descending = '-' if ordering.startswith('-') else ''
+        return (descending + 'audioasset__duration', descending + 'id')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class(ordering=self.get_ordering())
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return MediaUploadSerializer
+        return super(MediaItemViewSet, self).get_serializer_class()
+
+    def initial(self, request, *args, **kwargs):
+        super(MediaItemViewSet, self).initial(request, *args, **kwargs)
+
+        # Authenticated by now and the body hasn't been read yet
+        if self.action == 'create':
+            self.upload_handler = QuotaUploadHandler(
+                request,
+                quota=request.user.stitcher.storage_remaining(),
+                max_file_size=self.get_max_upload_size()
+            )
+            request.upload_handlers.insert(0, self.upload_handler)
+
+    def get_max_upload_size(self):
+        """The largest size any asset type accepts, or None if one of them is unlimited"""
+        sizes = [
+            get_max_file_size(asset_class._meta.get_field('file'))
+            for asset_class in MediaUploadSerializer.ASSET_CLASSES.values()
+        ]
+        return None if None in sizes else max(sizes)
+
+    def create(self, request, *args, **kwargs):
+        request.data  # Parse the upload so the quota is checked before anything else
+        self.upload_handler.raise_if_exceeded()
+
+        return super(MediaItemViewSet, self).create(request, *args, **kwargs)
+
+    @action(detail=True)
+    def waveform(self, request, pk=None):
+        """
+        The precomputed peaks sidecar of an audio asset. `level` picks a single zoom level
+        (0 is the finest) so a client only downloads the resolution it draws.
+        """
+        asset = self.get_object().get_type_instance()
+
+        if not isinstance(asset, AudioAsset) or not asset.waveform:
+            raise Http404('No waveform for this media item')
+
+        with asset.waveform.open('rb') as sidecar:
+            data = sidecar.read()
+
+        level = request.query_params.get('level')
+
+        if level is not None:
+            try:
+                data = extract_peaks_level(data, int(level))
+            except (ValueError, IndexError):
+                raise ValidationError({'level': 'Must be between 0 and {}'.format(len(decode_peaks_header(data)[2]) - 1)})
+
+        return HttpResponse(data, content_type='application/octet-stream')
+
+    def perform_create(self, serializer):
+        stitcher = self.request.user.stitcher
+        remaining = stitcher.storage_remaining()
+
+        if remaining is not None and serializer.validated_data['file'].size > remaining:
+            raise UploadTooLarge('Upload exceeds the remaining storage quota')
+
+        try:
+            serializer.save(owner=stitcher)
+        except JobQueueFull:
+            raise Throttled(wait=self.processing_backlog_retry_after, detail='Media processing is backed up. Try again shortly')
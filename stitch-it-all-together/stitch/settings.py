@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from core.db import database_from_env, replicas_from_env, shards_from_env
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -58,6 +60,7 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,14 +92,27 @@ WSGI_APPLICATION = 'stitch.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
+# Chosen with DATABASE_* environment variables, see core/db.py. SQLite in BASE_DIR by default
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': database_from_env(BASE_DIR)
 }
 
+# Read replicas from DATABASE_REPLICAS. Safe-method requests read from them, see core/routers.py
+_replicas = replicas_from_env(DATABASES['default'])
+DATABASES.update(_replicas)
+DATABASE_REPLICAS = sorted(_replicas)
+
+# Owner data spread over the primary and DATABASE_SHARDS, see core/sharding.py. Empty when not sharded
+_shards = shards_from_env(DATABASES['default'])
+DATABASES.update(_shards)
+DATABASE_SHARDS = ['default'] + sorted(_shards) if _shards else []
+
+DATABASE_ROUTERS = ['core.sharding.ShardRouter', 'core.routers.PrimaryReplicaRouter']
+
+# Seconds a client reads from the primary after writing, which should cover replication lag
+REPLICA_PIN_SECONDS = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -153,6 +169,30 @@ STATIC_DIR = os.path.join(BASE_DIR, '_collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'core.storage.TieredStorage'
+
+# Files of archived media, and of media unused for COLD_STORAGE_UNUSED_DAYS, are moved from MEDIA_ROOT
+# to this directory on cheaper disk, gzipped with COLD_STORAGE_COMPRESS. None keeps everything in MEDIA_ROOT
+COLD_STORAGE_ROOT = None
+COLD_STORAGE_COMPRESS = True
+COLD_STORAGE_UNUSED_DAYS = None
+
+# Document uploads are stored compressed with 'gzip' or 'zstd' (needs the zstandard package) when that
+# saves space, and served as stored to clients accepting the encoding. None stores them as uploaded.
+# A compressed document is only on disk as e.g. notes.txt.gz, so the web server has to either serve
+# those itself, with nginx's `gzip_static always; gunzip on;` under MEDIA_URL, or pass misses on to Django.
+# Django only routes document paths for this, the rest of MEDIA_ROOT is left to the web server
+DOCUMENT_COMPRESSION = 'gzip'
+
+# Bytes of media each stitcher may store, unless set on the stitcher. None for unlimited
+STITCHER_STORAGE_QUOTA = None
+
+# Pending background jobs (see core.jobs) beyond which new work, such as uploads, is refused
+JOB_QUEUE_LIMIT = 10000
+
+# Days soft deleted projects and media are kept before purge_deleted removes them and their files
+DELETED_RETENTION_DAYS = 30
+
 # Add a local settings file to override settings for development
 try:
     from .localsettings import *
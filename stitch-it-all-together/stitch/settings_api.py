@@ -0,0 +1,45 @@
+"""
+Settings for API workers, which only serve the JSON API.
+
+    DJANGO_SETTINGS_MODULE=stitch.settings_api gunicorn stitch.wsgi
+
+Everything in stitch.settings (and localsettings) applies, minus the admin, account registration and
+development apps, so a worker imports less and starts faster. Run the admin and the /api/auth/register/
+endpoints on workers with the full settings. Use the profile_startup command to compare the two.
+
+DRF imports markdown, pygments, yaml, coreapi and requests whenever they are installed, so leave them
+out of the API worker image where possible.
+"""
+from .settings import *  # noqa: F401,F403
+
+# Apps API workers don't load. Registration pulls in allauth's social accounts and requests
+API_EXCLUDED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django_registration',
+    'django_extensions',
+    'allauth',
+    'allauth.account',
+    'allauth.socialaccount',
+    'rest_auth.registration',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]  # noqa: F405
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE  # noqa: F405
+    if middleware != 'django.contrib.messages.middleware.MessageMiddleware'
+]
+
+TEMPLATES = [
+    dict(template, OPTIONS=dict(template['OPTIONS'], context_processors=[
+        processor for processor in template['OPTIONS']['context_processors']
+        if processor != 'django.contrib.messages.context_processors.messages'
+    ]))
+    for template in TEMPLATES  # noqa: F405
+]
+
+# JSON only. The browsable API renderer brings in forms, templates, markdown and pygments
+REST_FRAMEWORK = dict(REST_FRAMEWORK, DEFAULT_RENDERER_CLASSES=[  # noqa: F405
+    'rest_framework.renderers.JSONRenderer',
+])
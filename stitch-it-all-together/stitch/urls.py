@@ -1,16 +1,24 @@
-from django.contrib import admin
-from django.urls import path, include
+import re
+from urllib.parse import urlsplit
+
+from django.urls import path, include, re_path
 from django.conf.urls import include
 from django.conf import settings
-from django.contrib.staticfiles.urls import static
-from core.views import api_root
+from core.views import api_root, serve_media
 
 # Base URLS
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', api_root),
 ]
 
+# Left out of the API worker settings, see stitch/settings_api.py
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('admin/', admin.site.urls),
+    ]
+
 # App urls
 urlpatterns += [
     path('api/', include('projects.urls')),
@@ -20,12 +28,23 @@ urlpatterns += [
 # Auth endpoint
 urlpatterns += [
     path('api/auth/', include('rest_auth.urls')),
-    path('api/auth/register/', include('rest_auth.registration.urls'))
 ]
 
-# Server local media files when in debug mode
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
+if 'rest_auth.registration' in settings.INSTALLED_APPS:
+    urlpatterns += [
+        path('api/auth/register/', include('rest_auth.registration.urls'))
+    ]
+
+# Serve local media files in debug mode, and cold or compressed ones the web server passes on. See core.storage
+if not urlsplit(settings.MEDIA_URL).netloc:
+    media_prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+
+    if settings.DEBUG or getattr(settings, 'COLD_STORAGE_ROOT', None):
+        urlpatterns += [
+            re_path(r'^{}(?P<path>.*)$'.format(media_prefix), serve_media),
+        ]
+    elif getattr(settings, 'DOCUMENT_COMPRESSION', None):
+        # Only documents are stored compressed, the web server keeps serving everything else
+        urlpatterns += [
+            re_path(r'^{}(?P<path>uploads/[^/]+/document/.*)$'.format(media_prefix), serve_media),
+        ]
@@ -1,24 +1,110 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
+from django.template.defaultfilters import filesizeformat
 # Register your models here.
 
+from core.admin import EstimatedCountPaginator
+from core.models import ENABLED, SUSPENDED
+from projects.models import Project, MediaItem
+
 from .models import Stitcher
 
 
 class StitcherAdminStackedInline(admin.StackedInline):
 
     model = Stitcher
+    can_delete = False
+    readonly_fields = Stitcher.COUNTER_FIELDS
 
 
 class StitcherUserAdmin(UserAdmin):
+    """
+    The user changelist reads the denormalised Stitcher counters through one join, so a page costs
+    the same number of queries however many users it shows. Actions work on the whole selection at once.
+    """
 
     inlines = (StitcherAdminStackedInline, )
 
+    list_display = UserAdmin.list_display + ('project_count', 'media_count', 'storage_used')
+    list_select_related = ('stitcher', )
 
-admin.site.unregister(User)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-admin.site.register(User, StitcherUserAdmin)
+    actions = ['activate_users', 'deactivate_users', 'suspend_content', 'enable_content', 'reconcile_counters']
+
+    def get_inline_instances(self, request, obj=None):
+        # The post_save signal provisions the stitcher of a new user. An inline on the add form
+        # would try to create a second one
+        if obj is None:
+            return []
+        return super(StitcherUserAdmin, self).get_inline_instances(request, obj)
+
+    @staticmethod
+    def _counter(user, name):
+        try:
+            return getattr(user.stitcher, name)
+        except Stitcher.DoesNotExist:
+            return None
+
+    def project_count(self, user):
+        return self._counter(user, 'project_count')
+
+    project_count.short_description = 'projects'
+    project_count.admin_order_field = 'stitcher__project_count'
+
+    def media_count(self, user):
+        return self._counter(user, 'media_count')
+
+    media_count.short_description = 'media'
+    media_count.admin_order_field = 'stitcher__media_count'
+
+    def storage_used(self, user):
+        used = self._counter(user, 'storage_used')
+        return filesizeformat(used) if used is not None else None
+
+    storage_used.short_description = 'storage used'
+    storage_used.admin_order_field = 'stitcher__storage_used'
+
+    def activate_users(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        self.message_user(request, '{} users activated'.format(updated), messages.SUCCESS)
+
+    activate_users.short_description = 'Activate selected users'
 
+    def deactivate_users(self, request, queryset):
+        updated = queryset.exclude(pk=request.user.pk).update(is_active=False)
+        self.message_user(request, '{} users deactivated'.format(updated), messages.SUCCESS)
 
+    deactivate_users.short_description = 'Deactivate selected users'
 
+    def _set_content_status(self, request, queryset, to_status, **filters):
+        moved = 0
+
+        for model in (Project, MediaItem):
+            content = model.objects.filter(owner__user__in=queryset, **filters)
+            moved += sum(content.set_status(to_status).values())
+
+        self.message_user(request, '{} projects and media items updated'.format(moved), messages.SUCCESS)
+
+    def suspend_content(self, request, queryset):
+        self._set_content_status(request, queryset, SUSPENDED)
+
+    suspend_content.short_description = 'Suspend projects and media of selected users'
+
+    def enable_content(self, request, queryset):
+        self._set_content_status(request, queryset, ENABLED, status=SUSPENDED)
+
+    enable_content.short_description = 'Enable suspended projects and media of selected users'
+
+    def reconcile_counters(self, request, queryset):
+        fixed = Stitcher.reconcile_counters(Stitcher.objects.filter(user__in=queryset))
+        self.message_user(request, '{} stitchers had drifted counters'.format(fixed), messages.SUCCESS)
+
+    reconcile_counters.short_description = 'Recount projects and media of selected users'
+
+
+admin.site.unregister(User)
+
+admin.site.register(User, StitcherUserAdmin)
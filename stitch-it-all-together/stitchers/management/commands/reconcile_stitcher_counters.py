@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stitchers.models import Stitcher
+
+
+class Command(BaseCommand):
+    help = "Recompute each stitcher's project, media and storage counters and fix any that have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Stitchers checked per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            pks = list(
+                Stitcher.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+
+            if not pks:
+                break
+
+            with transaction.atomic():
+                fixed += Stitcher.reconcile_counters(Stitcher.objects.filter(pk__in=pks))
+
+            checked += len(pks)
+            last_pk = pks[-1]
+
+        self.stdout.write('Checked {} stitchers, fixed {}'.format(checked, fixed))
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:09
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+DELETED = 1
+
+
+def backfill_counters(apps, schema_editor):
+    Stitcher = apps.get_model('stitchers', 'Stitcher')
+    Project = apps.get_model('projects', 'Project')
+    MediaItem = apps.get_model('projects', 'MediaItem')
+
+    projects = Project.objects.filter(owner=models.OuterRef('pk')).exclude(status=DELETED).order_by().values('owner')
+    media = MediaItem.objects.filter(owner=models.OuterRef('pk')).exclude(status=DELETED).order_by().values('owner')
+
+    Stitcher.objects.using(schema_editor.connection.alias).update(
+        project_count=Coalesce(models.Subquery(projects.annotate(n=models.Count('pk')).values('n')), 0),
+        media_count=Coalesce(models.Subquery(media.annotate(n=models.Count('pk')).values('n')), 0),
+        storage_used=Coalesce(models.Subquery(media.annotate(n=models.Sum('size')).values('n')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stitchers', '0001_initial'),
+        ('projects', '0006_project_visibility_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stitcher',
+            name='media_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='stitcher',
+            name='project_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='stitcher',
+            name='storage_used',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Bytes used by live media'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stitchers', '0002_stitcher_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stitcher',
+            name='storage_quota',
+            field=models.BigIntegerField(blank=True, help_text='Bytes of media this stitcher may store. Empty uses the STITCHER_STORAGE_QUOTA setting', null=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from django.apps import apps
+from django.conf import settings
 from django.db import models
 from django.db.models import signals
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
 
@@ -20,31 +23,101 @@ class Stitcher(models.Model):
         help_text="How does one live their life?"
     )
 
+    # Denormalised counters of live (not soft deleted) content. Kept current by
+    # StatusModel.update_live_counters and repaired by the reconcile_stitcher_counters command.
+
+    project_count = models.IntegerField(default=0, editable=False)
+
+    media_count = models.IntegerField(default=0, editable=False)
+
+    storage_used = models.BigIntegerField(default=0, editable=False, help_text="Bytes used by live media")
+
+    storage_quota = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Bytes of media this stitcher may store. Empty uses the STITCHER_STORAGE_QUOTA setting"
+    )
+
+    COUNTER_FIELDS = ('project_count', 'media_count', 'storage_used')
+
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        # Counters are only ever moved by F() updates. Don't write back a stale copy of them
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+
+        return super(Stitcher, self).save(*args, **kwargs)
+
     def get_motto_uppercase(self):
         return self.motto.upper() if self.motto is not None else ''
 
+    def get_storage_quota(self):
+        if self.storage_quota is not None:
+            return self.storage_quota
+        return getattr(settings, 'STITCHER_STORAGE_QUOTA', None)
+
+    def storage_remaining(self):
+        """Bytes left in the quota, or None when unlimited. Reads the counters, never aggregates"""
+        quota = self.get_storage_quota()
+
+        if quota is None:
+            return None
+
+        return max(quota - self.storage_used, 0)
+
+    @classmethod
+    def actual_counters(cls):
+        """Expressions computing the true value of each counter for an outer Stitcher queryset"""
+        project_model = apps.get_model('projects', 'Project')
+        media_model = apps.get_model('projects', 'MediaItem')
+
+        projects = project_model.objects.filter(owner=models.OuterRef('pk')).order_by().values('owner')
+        media = media_model.objects.filter(owner=models.OuterRef('pk')).order_by().values('owner')
+
+        return {
+            'project_count': Coalesce(models.Subquery(projects.annotate(n=models.Count('pk')).values('n')), 0),
+            'media_count': Coalesce(models.Subquery(media.annotate(n=models.Count('pk')).values('n')), 0),
+            'storage_used': Coalesce(models.Subquery(media.annotate(n=models.Sum('size')).values('n')), 0),
+        }
+
+    @classmethod
+    def reconcile_counters(cls, queryset=None):
+        """
+        Recomputes the counters of the given stitchers and fixes any that have drifted.
+        Returns the number of stitchers fixed.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        actual = cls.actual_counters()
+
+        drifted = queryset.annotate(
+            **{'actual_' + name: expression for name, expression in actual.items()}
+        ).exclude(
+            **{name: models.F('actual_' + name) for name in actual}
+        ).values_list('pk', flat=True)
+
+        return cls.objects.filter(pk__in=list(drifted)).update(**actual)
+
     @classmethod
     def create_stitcher_from_user(cls, user: User) -> 'Stitcher':
         """
         :param User user:
         :return Stitcher:
         """
-        if not hasattr(user, 'stitcher'):
-            stitcher = cls.objects.get_or_create(
-                user=user
-            )
-        else:
-            stitcher = user.stitcher
-
-        return stitcher
+        try:
+            return user.stitcher
+        except cls.DoesNotExist:
+            return cls.objects.get_or_create(user=user)[0]
 
     @classmethod
-    def create_stitcher_signal_handler(cls, sender: type, instance: User, *_, **__):
-        if sender is User:
-            cls.create_stitcher_from_user(user=instance)
+    def create_stitcher_signal_handler(cls, sender: type, instance: User, created=False, *_, **__):
+        # Only new users need provisioning. Checking on every save costs a query per user saved
+        if sender is User and created:
+            cls.objects.get_or_create(user=instance)
 
 
 signals.post_save.connect(Stitcher.create_stitcher_signal_handler, sender=User)
@@ -11,4 +11,4 @@ class StitcherSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Stitcher
-        fields = ['id', 'username', 'motto', 'projects']
\ No newline at end of file
+        fields = ['id', 'username', 'motto', 'projects', 'project_count', 'media_count', 'storage_used']
\ No newline at end of file
@@ -1,6 +1,11 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
+from django.contrib.admin import helpers
 from django.contrib.auth.models import User
+from projects.models import Project
 from .models import Stitcher
 
 
@@ -25,3 +30,60 @@ class StitchersTestCase(TestCase):
         self.test_stitcher.motto = motto
 
         self.assertEqual(motto.upper(), self.test_stitcher.get_motto_uppercase())
+
+    def test_provisioned_once(self):
+        self.assertEqual(Stitcher.create_stitcher_from_user(self.test_auth_user), self.test_stitcher)
+
+        user = User.objects.get(pk=self.test_auth_user.pk)
+
+        # Saving an existing user doesn't look for its stitcher again
+        with self.assertNumQueries(1):
+            user.save()
+
+
+class StitcherUserAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('admin:auth_user_changelist')).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_users(self):
+        before = self._changelist_queries()
+
+        for i in range(5):
+            Project.objects.create(title='P', owner=User.objects.create(username='user{}'.format(i)).stitcher)
+
+        self.assertEqual(self._changelist_queries(), before)
+
+    def test_add_user(self):
+        response = self.client.post(reverse('admin:auth_user_add'), {
+            'username': 'newcomer', 'password1': 'a-long-passphrase', 'password2': 'a-long-passphrase'
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Stitcher.objects.filter(user__username='newcomer').exists())
+
+    def test_suspend_content(self):
+        users = [User.objects.create(username='user{}'.format(i)) for i in range(2)]
+        projects = [Project.objects.create(title='P', owner=user.stitcher) for user in users]
+
+        self.client.post(reverse('admin:auth_user_changelist'), {
+            'action': 'suspend_content', helpers.ACTION_CHECKBOX_NAME: [users[0].pk]
+        })
+
+        self.assertEqual(
+            [Project.objects.get(pk=project.pk).status for project in projects],
+            [Project.STATUSES['SUSPENDED'], Project.STATUSES['ENABLED']]
+        )
+
+        self.client.post(reverse('admin:auth_user_changelist'), {
+            'action': 'enable_content', helpers.ACTION_CHECKBOX_NAME: [users[0].pk]
+        })
+
+        self.assertEqual(Project.objects.get(pk=projects[0].pk).status, Project.STATUSES['ENABLED'])
+